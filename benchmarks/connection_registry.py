@@ -0,0 +1,74 @@
+"""
+Compares the cost of building the sqs connections of a ReplyQueueFactory
+with one boto3 session/resource/client per connection (the previous
+behaviour) and with the shared SqsConnectionRegistry.
+
+Usage: python benchmarks/connection_registry.py [--connections 4] [--rounds 5]
+"""
+import os
+import sys
+import argparse
+import tracemalloc
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import boto3
+
+from sqs_client.connection import SqsConnection, SqsConnectionRegistry
+
+REGION = 'us-west-2'
+ACCESS_KEY = 'benchmark'
+SECRET_KEY = 'benchmark'
+
+
+def build_unshared(connections):
+    built = []
+    for _ in range(connections):
+        session = boto3.Session(aws_access_key_id=ACCESS_KEY, aws_secret_access_key=SECRET_KEY)
+        resource = session.resource('sqs', region_name=REGION)
+        client = boto3.client(
+            'sqs',
+            aws_access_key_id=ACCESS_KEY,
+            aws_secret_access_key=SECRET_KEY,
+            region_name=REGION
+        )
+        built.append((resource, client))
+    return built
+
+
+def build_shared(connections):
+    SqsConnectionRegistry.clear()
+    built = []
+    for _ in range(connections):
+        connection = SqsConnection(REGION, ACCESS_KEY, SECRET_KEY)
+        connection.client
+        built.append(connection)
+    # Only the reply queue itself needs a resource (create_queue).
+    built[0].resource
+    return built
+
+
+def measure(build, connections, rounds):
+    timings = []
+    peaks = []
+    for _ in range(rounds):
+        tracemalloc.start()
+        start = perf_counter()
+        built = build(connections)
+        timings.append(perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        del built
+    return min(timings), min(peaks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    for name, build in (('unshared', build_unshared), ('registry', build_shared)):
+        seconds, peak = measure(build, args.connections, args.rounds)
+        print("{:<10} {:>8.1f} ms {:>10.1f} KiB peak".format(name, seconds * 1000, peak / 1024))
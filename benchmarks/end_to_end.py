@@ -0,0 +1,186 @@
+"""
+End-to-end throughput and latency benchmark: submitter -> SQS -> daemon -> WPS-T.
+
+Everything runs in one process: the in-memory local SQS backend stands in
+for AWS, benchmarks/stub_wps_server.py for the WPS-T server, and the daemon's
+poller and TestHandler run on a background thread. Requests go through
+soamc_submitter.submit_message, one at a time, as the CLI sends them.
+
+For each job type it reports p50/p95/p99 round-trip latency, messages per
+second, CPU seconds per message (of the whole process) and SQS API calls
+per message, and writes them as JSON so results can be compared between
+releases.
+
+Usage:
+    python benchmarks/end_to_end.py --requests 200 --wps-latency 0.005 \
+        --poller-mode concurrent --output bench_results.json
+"""
+import io
+import os
+import sys
+import json
+import logging
+import argparse
+import tempfile
+import platform
+import contextlib
+from time import time, perf_counter, process_time
+from threading import Thread
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from stub_wps_server import start_stub_server
+from constants import constants as const
+from sqs_client.utils import percentile
+from sqs_client.local_backend import LocalSqsBroker, LocalSqsConnection
+
+REGION = 'benchmark'
+REQUEST_QUEUE_NAME = 'soamc_benchmark_requests'
+
+PAYLOADS = {
+    const.GET_LANDING_PAGE: {},
+    const.GET_PROCESSES: {},
+    const.GET_PROCESS_DESCRIPTION: {'process_id': 'stub_process'},
+    const.GET_JOB_LIST: {'process_id': 'stub_process'},
+    const.GET_STATUS: {'process_id': 'stub_process', 'job_id': 'stub_job'},
+    const.GET_RESULT: {'process_id': 'stub_process', 'job_id': 'stub_job'},
+    const.EXECUTE: {'process_id': 'stub_process', 'payload_data': {'inputs': []}},
+    const.DEPLOY_PROCESS: {'payload_data': 'stub_process'},
+    const.UNDEPLOY_PROCESS: {'process_id': 'stub_process'},
+    const.DISMISS: {'process_id': 'stub_process', 'job_id': 'stub_job'},
+}
+
+CONFIG_TEMPLATE = """[AWS_SQS_QUEUE]
+AWS_ACCOUNT_ID=000000000000
+region_name={region}
+aws_access_key=benchmark
+aws_secret_key=benchmark
+sqs_backend=local
+queue_url={queue_url}
+wait_time=1
+reply_timeout_sec={timeout}
+
+[ADES_WPS-T_SERVER]
+wps_server_url={wps_server_url}
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=100, help="requests per job type")
+    parser.add_argument('--job-types', nargs='+', default=list(PAYLOADS), choices=list(PAYLOADS))
+    parser.add_argument('--wps-latency', type=float, default=0.005, help="seconds added by the stub WPS-T server")
+    parser.add_argument('--poller-mode', default='concurrent', help="poller_mode of the daemon")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--timeout', type=int, default=20)
+    parser.add_argument('--output', default='bench_results.json')
+    return parser.parse_args()
+
+
+def write_config(directory, queue_url, wps_server_url, timeout):
+    with open(os.path.join(directory, 'sqsconfig.py'), 'w') as f:
+        f.write(CONFIG_TEMPLATE.format(
+            region=REGION,
+            queue_url=queue_url,
+            wps_server_url=wps_server_url,
+            timeout=timeout
+        ))
+
+
+def start_daemon(args, queue_url, wps_server_url):
+    import soamc_client_daemon as daemon
+    from sqs_client.factories import SubscriberFactory, PublisherFactory
+
+    logging.getLogger('sqs_listener').setLevel(logging.WARNING)
+    sqs_config = {
+        'region_name': REGION,
+        'sqs_backend': 'local',
+        'poller_mode': args.poller_mode,
+        'poller_workers': args.workers,
+        # read by poller_mode = async, which builds its own subscriber
+        'queue_url': queue_url,
+        'wait_time': 1
+    }
+    subscriber = SubscriberFactory(region_name=REGION, backend='local', queue_url=queue_url, wait_time_seconds=1).build()
+    publisher = PublisherFactory(region_name=REGION, backend='local').build()
+    wps_config = {'wps_server_url': wps_server_url, 'http_pool_size': args.workers}
+    if args.poller_mode == 'async':
+        handler = daemon.build_async_handler(wps_config)
+    else:
+        handler = daemon.build_handler(wps_config)
+    poller = daemon.build_poller(sqs_config, handler, subscriber, publisher)
+    thread = Thread(target=poller.start)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def run_job_type(submitter, broker, job_type, count, timeout):
+    latencies = []
+    errors = 0
+    api_calls_before = sum(broker.get_api_calls().values())
+    cpu_before = process_time()
+    start = perf_counter()
+    for _ in range(count):
+        data = dict(PAYLOADS[job_type], job_type=job_type)
+        sent_at = perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = submitter.submit_message(data, timeout=timeout)
+        latencies.append(perf_counter() - sent_at)
+        if isinstance(response, dict) and any(key.startswith('Error') for key in response):
+            errors += 1
+    elapsed = perf_counter() - start
+    api_calls = sum(broker.get_api_calls().values()) - api_calls_before
+    return {
+        'requests': count,
+        'errors': errors,
+        'latency_p50_ms': percentile(latencies, 0.50) * 1000,
+        'latency_p95_ms': percentile(latencies, 0.95) * 1000,
+        'latency_p99_ms': percentile(latencies, 0.99) * 1000,
+        'messages_per_second': count / elapsed,
+        'cpu_ms_per_message': (process_time() - cpu_before) / count * 1000,
+        'sqs_api_calls_per_message': api_calls / count
+    }
+
+
+def main():
+    args = parse_args()
+    server = start_stub_server(latency=args.wps_latency)
+    wps_server_url = "http://{}:{}/".format(*server.server_address)
+
+    LocalSqsBroker.reset()
+    broker = LocalSqsBroker.get(REGION)
+    queue_url = LocalSqsConnection(REGION).client.create_queue(QueueName=REQUEST_QUEUE_NAME)['QueueUrl']
+
+    # soamc_submitter reads sqsconfig.py from the working directory on first use.
+    workdir = tempfile.mkdtemp(prefix='soamc_bench_')
+    write_config(workdir, queue_url, wps_server_url, args.timeout)
+    os.chdir(workdir)
+    start_daemon(args, queue_url, wps_server_url)
+    import soamc_submitter as submitter
+
+    results = {}
+    for job_type in args.job_types:
+        results[job_type] = run_job_type(submitter, broker, job_type, args.requests, args.timeout)
+        print("{:<22} p50 {latency_p50_ms:>8.2f} ms  p99 {latency_p99_ms:>8.2f} ms  "
+              "{messages_per_second:>7.1f} msg/s  {sqs_api_calls_per_message:>5.1f} calls/msg  "
+              "errors {errors}".format(job_type, **results[job_type]))
+    server.shutdown()
+
+    report = {
+        'timestamp': int(time()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'results': results
+    }
+    output = args.output if os.path.isabs(args.output) else os.path.join(ROOT, args.output)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Results written to {}".format(output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Compares the MessageList of sqs_client.message with the previous list based
+implementation over chunk sizes of 10 to 10,000 messages.
+
+Each round builds a chunk the way Subscriber.chunk does, one receive
+response of ten messages at a time joined with +, iterates over it, removes
+a share of the messages as failed and deletes the rest through a client that
+only counts calls. Time is the best of --rounds; peak memory is measured in
+a separate round with tracemalloc, receiving the responses one at a time, so
+it includes the responses the legacy list keeps alive.
+
+Usage: python benchmarks/message_list.py [--sizes 10 100 1000 10000] [--failed 0.1] [--rounds 5]
+"""
+import os
+import sys
+import uuid
+import argparse
+import tracemalloc
+from time import time, perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqs_client.message import MessageList
+
+QUEUE_URL = 'https://sqs.us-west-2.amazonaws.com/000000000000/benchmark'
+
+
+class CountingClient:
+
+    def __init__(self):
+        self.calls = 0
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.calls += 1
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries]}
+
+
+class LegacyMessage:
+
+    def __init__(self, message):
+        self.initial_time = time()
+        self._message = message
+
+    @property
+    def id(self):
+        return self._message['MessageId']
+
+
+class LegacyMessageList:
+    """
+        MessageList before it was indexed by MessageId.
+    """
+
+    def __init__(self, client, queue, messages):
+        self.client = client
+        self.queue = queue
+        self.messages = messages
+        self.read_messages = []
+
+    def __len__(self):
+        return len(self.messages['Messages'])
+
+    def __iter__(self):
+        messages_id = []
+        for message in self.messages['Messages']:
+            if message['MessageId'] in messages_id:
+                continue
+            messages_id.append(message['MessageId'])
+            self.read_messages.append({'Id': message['MessageId'], 'ReceiptHandle': message['ReceiptHandle']})
+            yield LegacyMessage(message)
+
+    def __add__(self, other_list):
+        self.messages['Messages'] += other_list.messages['Messages']
+        return self
+
+    def remove(self, message_id):
+        self.read_messages = list(filter(lambda m: m['Id'] != message_id, self.read_messages))
+        self.messages['Messages'] = list(filter(lambda m: m['MessageId'] != message_id, self.messages['Messages']))
+
+    def delete(self):
+        for i in range(0, len(self.read_messages), 10):
+            self.client.delete_message_batch(QueueUrl=self.queue, Entries=self.read_messages[i:i + 10])
+
+
+def build_receives(size):
+    for start in range(0, size, 10):
+        yield {'Messages': [
+            {
+                'MessageId': str(uuid.uuid4()),
+                'ReceiptHandle': uuid.uuid4().hex * 4,
+                'Body': '{"job_type": "getStatus", "process_id": "p", "job_id": "%d"}' % index,
+                'MD5OfBody': uuid.uuid4().hex,
+                'MessageAttributes': {
+                    'ReplyTo': {'StringValue': QUEUE_URL + '_reply', 'DataType': 'String'},
+                    'RequestMessageId': {'StringValue': str(index), 'DataType': 'String'}
+                }
+            }
+            for index in range(start, min(start + 10, size))
+        ]}
+
+
+def run(message_list_class, receives, failed_every):
+    client = CountingClient()
+    chunk = None
+    for receive in receives:
+        received = message_list_class(client, QUEUE_URL, receive)
+        chunk = received if chunk is None else chunk + received
+    for index, message in enumerate(list(chunk)):
+        if failed_every and index % failed_every == 0:
+            chunk.remove(message.id)
+    chunk.delete()
+    return client.calls
+
+
+def measure(message_list_class, size, failed_every, rounds):
+    timings = []
+    for _ in range(rounds):
+        # Fresh responses every round: the legacy list extends them in place.
+        receives = list(build_receives(size))
+        start = perf_counter()
+        run(message_list_class, receives, failed_every)
+        timings.append(perf_counter() - start)
+        del receives
+    tracemalloc.start()
+    run(message_list_class, build_receives(size), failed_every)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500, 1000, 10000])
+    parser.add_argument('--failed', type=float, default=0.1, help="share of messages removed as failed")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    failed_every = int(1 / args.failed) if args.failed else 0
+    print("{:>8} {:>14} {:>14} {:>14} {:>14}".format(
+        'messages', 'legacy ms', 'indexed ms', 'legacy KiB', 'indexed KiB'
+    ))
+    for size in args.sizes:
+        legacy_seconds, legacy_peak = measure(LegacyMessageList, size, failed_every, args.rounds)
+        seconds, peak = measure(MessageList, size, failed_every, args.rounds)
+        print("{:>8} {:>14.2f} {:>14.2f} {:>14.1f} {:>14.1f}".format(
+            size, legacy_seconds * 1000, seconds * 1000, legacy_peak / 1024, peak / 1024
+        ))
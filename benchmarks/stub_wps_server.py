@@ -0,0 +1,114 @@
+"""
+A minimal stand-in for the ADES WPS-T server, used by the benchmarks.
+
+It answers the routes called by TestHandler with small JSON documents
+after a configurable latency, and keeps HTTP/1.1 connections alive.
+
+Usage: python benchmarks/stub_wps_server.py [--port 5000] [--latency 0.005]
+"""
+import json
+import argparse
+from time import sleep
+from threading import Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubWpsRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle's algorithm
+    # and delayed ACKs add ~40 ms to every response on a kept-alive connection.
+    disable_nagle_algorithm = True
+    latency = 0
+    # job type -> extra latency in seconds
+    latencies = {}
+
+    def do_GET(self):
+        parts = self._parts()
+        if not parts:
+            body = {"title": "stub WPS-T server"}
+        elif parts == ["processes"]:
+            body = {"processes": [{"id": "stub_process"}]}
+        elif len(parts) == 2:
+            body = {"process": {"id": parts[1]}}
+        elif len(parts) == 3:
+            body = {"jobs": []}
+        elif len(parts) == 4:
+            body = {"jobID": parts[3], "status": "running"}
+        else:
+            body = {"outputs": []}
+        self._reply(200, body, self._job_type("GET", parts))
+
+    def do_POST(self):
+        self._drain()
+        parts = self._parts()
+        if parts == ["processes"]:
+            self._reply(201, {"deploymentDone": True}, "deployProcess")
+        else:
+            self._reply(201, {"jobID": "stub_job", "status": "accepted"}, "execute")
+
+    def do_DELETE(self):
+        parts = self._parts()
+        self._reply(200, {"deleted": "/".join(parts)}, self._job_type("DELETE", parts))
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parts(self):
+        return [part for part in self.path.split("?")[0].split("/") if part]
+
+    def _job_type(self, method, parts):
+        if method == "DELETE":
+            return "undeployProcess" if len(parts) == 2 else "dismiss"
+        return {
+            0: "getLandingPage",
+            1: "getProcesses",
+            2: "getProcessDescription",
+            3: "getJobList",
+            4: "getStatus"
+        }.get(len(parts), "getResult")
+
+    def _drain(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+    def _reply(self, status, body, job_type):
+        sleep(self.latency + self.latencies.get(job_type, 0))
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub_server(port=0, latency=0, latencies=None):
+    """
+    Starts the stub server on a background thread and returns it.
+    server.server_address holds the bound address; call server.shutdown() to stop it.
+    """
+    handler = type("ConfiguredStubWpsRequestHandler", (StubWpsRequestHandler,), {
+        "latency": latency,
+        "latencies": latencies or {}
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0)
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.latency)
+    print("Stub WPS-T server listening on http://{}:{}".format(*server.server_address))
+    try:
+        while True:
+            sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
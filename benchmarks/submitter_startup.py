@@ -0,0 +1,88 @@
+"""
+Measures the startup cost of soamc_submitter.py, i.e. what every short CLI
+call pays before sending anything.
+
+For each round it runs, in fresh interpreters and from a directory holding a
+dummy sqsconfig.py:
+  - `python -X importtime -c "import soamc_submitter"`, reporting the total
+    import time, the slowest top level imports and whether boto3 was loaded;
+  - `python soamc_submitter.py --help`, reporting its wall clock time.
+
+Usage: python benchmarks/submitter_startup.py [--rounds 5] [--top 10]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIG = """[AWS_SQS_QUEUE]
+AWS_ACCOUNT_ID=000000000000
+region_name=us-west-2
+aws_access_key=benchmark
+aws_secret_key=benchmark
+queue_url=https://sqs.us-west-2.amazonaws.com/000000000000/benchmark
+
+[ADES_WPS-T_SERVER]
+wps_server_url=http://localhost/
+"""
+
+
+def parse_importtime(stderr):
+    """
+        Returns {module: (self_us, cumulative_us, depth)} from -X importtime output.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def measure_import(workdir, env):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import soamc_submitter'],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def measure_help(workdir, env):
+    start = perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'soamc_submitter.py'), '--help'],
+        cwd=workdir, env=env, capture_output=True, check=True
+    )
+    return perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help="slowest top level imports to list")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='soamc_startup_')
+    with open(os.path.join(workdir, 'sqsconfig.py'), 'w') as f:
+        f.write(CONFIG)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+
+    imports = [measure_import(workdir, env) for _ in range(args.rounds)]
+    helps = [measure_help(workdir, env) for _ in range(args.rounds)]
+
+    fastest = min(imports, key=lambda modules: modules['soamc_submitter'][1])
+    print("import soamc_submitter  {:>8.1f} ms (best of {})".format(
+        fastest['soamc_submitter'][1] / 1000, args.rounds
+    ))
+    print("soamc_submitter --help  {:>8.1f} ms (best of {})".format(min(helps) * 1000, args.rounds))
+    print("boto3 imported          {:>8}".format('yes' if 'boto3' in fastest else 'no'))
+    print("slowest top level imports:")
+    top_level = [(name, cumulative) for name, (_, cumulative, depth) in fastest.items() if depth == 1]
+    for name, cumulative in sorted(top_level, key=lambda item: -item[1])[:args.top]:
+        print("  {:<30} {:>8.1f} ms".format(name, cumulative / 1000))
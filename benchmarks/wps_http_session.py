@@ -0,0 +1,65 @@
+"""
+Measures per-request latency of TestHandler.getStatus against the local
+stub WPS-T server, with a new connection per request (module level
+requests.get, the previous behaviour) and with the handler's pooled
+keep-alive session.
+
+Usage: python benchmarks/wps_http_session.py [--requests 500] [--latency 0]
+"""
+import os
+import sys
+import logging
+import argparse
+import statistics
+from time import perf_counter
+from urllib.parse import urljoin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from stub_wps_server import start_stub_server
+from soamc_client_daemon import TestHandler
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def run(call, count):
+    samples = []
+    for _ in range(count):
+        start = perf_counter()
+        call()
+        samples.append(perf_counter() - start)
+    return samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0)
+    args = parser.parse_args()
+
+    # Keep the handler's per-request logging out of the measurement.
+    logging.getLogger('sqs_listener').setLevel(logging.WARNING)
+
+    server = start_stub_server(latency=args.latency)
+    wps_server_url = "http://{}:{}/".format(*server.server_address)
+    handler = TestHandler(wps_server_url=wps_server_url, pool_size=1)
+    status_url = urljoin(wps_server_url, "processes/stub_process/jobs/stub_job")
+
+    results = {
+        'new connection': run(lambda: requests.get(status_url).json(), args.requests),
+        'pooled session': run(lambda: handler.getStatus("stub_process", "stub_job"), args.requests)
+    }
+    server.shutdown()
+
+    for name, samples in results.items():
+        print("{:<15} mean {:>7.3f} ms  p50 {:>7.3f} ms  p99 {:>7.3f} ms".format(
+            name,
+            statistics.mean(samples) * 1000,
+            percentile(samples, 0.50) * 1000,
+            percentile(samples, 0.99) * 1000
+        ))
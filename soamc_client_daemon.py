@@ -9,17 +9,42 @@ import logging
 import configparser
 import requests
 import argparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import ConnectTimeoutError
 from urllib.parse import urljoin
 import time
+import asyncio
 import traceback
-from sqs_client.subscriber import MessagePoller
-from sqs_client.contracts import MessageHandler
-from sqs_client.factories import SubscriberFactory, PublisherFactory
+from concurrent.futures import ThreadPoolExecutor
+from sqs_client.aio import AsyncMessagePoller
+from sqs_client.subscriber import (
+    MessagePoller,
+    ConcurrentMessagePoller,
+    LaneMessagePoller,
+    BatchMessagePoller,
+    PipelinedMessagePoller
+)
+from sqs_client.lanes import Lane, LaneScheduler
+from sqs_client.batch import BatchResult
+from sqs_client.contracts import BatchMessageHandler, AsyncMessageHandler
+from sqs_client.factories import (
+    SubscriberFactory,
+    PublisherFactory,
+    BatchPublisherFactory,
+    RetryPublisherFactory,
+    OutboxRelayFactory,
+    ErrorQueueRouterFactory,
+    VisibilityHeartbeatFactory,
+    AcknowledgerFactory,
+    AsyncSubscriberFactory,
+    AsyncPublisherFactory
+)
 from sqs_client.daemon import Daemon
+from sqs_client.cache import TTLCache
+from sqs_client.scheduler import Scheduler
+from sqs_client.singleflight import SingleFlight
 from constants import constants as const
-from sqs_client.subscriber import MessagePoller
-from sqs_client.contracts import MessageHandler
-from sqs_client.factories import SubscriberFactory, PublisherFactory
 
 
 logger = logging.getLogger('sqs_listener')
@@ -35,6 +60,10 @@ sh.setFormatter(formatter)
 logger.addHandler(sh)
 
 
+JOB_TYPES = [value for name, value in vars(const).items() if name.isupper()]
+SLOW_JOB_TYPES = (const.EXECUTE, const.DEPLOY_PROCESS, const.UNDEPLOY_PROCESS, const.DISMISS)
+
+
 class MyParser(argparse.ArgumentParser):
     def error(self, message):
         sys.stderr.write('error: %s\n' % message)
@@ -69,35 +98,151 @@ publisher = PublisherFactory(
 ).build()
 '''
 
-class TestHandler(MessageHandler):
-    def submit_request(self, href, request_type, expected_response_code=200, payload_data=None, timeout=None):
+# job_type: (href, request type, expected response code, payload), href being formatted with the message body.
+# A "form" payload posts the message's payload_data as the proc field, a "json" payload posts it as JSON.
+WPS_ROUTES = {
+    const.GET_LANDING_PAGE: ("", "GET", 200, None),
+    const.GET_PROCESSES: ("processes", "GET", 200, None),
+    const.DEPLOY_PROCESS: ("processes", "POST", 201, "form"),
+    const.GET_PROCESS_DESCRIPTION: ("processes/{process_id}", "GET", 200, None),
+    const.UNDEPLOY_PROCESS: ("processes/{process_id}", "DELETE", 200, None),
+    const.GET_JOB_LIST: ("processes/{process_id}/jobs", "GET", 200, None),
+    const.EXECUTE: ("processes/{process_id}/jobs", "POST", 201, "json"),
+    const.GET_STATUS: ("processes/{process_id}/jobs/{job_id}", "GET", 200, None),
+    const.DISMISS: ("processes/{process_id}/jobs/{job_id}", "DELETE", 200, None),
+    const.GET_RESULT: ("processes/{process_id}/jobs/{job_id}/result", "GET", 200, None),
+}
+
+
+def build_wps_request(job_type, message_body):
+    """
+    Returns the href, request type, expected response code, data and headers of the WPS-T request answering
+    a message of job_type, or None when the job type is not supported.
+    """
+    route = WPS_ROUTES.get(job_type)
+    if route is None:
+        return None
+    href, request_type, expected_response_code, payload = route
+    data = None
+    headers = {'Content-type': 'application/json'}
+    if payload == "form":
+        data = {"proc": message_body['payload_data']}
+        headers = {'content-type': 'application/x-www-form-urlencoded'}
+    elif payload == "json":
+        data = json.dumps(message_body['payload_data'])
+    return href.format(**message_body), request_type, expected_response_code, data, headers
+
+
+class WpsHandler:
+    """
+    What TestHandler and AsyncTestHandler share: per job type timeouts, and the response caches of
+    CACHEABLE_JOB_TYPES, which deploy/undeploy invalidate.
+    """
+    CACHEABLE_JOB_TYPES = (const.GET_LANDING_PAGE, const.GET_PROCESSES, const.GET_PROCESS_DESCRIPTION)
+    COALESCED_JOB_TYPES = CACHEABLE_JOB_TYPES + (const.GET_JOB_LIST, const.GET_STATUS, const.GET_RESULT)
+    # Sending these again may start a second WPS job.
+    NON_IDEMPOTENT_JOB_TYPES = tuple(job_type for job_type, route in WPS_ROUTES.items() if route[1] == "POST")
+
+    def __init__(self, wps_server_url=None, timeouts=None, default_timeout=None, response_caches=None):
+        self.wps_server_url = wps_server_url if wps_server_url else wps_server
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.response_caches = response_caches or {}
+
+    def get_timeout(self, job_type):
+        return self.timeouts.get(job_type, self.default_timeout)
+
+    def get_job_type(self, message):
+        try:
+            return str(json.loads(message.body)["job_type"]).strip()
+        except Exception:
+            return None
+
+    def read_cache(self, job_type, message_body):
+        """
+        Returns the cached response, or None, and the cache generation a fresh response must be stored with.
+        """
+        cache = self.response_caches.get(job_type)
+        if cache is None:
+            return None, None
+        key = message_body.get('process_id')
+        response = cache.get(key)
+        if response is not None:
+            logger.info("Cache hit for {} : {}".format(job_type, key))
+        # A deploy/undeploy finishing during the read makes its response stale.
+        return response, cache.generation()
+
+    def write_cache(self, job_type, message_body, response, generation):
+        cache = self.response_caches.get(job_type)
+        if cache is not None:
+            cache.set(message_body.get('process_id'), response, generation)
+
+    def invalidate_cache(self, job_type, message_body):
+        if job_type not in (const.DEPLOY_PROCESS, const.UNDEPLOY_PROCESS):
+            return
+        if const.GET_PROCESSES in self.response_caches:
+            self.response_caches[const.GET_PROCESSES].clear()
+        if const.GET_PROCESS_DESCRIPTION in self.response_caches:
+            # A deployment payload does not tell us the process id, so every description goes.
+            if job_type == const.UNDEPLOY_PROCESS:
+                self.response_caches[const.GET_PROCESS_DESCRIPTION].invalidate(message_body.get('process_id'))
+            else:
+                self.response_caches[const.GET_PROCESS_DESCRIPTION].clear()
+
+    def cache_stats(self):
+        return {job_type: cache.stats() for job_type, cache in self.response_caches.items()}
+
+
+class TestHandler(WpsHandler, BatchMessageHandler):
+
+    def __init__(self, wps_server_url=None, pool_size=10, retries=3, backoff_factor=0.5, timeouts=None, default_timeout=None, response_caches=None, coalesce_requests=True, batch_workers=4):
+        """
+        Talks to the WPS-T server through one pooled, keep-alive HTTP session.
+        timeouts maps a job_type to its request timeout in seconds; job types
+        without an entry use default_timeout. Connection errors are retried
+        for every request, 5xx responses only for GET and DELETE.
+        response_caches maps a job type of CACHEABLE_JOB_TYPES to the TTLCache
+        holding its responses. With coalesce_requests, concurrent identical
+        reads (COALESCED_JOB_TYPES) share one WPS call. process_batch runs the
+        distinct requests of a batch on batch_workers threads.
+        """
+        super().__init__(wps_server_url, timeouts, default_timeout, response_caches)
+        self.singleflight = SingleFlight() if coalesce_requests else None
+        self.session = self.build_session(pool_size, retries, backoff_factor)
+        self.batch_workers = batch_workers
+        self.batch_executor = None
+
+    def build_session(self, pool_size, retries, backoff_factor):
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "DELETE"]),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def submit_request(self, href, request_type, expected_response_code=200, payload_data=None, timeout=None, data=None, headers=None):
 
         logger.debug("submit_request : href : {} request_type : {}".format(href, request_type))
-        headers = {'Content-type': 'application/json'}
-        wps_server_url = urljoin(wps_server, href)
+        headers = headers or {'Content-type': 'application/json'}
+        wps_server_url = urljoin(self.wps_server_url, href)
         logger.info("wps_server_url : {}".format(wps_server_url))
-        if request_type.upper()=="GET":
-            logger.debug("calling GET")
-            if timeout:
-                response = requests.get(wps_server_url, headers=headers, timeout=timeout)
-            else:
-                response = requests.get(wps_server_url, headers=headers)
-            logger.debug(response.json())
-        elif request_type.upper()=="POST":
-            if payload_data:
-                logger.info("POST DATA : {}".format(wps_server_url))
-                headers = {'content-type': 'application/x-www-form-urlencoded'}
-                if timeout:
-                    response = requests.post(wps_server_url, headers=headers, data={"proc" : payload_data}, timeout=timeout)
-                else:
-                    response = requests.post(wps_server_url, headers=headers, data={"proc" : payload_data})
-            else:
-                logger.info("POST: NO PAYLOAD_DATA")
-                response = requests.post(wps_server_url, headers=headers)
-        elif request_type.upper()=="DELETE":
-            response = requests.delete(wps_server_url, headers=headers)
-        else:
+        request_type = request_type.upper()
+        if request_type not in ("GET", "POST", "DELETE"):
             raise Exception("Invalid Request Type : {}".format(request_type))
+        if request_type == "POST" and payload_data:
+            logger.info("POST DATA : {}".format(wps_server_url))
+            headers = {'content-type': 'application/x-www-form-urlencoded'}
+            data = {"proc" : payload_data}
+        response = self.session.request(request_type, wps_server_url, headers=headers, data=data, timeout=timeout)
          
         response.raise_for_status()
         logger.info("status code: {}".format(response.status_code))
@@ -110,64 +255,37 @@ class TestHandler(MessageHandler):
 
     def getLandingPage(self):
         logger.debug("getLandingPage")
-        href = ""	
-        request_type = "GET"
-        return self.submit_request(href, request_type)
+        return self.call_wps(const.GET_LANDING_PAGE, {})
 
     def deployProcess(self, payload_data):
-        href = "processes"
-        request_type = "POST"
-        return self.submit_request(href, request_type, 201, payload_data)
+        return self.call_wps(const.DEPLOY_PROCESS, {'payload_data': payload_data})
 
     def getProcessDescription(self, process_id):
-        href = "processes/{}".format(process_id)
-        request_type = "GET"
-        return self.submit_request(href, request_type)
+        return self.call_wps(const.GET_PROCESS_DESCRIPTION, {'process_id': process_id})
 
     def undeployProcess(self, process_id):
-        href = "processes/{}".format(process_id)
-        request_type = "DELETE"
-        return self.submit_request(href, request_type)
+        return self.call_wps(const.UNDEPLOY_PROCESS, {'process_id': process_id})
 
     def getJobList(self, process_id):
-        href = "processes/{}/jobs".format(process_id)
-        request_type = "GET"
-        return self.submit_request(href, request_type)        
+        return self.call_wps(const.GET_JOB_LIST, {'process_id': process_id})
  
     def execute(self, process_id, payload_data):
-        href = "processes/{}/jobs".format(process_id)
-        request_type = "POST"
-        wps_server_url = urljoin(wps_server, href)
-        headers = {'Content-type': 'application/json'}
-        response = requests.post(wps_server_url, headers=headers, data=json.dumps(payload_data))
-        response.raise_for_status()
-        logger.info("status code: {}".format(response.status_code))
-        logger.info(json.dumps(response.json(), indent=2))
-        assert response.status_code == 201
-        return json.dumps(response.json())
+        return self.call_wps(const.EXECUTE, {'process_id': process_id, 'payload_data': payload_data})
 
     def getStatus(self, process_id, job_id):
-        href = "processes/{}/jobs/{}".format(process_id, job_id)
-        request_type = "GET"
-        return self.submit_request(href, request_type)
+        return self.call_wps(const.GET_STATUS, {'process_id': process_id, 'job_id': job_id})
 
     def dismissJob(self, process_id, job_id):
-        href = "processes/{}/jobs/{}".format(process_id, job_id)
-        request_type = "DELETE"
-        return self.submit_request(href, request_type)
+        return self.call_wps(const.DISMISS, {'process_id': process_id, 'job_id': job_id})
 
     def getProcesses(self):
-        href = "processes"
-        request_type = "GET"
-        return self.submit_request(href, request_type)
+        return self.call_wps(const.GET_PROCESSES, {})
 
     def getResult(self, process_id, job_id):
-        href = "processes/{}/jobs/{}/result".format(process_id, job_id) 
-        request_type = "GET"
-        return self.submit_request(href, request_type)
-
+        return self.call_wps(const.GET_RESULT, {'process_id': process_id, 'job_id': job_id})
 
     def process_message(self, message):
+        job_type = None
         try:
             logger.info("Received : {}".format(message))
 
@@ -178,45 +296,525 @@ class TestHandler(MessageHandler):
             #logger.info(attributes)
             #logger.info(messages_attributes)
             logger.info("Received message of type : {}".format(job_type))
-            if job_type == const.GET_LANDING_PAGE:
-                logger.info("Calling getLandingPage")
-                return self.getLandingPage()
-            elif job_type == const.GET_PROCESSES:
-                return self.getProcesses()
-            elif job_type == const.DEPLOY_PROCESS:
-                return self.deployProcess(message_body['payload_data'])
-            elif job_type == const.GET_PROCESS_DESCRIPTION:
-                return self.getProcessDescription(message_body['process_id'])
-            elif job_type == const.UNDEPLOY_PROCESS:
-                return self.undeployProcess(message_body['process_id'])
-            elif job_type == const.GET_JOB_LIST:
-                return self.getJobList(message_body['process_id'])
-            elif job_type == const.EXECUTE:
-                return self.execute(message_body['process_id'], message_body['payload_data'])
-            elif job_type == const.GET_STATUS:
-                return self.getStatus(message_body['process_id'], message_body['job_id'])
-            elif job_type == const.DISMISS:
-                return self.dismissJob(message_body['process_id'], message_body['job_id'])
-            elif job_type == const.GET_RESULT:
-                return self.getResult(message_body['process_id'], message_body['job_id'])
-            
-            else:
-                return "sorry!! {} is not a supported process".format(job_type)
+            return self.dispatch(job_type, message_body)
         except Exception as e:
             logger.error("#" * 20)
             logger.error(str(e))
             logger.error(traceback.format_exc())
+            if self.is_retryable(job_type, e):
+                raise
             return 'ERROR : {}'.format(str(e))
+
+    def is_retryable(self, job_type, error):
+        """
+        Connection errors, timeouts and 5xx responses leave the message in the queue to be retried
+        (and moved to the error queue once it failed max_receive_count times). Other errors are replied.
+        NON_IDEMPOTENT_JOB_TYPES are only retried when the connection could not be established, as
+        after a read timeout or a 5xx the server may have started the job.
+        """
+        if job_type in self.NON_IDEMPOTENT_JOB_TYPES:
+            if isinstance(error, requests.ConnectTimeout):
+                return True
+            reason = getattr(error.args[0], 'reason', None) if isinstance(error, requests.ConnectionError) and error.args else None
+            return isinstance(reason, ConnectTimeoutError)
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return True
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            return error.response.status_code >= 500
+        return False
+
+    def process_batch(self, messages):
+        """
+        Answers identical reads of the batch (COALESCED_JOB_TYPES with the same
+        process and job ids) with one call; every other message is processed on
+        its own. Replies are per message, as process_message would return them.
+        """
+        groups = {}
+        for message in messages:
+            groups.setdefault(self.get_batch_key(message), []).append(message)
+        logger.info("Processing a batch of {} messages as {} requests".format(len(messages), len(groups)))
+
+        if not self.batch_executor:
+            self.batch_executor = ThreadPoolExecutor(max_workers=self.batch_workers)
+        result = BatchResult()
+        futures = [(group, self.batch_executor.submit(self.process_message, group[0])) for group in groups.values()]
+        for group, future in futures:
+            try:
+                response = future.result()
+            except Exception as e:
+                for message in group:
+                    result.add_failure(message, e)
+                continue
+            for message in group:
+                result.add_reply(message, response)
+        return result
+
+    def get_batch_key(self, message):
+        try:
+            message_body = json.loads(message.body)
+            job_type = str(message_body["job_type"]).strip()
+        except Exception:
+            return message.id
+        if job_type not in self.COALESCED_JOB_TYPES:
+            return message.id
+        return (job_type, message_body.get('process_id'), message_body.get('job_id'))
+
+    def dispatch(self, job_type, message_body):
+        """
+        Serves cacheable reads from the response cache, coalesces identical
+        in-flight reads and invalidates the cache on deploy/undeploy.
+        """
+        response, generation = self.read_cache(job_type, message_body)
+        if response is not None:
+            return response
+
+        try:
+            response = self.call_coalesced(job_type, message_body)
+        finally:
+            self.invalidate_cache(job_type, message_body)
+
+        self.write_cache(job_type, message_body, response, generation)
+        return response
+
+    def call_coalesced(self, job_type, message_body):
+        """
+        Identical reads already in flight share one WPS call. Mutating job types always reach the server.
+        """
+        if not self.singleflight or job_type not in self.COALESCED_JOB_TYPES:
+            return self.call_wps(job_type, message_body)
+        key = (job_type, message_body.get('process_id'), message_body.get('job_id'))
+        return self.singleflight.do(key, self.call_wps, job_type, message_body)
+
+    def coalesce_stats(self):
+        return self.singleflight.stats() if self.singleflight else {}
+
+    def call_wps(self, job_type, message_body):
+        request = build_wps_request(job_type, message_body)
+        if request is None:
+            return "sorry!! {} is not a supported process".format(job_type)
+        href, request_type, expected_response_code, data, headers = request
+        return self.submit_request(href, request_type, expected_response_code, data=data, headers=headers, timeout=self.get_timeout(job_type))
       
 
+class AsyncTestHandler(WpsHandler, AsyncMessageHandler):
+    """
+    TestHandler for the async poller: WPS-T requests go through one aiohttp session, so thousands of them can be
+    outstanding without a thread each. Timeouts, retries, response caches and request coalescing behave as in
+    TestHandler. aiohttp is only needed by this handler and is imported when the session is created.
+    """
+    RETRIED_STATUS_CODES = (500, 502, 503, 504)
+
+    def __init__(self, wps_server_url=None, max_connections=100, retries=3, backoff_factor=0.5, timeouts=None, default_timeout=None, response_caches=None, coalesce_requests=True):
+        super().__init__(wps_server_url, timeouts, default_timeout, response_caches)
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.coalesce_requests = coalesce_requests
+        self.in_flight = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.session = None
+
+    def get_session(self):
+        # The session belongs to the event loop it is created on.
+        if self.session is None:
+            import aiohttp
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_connections))
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def submit_request(self, href, request_type, expected_response_code=200, data=None, headers=None, timeout=None):
+        import aiohttp
+        logger.debug("submit_request : href : {} request_type : {}".format(href, request_type))
+        wps_server_url = urljoin(self.wps_server_url, href)
+        logger.info("wps_server_url : {}".format(wps_server_url))
+        request_type = request_type.upper()
+        if request_type not in ("GET", "POST", "DELETE"):
+            raise Exception("Invalid Request Type : {}".format(request_type))
+        headers = headers or {'Content-type': 'application/json'}
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+        attempt = 0
+        while True:
+            try:
+                async with self.get_session().request(request_type, wps_server_url, headers=headers, data=data, timeout=client_timeout) as response:
+                    response.raise_for_status()
+                    body = await response.json(content_type=None)
+                    status_code = response.status
+                break
+            except aiohttp.ClientResponseError as e:
+                # As with TestHandler, 5xx responses are only retried for GET and DELETE.
+                if e.status not in self.RETRIED_STATUS_CODES or request_type == "POST" or attempt >= self.retries:
+                    raise
+            except aiohttp.ClientConnectorError:
+                # The connection was never established, so even a POST did not reach the server.
+                if attempt >= self.retries:
+                    raise
+            except aiohttp.ClientConnectionError:
+                # The request may have been sent: like TestHandler's read retries, only for GET and DELETE.
+                if request_type == "POST" or attempt >= self.retries:
+                    raise
+            attempt += 1
+            await asyncio.sleep(self.backoff_factor * (2 ** (attempt - 1)))
+
+        logger.info("status code: {}".format(status_code))
+        logger.info(json.dumps(body, indent=2))
+        assert status_code == int(expected_response_code)
+        return json.dumps(body)
+
+    async def process_message(self, message):
+        job_type = None
+        try:
+            message_body = json.loads(message.body)
+            job_type = str(message_body["job_type"]).strip()
+            logger.info("Received message of type : {}".format(job_type))
+            return await self.dispatch(job_type, message_body)
+        except Exception as e:
+            logger.error("#" * 20)
+            logger.error(str(e))
+            logger.error(traceback.format_exc())
+            if self.is_retryable(job_type, e):
+                raise
+            return 'ERROR : {}'.format(str(e))
+
+    def is_retryable(self, job_type, error):
+        import aiohttp
+        if job_type in self.NON_IDEMPOTENT_JOB_TYPES:
+            return isinstance(error, aiohttp.ClientConnectorError)
+        if isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+            return True
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status >= 500
+        return False
+
+    async def dispatch(self, job_type, message_body):
+        response, generation = self.read_cache(job_type, message_body)
+        if response is not None:
+            return response
+
+        try:
+            response = await self.call_coalesced(job_type, message_body)
+        finally:
+            self.invalidate_cache(job_type, message_body)
+
+        self.write_cache(job_type, message_body, response, generation)
+        return response
+
+    async def call_coalesced(self, job_type, message_body):
+        """
+        Identical reads already in flight await the same WPS call. Mutating job types always reach the server.
+        """
+        if not self.coalesce_requests or job_type not in self.COALESCED_JOB_TYPES:
+            return await self.call_wps(job_type, message_body)
+        key = (job_type, message_body.get('process_id'), message_body.get('job_id'))
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.call_wps(job_type, message_body))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def coalesce_stats(self):
+        # Same shape as SingleFlight.stats.
+        if not self.coalesce_requests:
+            return {}
+        return {'executed': self.executed, 'coalesced': self.coalesced, 'in_flight': len(self.in_flight)}
+
+    async def call_wps(self, job_type, message_body):
+        request = build_wps_request(job_type, message_body)
+        if request is None:
+            return "sorry!! {} is not a supported process".format(job_type)
+        href, request_type, expected_response_code, data, headers = request
+        return await self.submit_request(href, request_type, expected_response_code, data=data, headers=headers, timeout=self.get_timeout(job_type))
+
+
+def build_poller(config, handler, subscriber, publisher, lanes_config=None):
+    """
+    Builds the message poller selected by the poller_mode key of the [AWS_SQS_QUEUE] section.
+    """
+    poller_mode = str(config.get('poller_mode', 'serial')).strip().lower()
+    visibility_heartbeat = build_visibility_heartbeat(config)
+    error_queue_router = build_error_queue_router(config)
+    acknowledger = build_acknowledger(config)
+    if poller_mode == 'lanes':
+        lanes_config = lanes_config or {}
+        logger.info("Using one execution lane per job type")
+        return LaneMessagePoller(
+            handler=handler,
+            subscriber=subscriber,
+            publisher=publisher,
+            visibility_heartbeat=visibility_heartbeat,
+            error_queue_router=error_queue_router,
+            acknowledger=acknowledger,
+            lane_scheduler=build_lane_scheduler(lanes_config),
+            lane_key=handler.get_job_type,
+            lane_full_visibility_timeout=int(lanes_config.get('lane_full_visibility_timeout', 30)),
+            failed_visibility_timeout=int(config.get('failed_message_visibility_timeout', 30)),
+            stats_interval=int(lanes_config.get('stats_interval', 300))
+        )
+    elif poller_mode == 'concurrent':
+        workers = int(config.get('poller_workers', 4))
+        logger.info("Using concurrent poller with {} workers".format(workers))
+        return ConcurrentMessagePoller(
+            handler=handler,
+            subscriber=subscriber,
+            publisher=publisher,
+            visibility_heartbeat=visibility_heartbeat,
+            error_queue_router=error_queue_router,
+            acknowledger=acknowledger,
+            workers=workers,
+            max_in_flight=int(config.get('poller_max_in_flight', workers * 2)),
+            failed_visibility_timeout=int(config.get('failed_message_visibility_timeout', 30))
+        )
+    elif poller_mode == 'batch':
+        batch_size = int(config.get('batch_size', 100))
+        logger.info("Using batch poller with batches of up to {} messages".format(batch_size))
+        return BatchMessagePoller(
+            handler=handler,
+            subscriber=subscriber,
+            publisher=publisher,
+            visibility_heartbeat=visibility_heartbeat,
+            error_queue_router=error_queue_router,
+            acknowledger=acknowledger,
+            batch_size=batch_size,
+            batch_seconds=float(config.get('batch_seconds', 1))
+        )
+    elif poller_mode == 'pipelined':
+        workers = int(config.get('poller_workers', 4))
+        logger.info("Using pipelined poller with {} workers".format(workers))
+        return PipelinedMessagePoller(
+            handler=handler,
+            subscriber=subscriber,
+            publisher=publisher,
+            visibility_heartbeat=visibility_heartbeat,
+            error_queue_router=error_queue_router,
+            acknowledger=acknowledger,
+            workers=workers,
+            buffer_size=int(config.get('prefetch_buffer_size', 100)),
+            visibility_timeout=int(config.get('queue_visibility_timeout', 600))
+        )
+    elif poller_mode == 'async':
+        max_in_flight = int(config.get('async_max_in_flight', 1000))
+        logger.info("Using async poller with up to {} messages in flight".format(max_in_flight))
+        return AsyncMessagePoller(
+            handler=handler,
+            subscriber=build_async_subscriber(config),
+            publisher=build_async_publisher(config),
+            visibility_heartbeat=visibility_heartbeat,
+            error_queue_router=error_queue_router,
+            acknowledger=acknowledger,
+            max_in_flight=max_in_flight
+        )
+    elif poller_mode != 'serial':
+        raise Exception("Invalid poller mode : {}".format(poller_mode))
+    return MessagePoller(
+        handler=handler,
+        subscriber=subscriber,
+        publisher=publisher,
+        visibility_heartbeat=visibility_heartbeat,
+        error_queue_router=error_queue_router,
+        acknowledger=acknowledger
+    )
+
+
+def build_lane_scheduler(lanes_config):
+    """
+    Builds one lane per job type from the [EXECUTION_LANES] section (<job_type>_workers,
+    <job_type>_queue_depth). Messages without a known job type go to the default lane.
+    """
+    lanes = {}
+    for job_type in JOB_TYPES + ['default']:
+        slow = job_type in SLOW_JOB_TYPES or job_type == 'default'
+        lanes[job_type] = Lane(
+            job_type,
+            max_workers=int(lanes_config.get('{}_workers'.format(job_type.lower()), 2 if slow else 4)),
+            queue_depth=int(lanes_config.get('{}_queue_depth'.format(job_type.lower()), 8 if slow else 32))
+        )
+    return LaneScheduler(
+        lanes=lanes,
+        routes={job_type: job_type for job_type in JOB_TYPES},
+        default_lane='default'
+    )
+
+
+def build_visibility_heartbeat(config):
+    """
+    Builds the heartbeat that extends the visibility of in-flight messages, if enabled.
+    """
+    if str(config.get('visibility_heartbeat', False)).strip().lower() != 'true':
+        return None
+    interval = config.get('visibility_heartbeat_interval')
+    return VisibilityHeartbeatFactory(
+        access_key=config.get("aws_access_key"),
+        secret_key=config.get("aws_secret_key"),
+        region_name=config.get('region_name'),
+        max_pool_connections=int(config.get('max_pool_connections', 10)),
+        backend=config.get('sqs_backend', 'aws'),
+        visibility_timeout=int(config.get('queue_visibility_timeout', 600)),
+        interval=float(interval) if interval else None
+    ).build()
+
+
+def build_async_subscriber(config):
+    """
+    Builds the non-blocking subscriber of the async poller from the same keys as the daemon's subscriber.
+    """
+    return AsyncSubscriberFactory(
+        access_key=config.get("aws_access_key"),
+        secret_key=config.get("aws_secret_key"),
+        region_name=config.get('region_name'),
+        max_pool_connections=int(config.get('max_pool_connections', 10)),
+        backend=config.get('sqs_backend', 'aws'),
+        queue_url=config.get('queue_url'),
+        wait_time_seconds=int(config.get('wait_time', 0)),
+        empty_receive_backoff_initial=float(config.get('empty_receive_backoff_initial', 1)),
+        empty_receive_backoff_max=float(config.get('poll_interval', 0))
+    ).build()
+
+
+def build_async_publisher(config):
+    return AsyncPublisherFactory(
+        access_key=config.get("aws_access_key"),
+        secret_key=config.get("aws_secret_key"),
+        region_name=config.get('region_name'),
+        max_pool_connections=int(config.get('max_pool_connections', 10)),
+        backend=config.get('sqs_backend', 'aws')
+    ).build()
+
+
+def build_acknowledger(config):
+    """
+    Builds the acknowledger that deletes handled messages in the background, in batches,
+    unless ack_flush_interval is 0.
+    """
+    flush_interval = float(config.get('ack_flush_interval', 0.1))
+    if not flush_interval:
+        return None
+    return AcknowledgerFactory(
+        access_key=config.get("aws_access_key"),
+        secret_key=config.get("aws_secret_key"),
+        region_name=config.get('region_name'),
+        max_pool_connections=int(config.get('max_pool_connections', 10)),
+        backend=config.get('sqs_backend', 'aws'),
+        flush_interval=flush_interval,
+        max_attempts=int(config.get('ack_max_attempts', 3))
+    ).build()
+
+
+def build_error_queue_router(config):
+    """
+    Builds the router that moves messages failing max_receive_count times to error_queue_name, if set.
+    """
+    error_queue_name = str(config.get('error_queue_name') or '').strip()
+    if error_queue_name.lower() in ('', 'none'):
+        return None
+    return ErrorQueueRouterFactory(
+        access_key=config.get("aws_access_key"),
+        secret_key=config.get("aws_secret_key"),
+        region_name=config.get('region_name'),
+        max_pool_connections=int(config.get('max_pool_connections', 10)),
+        backend=config.get('sqs_backend', 'aws'),
+        error_queue_name=error_queue_name,
+        source_queue_url=config.get('queue_url'),
+        max_receive_count=int(config.get('max_receive_count', 5)),
+        visibility_timeout=int(config.get('error_queue_visibility_timeout', 600))
+    ).build()
+
+
+def build_handler(wps_config):
+    """
+    Builds the WPS-T handler from the [ADES_WPS-T_SERVER] section.
+    Per job type timeouts are read from <job_type>_timeout_sec keys, e.g. getstatus_timeout_sec.
+    """
+    default_timeout = wps_config.get('request_timeout_sec')
+    return TestHandler(
+        wps_server_url=wps_config["wps_server_url"],
+        pool_size=int(wps_config.get('http_pool_size', 10)),
+        retries=int(wps_config.get('http_retries', 3)),
+        backoff_factor=float(wps_config.get('http_backoff_factor', 0.5)),
+        timeouts=build_timeouts(wps_config),
+        default_timeout=float(default_timeout) if default_timeout else None,
+        response_caches=build_response_caches(wps_config),
+        coalesce_requests=str(wps_config.get('coalesce_requests', True)).strip().lower() == 'true',
+        batch_workers=int(wps_config.get('batch_workers', 4))
+    )
+
+
+def build_async_handler(wps_config):
+    """
+    Builds the aiohttp based handler of poller_mode = async from the [ADES_WPS-T_SERVER] section.
+    """
+    default_timeout = wps_config.get('request_timeout_sec')
+    return AsyncTestHandler(
+        wps_server_url=wps_config["wps_server_url"],
+        max_connections=int(wps_config.get('async_http_connections', 100)),
+        retries=int(wps_config.get('http_retries', 3)),
+        backoff_factor=float(wps_config.get('http_backoff_factor', 0.5)),
+        timeouts=build_timeouts(wps_config),
+        default_timeout=float(default_timeout) if default_timeout else None,
+        response_caches=build_response_caches(wps_config),
+        coalesce_requests=str(wps_config.get('coalesce_requests', True)).strip().lower() == 'true'
+    )
+
+
+def build_timeouts(wps_config):
+    """
+    Reads the per job type timeouts from <job_type>_timeout_sec keys, e.g. getstatus_timeout_sec.
+    """
+    timeouts = {}
+    for job_type in JOB_TYPES:
+        timeout = wps_config.get('{}_timeout_sec'.format(job_type.lower()))
+        if timeout:
+            timeouts[job_type] = float(timeout)
+    return timeouts
+
+
+def build_response_caches(wps_config):
+    """
+    Builds a response cache for every cacheable job type with a positive <job_type>_cache_ttl_sec.
+    """
+    caches = {}
+    for job_type in WpsHandler.CACHEABLE_JOB_TYPES:
+        ttl = float(wps_config.get('{}_cache_ttl_sec'.format(job_type.lower()), 0))
+        if ttl > 0:
+            caches[job_type] = TTLCache(
+                maxsize=int(wps_config.get('{}_cache_size'.format(job_type.lower()), 128)),
+                ttl=ttl
+            )
+    return caches
+
+
+def log_handler_stats(handler):
+    cache_stats = handler.cache_stats()
+    if cache_stats:
+        logger.info("Response cache stats: {}".format(cache_stats))
+    coalesce_stats = handler.coalesce_stats()
+    if coalesce_stats:
+        logger.info("Request coalescing stats: {}".format(coalesce_stats))
+
+
 class MyDaemon(Daemon):
+    def __init__(self, *args, handler=None, lanes_config=None, outbox_relay=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.handler = handler
+        self.lanes_config = lanes_config
+        self.outbox_relay = outbox_relay
+
     def run(self, config, publisher, subscriber):
         logger.info("Initializing listener")
-        poll = MessagePoller(
-            handler=TestHandler(),
-            subscriber=subscriber,
-            publisher=publisher
-        )
+        if self.outbox_relay:
+            self.outbox_relay.start()
+        handler = self.handler if self.handler else TestHandler()
+        stats_interval = int((config or {}).get('stats_log_interval', 300))
+        if stats_interval > 0:
+            Scheduler.default().call_every(stats_interval, log_handler_stats, handler)
+        poll = build_poller(config or {}, handler, subscriber, publisher, self.lanes_config)
         poll.start()
 
         logger.info("listener started")
@@ -256,20 +854,60 @@ if __name__ == "__main__":
         access_key=config["AWS_SQS_QUEUE"]["aws_access_key"],
         secret_key=config["AWS_SQS_QUEUE"]["aws_secret_key"],
         region_name=config["AWS_SQS_QUEUE"]['region_name'],
-        queue_url=config["AWS_SQS_QUEUE"]['queue_url']
+        max_pool_connections=config["AWS_SQS_QUEUE"].getint('max_pool_connections', 10),
+        backend=config["AWS_SQS_QUEUE"].get('sqs_backend', 'aws'),
+        queue_url=config["AWS_SQS_QUEUE"]['queue_url'],
+        wait_time_seconds=config["AWS_SQS_QUEUE"].getint('wait_time', 0),
+        empty_receive_backoff_initial=config["AWS_SQS_QUEUE"].getfloat('empty_receive_backoff_initial', 1),
+        empty_receive_backoff_max=config["AWS_SQS_QUEUE"].getfloat('poll_interval', 0)
     ).build()
 
-    publisher = PublisherFactory(
-        access_key=config["AWS_SQS_QUEUE"]["aws_access_key"],
-        secret_key=config["AWS_SQS_QUEUE"]["aws_secret_key"],
-        region_name=config["AWS_SQS_QUEUE"]['region_name']
-    ).build()
+    reply_batch_size = config["AWS_SQS_QUEUE"].getint('reply_batch_size', 1)
+    outbox_path = config["AWS_SQS_QUEUE"].get('outbox_path')
+    outbox_relay = None
+    if outbox_path:
+        publisher = RetryPublisherFactory(
+            access_key=config["AWS_SQS_QUEUE"]["aws_access_key"],
+            secret_key=config["AWS_SQS_QUEUE"]["aws_secret_key"],
+            region_name=config["AWS_SQS_QUEUE"]['region_name'],
+            max_pool_connections=config["AWS_SQS_QUEUE"].getint('max_pool_connections', 10),
+            backend=config["AWS_SQS_QUEUE"].get('sqs_backend', 'aws'),
+            retries=config["AWS_SQS_QUEUE"].getint('publish_retries', 3),
+            outbox_path=outbox_path
+        ).build()
+        outbox_relay = OutboxRelayFactory(
+            access_key=config["AWS_SQS_QUEUE"]["aws_access_key"],
+            secret_key=config["AWS_SQS_QUEUE"]["aws_secret_key"],
+            region_name=config["AWS_SQS_QUEUE"]['region_name'],
+            max_pool_connections=config["AWS_SQS_QUEUE"].getint('max_pool_connections', 10),
+            backend=config["AWS_SQS_QUEUE"].get('sqs_backend', 'aws'),
+            outbox_path=outbox_path,
+            poll_interval=config["AWS_SQS_QUEUE"].getfloat('outbox_poll_interval', 1)
+        ).build()
+    elif reply_batch_size > 1:
+        publisher = BatchPublisherFactory(
+            access_key=config["AWS_SQS_QUEUE"]["aws_access_key"],
+            secret_key=config["AWS_SQS_QUEUE"]["aws_secret_key"],
+            region_name=config["AWS_SQS_QUEUE"]['region_name'],
+            max_pool_connections=config["AWS_SQS_QUEUE"].getint('max_pool_connections', 10),
+            backend=config["AWS_SQS_QUEUE"].get('sqs_backend', 'aws'),
+            batch_size=reply_batch_size,
+            flush_interval=config["AWS_SQS_QUEUE"].getfloat('reply_batch_flush_interval', 0.05)
+        ).build()
+    else:
+        publisher = PublisherFactory(
+            access_key=config["AWS_SQS_QUEUE"]["aws_access_key"],
+            secret_key=config["AWS_SQS_QUEUE"]["aws_secret_key"],
+            region_name=config["AWS_SQS_QUEUE"]['region_name'],
+            max_pool_connections=config["AWS_SQS_QUEUE"].getint('max_pool_connections', 10),
+            backend=config["AWS_SQS_QUEUE"].get('sqs_backend', 'aws')
+        ).build()
 
     sqs_config={}
     for key in config["AWS_SQS_QUEUE"]:
         sqs_config[key] = config["AWS_SQS_QUEUE"][key]
-    if config["AWS_SQS_QUEUE"][key].isnumeric():
-        sqs_config[key] = int(config["AWS_SQS_QUEUE"][key])
+        if config["AWS_SQS_QUEUE"][key].isnumeric():
+            sqs_config[key] = int(config["AWS_SQS_QUEUE"][key])
     
     daemon_config = config['DAEMON']
     pid_path = daemon_config.get('PID_FILE_PATH')
@@ -278,7 +916,13 @@ if __name__ == "__main__":
     std_in = daemon_config.get('DAEMON_STDIN', '/dev/null')
     overwrite = daemon_config.get('DAEMON_OUTPUT_OVERWRITE', False)  
   
-    daemon = MyDaemon(pidfile=pid_path, overwrite=overwrite, stdout=output_log, stderr=error_log, sqs_config=sqs_config, publisher=publisher, subscriber=subscriber)
+    if config["AWS_SQS_QUEUE"].get('poller_mode', 'serial').strip().lower() == 'async':
+        handler = build_async_handler(config["ADES_WPS-T_SERVER"])
+    else:
+        handler = build_handler(config["ADES_WPS-T_SERVER"])
+    lanes_config = config["EXECUTION_LANES"] if config.has_section("EXECUTION_LANES") else {}
+
+    daemon = MyDaemon(pidfile=pid_path, overwrite=overwrite, stdout=output_log, stderr=error_log, sqs_config=sqs_config, publisher=publisher, subscriber=subscriber, handler=handler, lanes_config=lanes_config, outbox_relay=outbox_relay)
     
     if 'start' == args.mode.lower():
         logger.info("Starting listener daemon")
@@ -288,8 +932,14 @@ if __name__ == "__main__":
        daemon.stop()
     elif 'restart' == args.mode.lower():
         daemon.restart()
+    elif 'redrive' == args.mode.lower():
+        error_queue_router = build_error_queue_router(sqs_config)
+        if not error_queue_router:
+            logger.info("error_queue_name is not configured")
+            sys.exit(2)
+        logger.info("Redriving {} messages".format(error_queue_router.redrive()))
     else:
-        logger.info("usage: %s start|stop|restart --verbose -c <config_file>" % sys.argv[0])
+        logger.info("usage: %s start|stop|restart|redrive --verbose -c <config_file>" % sys.argv[0])
         sys.exit(2)
 
     '''
@@ -4,10 +4,14 @@ import logging
 import configparser
 import json
 import os
+import sys
 import uuid
+from threading import BoundedSemaphore, Lock, RLock
+from concurrent.futures import wait
 
 from sqs_client.factories import ReplyQueueFactory, PublisherFactory
 from sqs_client.message import RequestMessage
+from sqs_client.client import RequestReplyClient
 from sqs_client.exceptions import ReplyTimeout
 from constants import constants as const
 
@@ -16,32 +20,66 @@ logger.setLevel(logging.INFO)
 
 
 CONFIG_FILER_PATH = r'sqsconfig.py'
-
-config = configparser.ConfigParser()
-config.read(CONFIG_FILER_PATH)
-
-os.environ["AWS_ACCOUNT_ID"] = config["AWS_SQS_QUEUE"]["AWS_ACCOUNT_ID"]
-os.environ["AWS_ACCESS_KEY"] = config["AWS_SQS_QUEUE"]["aws_access_key"]
-os.environ["AWS_SECRET_ACCESS_KEY"] = config["AWS_SQS_QUEUE"]["aws_secret_key"]
-wps_server = config["ADES_WPS-T_SERVER"]["wps_server_url"]
-queue_url = config["AWS_SQS_QUEUE"]['queue_url']
-reply_timeout_sec = int(config["AWS_SQS_QUEUE"].get("reply_timeout_sec", 20))
-execute_reply_timeout_sec = int(config["AWS_SQS_QUEUE"].get("execute_reply_timeout_sec", 600))
-deploy_process_timeout_sec = int(config["AWS_SQS_QUEUE"].get("deploy_process_timeout_sec", 900))
-
-reply_queue_name = 'reply_queue_{}'.format(os.path.basename(queue_url))
-reply_queue = ReplyQueueFactory(
-    name=reply_queue_name,
-    access_key=config["AWS_SQS_QUEUE"]["aws_access_key"],
-    secret_key=config["AWS_SQS_QUEUE"]["aws_secret_key"],
-    region_name=config["AWS_SQS_QUEUE"]['region_name']
-).build()
-
-publisher = PublisherFactory(
-    access_key=config["AWS_SQS_QUEUE"]["aws_access_key"],
-    secret_key=config["AWS_SQS_QUEUE"]["aws_secret_key"],
-    region_name=config["AWS_SQS_QUEUE"]['region_name']
-).build()
+# extra seconds the batch command waits for replies past the largest reply timeout
+REPLY_WAIT_MARGIN_SEC = 30
+
+# Config, reply queue and publisher are only built by the first command that
+# sends a request, so --help and argument errors never load the AWS clients.
+_config = None
+_reply_queue = None
+_publisher = None
+_init_lock = RLock()
+
+def get_config():
+    global _config
+    with _init_lock:
+        if _config is None:
+            config = configparser.ConfigParser()
+            config.read(CONFIG_FILER_PATH)
+            os.environ["AWS_ACCOUNT_ID"] = config["AWS_SQS_QUEUE"]["AWS_ACCOUNT_ID"]
+            os.environ["AWS_ACCESS_KEY"] = config["AWS_SQS_QUEUE"]["aws_access_key"]
+            os.environ["AWS_SECRET_ACCESS_KEY"] = config["AWS_SQS_QUEUE"]["aws_secret_key"]
+            _config = config
+        return _config
+
+def get_queue_url():
+    return get_config()["AWS_SQS_QUEUE"]['queue_url']
+
+def get_reply_queue():
+    global _reply_queue
+    config = get_config()
+    with _init_lock:
+        if _reply_queue is None:
+            _reply_queue = ReplyQueueFactory(
+                name='reply_queue_{}'.format(os.path.basename(get_queue_url())),
+                access_key=config["AWS_SQS_QUEUE"]["aws_access_key"],
+                secret_key=config["AWS_SQS_QUEUE"]["aws_secret_key"],
+                region_name=config["AWS_SQS_QUEUE"]['region_name'],
+                backend=config["AWS_SQS_QUEUE"].get('sqs_backend', 'aws'),
+                virtual=config["AWS_SQS_QUEUE"].get('virtual_reply_queues', 'false').lower() == 'true',
+                sweep_workers=config["AWS_SQS_QUEUE"].getint('sweep_workers', 8),
+                use_sweeper_queue=config["AWS_SQS_QUEUE"].get('use_sweeper_queue', 'false').lower() == 'true',
+                leader_election=get_sweeper_leader_election(),
+                lease_path=config["AWS_SQS_QUEUE"].get('sweeper_lease_path')
+            ).build()
+        return _reply_queue
+
+def get_sweeper_leader_election():
+    leader_election = get_config()["AWS_SQS_QUEUE"].get('sweeper_leader_election', 'queue_tag').strip().lower()
+    return None if leader_election in ('', 'none') else leader_election
+
+def get_publisher():
+    global _publisher
+    config = get_config()
+    with _init_lock:
+        if _publisher is None:
+            _publisher = PublisherFactory(
+                access_key=config["AWS_SQS_QUEUE"]["aws_access_key"],
+                secret_key=config["AWS_SQS_QUEUE"]["aws_secret_key"],
+                region_name=config["AWS_SQS_QUEUE"]['region_name'],
+                backend=config["AWS_SQS_QUEUE"].get('sqs_backend', 'aws')
+            ).build()
+        return _publisher
 
 
 
@@ -61,7 +99,9 @@ logging.basicConfig(level=logging.INFO)
 
 app = typer.Typer()
 
-def submit_message(data, timeout=reply_timeout_sec):
+def submit_message(data, timeout=None):
+    queue_url = get_queue_url()
+    reply_queue = get_reply_queue()
     message = RequestMessage(
         body= json.dumps(data),
         queue_url= queue_url,
@@ -71,25 +111,20 @@ def submit_message(data, timeout=reply_timeout_sec):
 
     if queue_url.lower().endswith("fifo"):
         print("FIFO Queue: {}".format(queue_url.lower()))
-        try:
-            group_id=config["AWS_SQS_QUEUE"]['fifo_group_id']
-        except:
-            group_id = "SOAMC_DEFAULT_GROUP"
-
         data["uuid"] = uuid.uuid4().hex
         message = RequestMessage(
             body= json.dumps(data),
             queue_url= queue_url,
             reply_queue=reply_queue,
-            group_id=group_id
+            group_id=get_group_id()
     )
 
     print("submit_message : queue_url : {} reply_queue : {} data : {}".format(queue_url, reply_queue, json.dumps(data)))
-    publisher.send_message(message)
+    get_publisher().send_message(message)
     print("submit_message : sent")
 
     try:
-        response = message.get_response(timeout=20)
+        response = message.get_response(timeout=timeout or get_reply_timeout(data.get('job_type')))
         #print(response.body)
         return json.loads(response.body)
     except ReplyTimeout:
@@ -114,7 +149,7 @@ def getProcesses():
 @app.command()
 def deployProcess(payload:str):
     data = {'job_type': const.DEPLOY_PROCESS, 'payload_data' : payload}
-    response = submit_message(data, timeout=deploy_process_timeout_sec)
+    response = submit_message(data)
     print(json.dumps(response, indent=2))
 
 @app.command()
@@ -146,7 +181,7 @@ def execute(process_id: str, payload_data: str):
     else:
         payload =  payload_data
     data = {'job_type': const.EXECUTE, 'process_id' : process_id, 'payload_data' : payload}
-    response = submit_message(data, timeout=execute_reply_timeout_sec)
+    response = submit_message(data)
     print(json.dumps(response, indent=2))
 
 @app.command()
@@ -170,11 +205,81 @@ def getResult(process_id: str, job_id:str):
     response = submit_message(data)
     print(json.dumps(response, indent=2))
 
-if __name__=="__main__":
-    sqs_config={}
-    for key in config["AWS_SQS_QUEUE"]:
-        sqs_config[key] = config["AWS_SQS_QUEUE"][key]
-    if config["AWS_SQS_QUEUE"][key].isnumeric():
-        sqs_config[key] = int(config["AWS_SQS_QUEUE"][key])
+def get_reply_timeout(job_type):
+    config = get_config()
+    if job_type == const.EXECUTE:
+        return int(config["AWS_SQS_QUEUE"].get("execute_reply_timeout_sec", 600))
+    if job_type == const.DEPLOY_PROCESS:
+        return int(config["AWS_SQS_QUEUE"].get("deploy_process_timeout_sec", 900))
+    return int(config["AWS_SQS_QUEUE"].get("reply_timeout_sec", 20))
+
+def get_group_id():
+    if not get_queue_url().lower().endswith("fifo"):
+        return None
+    try:
+        return get_config()["AWS_SQS_QUEUE"]['fifo_group_id']
+    except:
+        return "SOAMC_DEFAULT_GROUP"
 
+@app.command()
+def batch(requests_file: str, concurrency: int = 10):
+    """
+    Sends the requests of a JSONL file (one {"job_type": ...} object per line)
+    over a single reply queue, at most CONCURRENCY at a time, and prints each
+    response as a JSON line as soon as it arrives.
+    """
+    slots = BoundedSemaphore(concurrency)
+    output_lock = Lock()
+    reported = set()
+
+    def report(line_number, data, response):
+        with output_lock:
+            if line_number in reported:
+                return
+            reported.add(line_number)
+            sys.stdout.write(json.dumps({"line": line_number, "request": data, "response": response}) + "\n")
+            sys.stdout.flush()
+
+    def on_response(line_number, data, future):
+        try:
+            response = json.loads(future.result().body)
+        except ReplyTimeout:
+            response = {"Error:": "Timeout"}
+        except Exception as e:
+            response = {"Error": str(e)}
+        report(line_number, data, response)
+        slots.release()
+
+    queue_url = get_queue_url()
+    client = RequestReplyClient(get_publisher(), get_reply_queue(), queue_url, group_id=get_group_id())
+    futures = {}
+    max_timeout = 0
+    with client, open(requests_file, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if queue_url.lower().endswith("fifo"):
+                data["uuid"] = uuid.uuid4().hex
+            timeout = get_reply_timeout(data.get('job_type'))
+            max_timeout = max(max_timeout, timeout)
+            # Replies time out on the reply queue's subscriber thread; if it died, nothing frees a slot.
+            if not slots.acquire(timeout=max_timeout + REPLY_WAIT_MARGIN_SEC):
+                sys.stderr.write("No reply received for {} seconds, not sending line {} onwards\n".format(
+                    max_timeout + REPLY_WAIT_MARGIN_SEC, line_number
+                ))
+                break
+            future = client.submit(json.dumps(data), timeout=timeout)
+            future.add_done_callback(lambda future, line_number=line_number, data=data: on_response(line_number, data, future))
+            futures[future] = (line_number, data)
+        _, pending = wait(futures, timeout=max_timeout + REPLY_WAIT_MARGIN_SEC)
+        for future in pending:
+            report(*futures[future], {"Error": "No reply received"})
+        if pending:
+            sys.stderr.write("{} requests are still pending\n".format(len(pending)))
+        # Callbacks run after the futures complete; wait for the last ones to print.
+        for _ in range(concurrency - len(pending)):
+            slots.acquire(timeout=REPLY_WAIT_MARGIN_SEC)
+
+if __name__=="__main__":
     app()
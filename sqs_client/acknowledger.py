@@ -0,0 +1,198 @@
+import logging
+from time import time
+from collections import deque
+from threading import Thread, Condition
+
+from sqs_client.utils import percentile
+from sqs_client.contracts import SqsConnection, Message
+
+
+class Acknowledger:
+    """
+        Deletes handled messages in the background with DeleteMessageBatch.
+
+        Any number of workers hand their messages to ack. Receipt handles are
+        buffered per queue url; a queue's buffer is handed to the flush thread
+        when it holds batch_size handles or flush_interval seconds after its
+        first handle was buffered, so workers never wait for the delete.
+
+        Only the entries of a batch that failed are retried, with the next
+        flush, up to max_attempts times; entries rejected as the sender's
+        fault (e.g. an expired receipt handle) are not. get_ack_stats reports
+        the latency between ack and the confirmed delete; it is logged every
+        stats_log_interval deleted messages.
+
+        Ex.:
+            acknowledger = Acknowledger(sqs_connection)
+            acknowledger.ack(queue_url, message)
+            ...
+            acknowledger.close()
+    """
+
+    MAX_BATCH_SIZE = 10
+
+    def __init__(self,
+        sqs_connection: SqsConnection,
+        batch_size: int=10,
+        flush_interval: float=0.1,
+        max_attempts: int=3,
+        latency_window: int=1000,
+        stats_log_interval: int=1000
+    ):
+        self._connection = sqs_connection
+        self._batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        self._flush_interval = flush_interval
+        self._max_attempts = max_attempts
+        self._stats_log_interval = stats_log_interval
+        self._pending = {}
+        self._ready = []
+        self._condition = Condition()
+        self._flush_thread = None
+        self._closed = False
+        self._latencies = deque(maxlen=latency_window)
+        self._acked = 0
+        self._retried = 0
+        self._failed = 0
+        self._logger = logging.getLogger()
+
+    def ack(self, queue_url: str, message: Message):
+        self._buffer(queue_url, [{'receipt_handle': message.receipt_handle, 'acked_at': time(), 'attempts': 0}])
+
+    def flush(self):
+        """
+            Deletes everything buffered on the calling thread.
+        """
+        with self._condition:
+            batches = self._ready + [(queue_url, batch['entries']) for queue_url, batch in self._pending.items()]
+            self._ready = []
+            self._pending = {}
+        for queue_url, entries in batches:
+            self._delete(queue_url, entries)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.flush()
+
+    def get_ack_stats(self) -> dict:
+        with self._condition:
+            latencies = list(self._latencies)
+            stats = {
+                'acked': self._acked,
+                'retried': self._retried,
+                'failed': self._failed,
+                'pending': sum(len(batch['entries']) for batch in self._pending.values())
+                    + sum(len(entries) for _, entries in self._ready)
+            }
+        if latencies:
+            stats.update({
+                'latency_avg': sum(latencies) / len(latencies),
+                'latency_p50': percentile(latencies, 0.5),
+                'latency_p99': percentile(latencies, 0.99),
+                'latency_max': max(latencies)
+            })
+        return stats
+
+    def _buffer(self, queue_url, entries):
+        with self._condition:
+            self._start_flush_thread()
+            for entry in entries:
+                pending = self._pending.get(queue_url)
+                if not pending:
+                    pending = {'entries': [], 'since': time()}
+                    self._pending[queue_url] = pending
+                pending['entries'].append(entry)
+                if len(pending['entries']) >= self._batch_size:
+                    self._ready.append((queue_url, self._pending.pop(queue_url)['entries']))
+            self._condition.notify()
+
+    def _start_flush_thread(self):
+        if self._flush_thread:
+            return
+        self._closed = False
+        self._flush_thread = Thread(target=self._flush_periodically)
+        self._flush_thread.daemon = True
+        self._flush_thread.start()
+
+    def _flush_periodically(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._ready and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    self._flush_thread = None
+                    return
+                batches = self._ready
+                self._ready = []
+                if not batches:
+                    oldest = min(batch['since'] for batch in self._pending.values())
+                    wait = oldest + self._flush_interval - time()
+                    if wait > 0:
+                        self._condition.wait(wait)
+                        continue
+                    now = time()
+                    due = [
+                        queue_url for queue_url, batch in self._pending.items()
+                        if now - batch['since'] >= self._flush_interval
+                    ]
+                    batches = [(queue_url, self._pending.pop(queue_url)['entries']) for queue_url in due]
+            for queue_url, entries in batches:
+                self._delete(queue_url, entries)
+
+    def _delete(self, queue_url, entries):
+        try:
+            response = self._connection.client.delete_message_batch(
+                QueueUrl=queue_url,
+                Entries=[
+                    {'Id': str(index), 'ReceiptHandle': entry['receipt_handle']}
+                    for index, entry in enumerate(entries)
+                ]
+            )
+        except Exception as e:
+            self._logger.exception('Error while trying to delete {} messages'.format(len(entries)))
+            self._retry(queue_url, entries)
+            return
+        now = time()
+        with self._condition:
+            acked = self._acked
+            for result in response.get('Successful', []):
+                self._latencies.append(now - entries[int(result['Id'])]['acked_at'])
+                self._acked += 1
+            log_stats = self._stats_log_interval and acked // self._stats_log_interval != self._acked // self._stats_log_interval
+        if log_stats:
+            self._logger.info('Ack stats: {}'.format(self.get_ack_stats()))
+        retries = []
+        for failure in response.get('Failed', []):
+            if failure.get('SenderFault'):
+                self._logger.warning('A message could not be deleted: {}'.format(failure))
+                self._count_failed(1)
+            else:
+                retries.append(entries[int(failure['Id'])])
+        if retries:
+            self._retry(queue_url, retries)
+
+    def _retry(self, queue_url, entries):
+        retries = []
+        for entry in entries:
+            entry['attempts'] += 1
+            if entry['attempts'] < self._max_attempts:
+                retries.append(entry)
+        if len(retries) < len(entries):
+            self._logger.error('{} messages could not be deleted after {} attempts'.format(
+                len(entries) - len(retries), self._max_attempts
+            ))
+            self._count_failed(len(entries) - len(retries))
+        if not retries:
+            return
+        with self._condition:
+            self._retried += len(retries)
+            closed = self._closed
+        if closed:
+            self._delete(queue_url, retries)
+        else:
+            self._buffer(queue_url, retries)
+
+    def _count_failed(self, count):
+        with self._condition:
+            self._failed += count
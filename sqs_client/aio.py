@@ -0,0 +1,228 @@
+import asyncio
+import logging
+from logging import exception
+from functools import partial
+
+from sqs_client.acknowledger import Acknowledger
+from sqs_client.backoff import ExponentialBackoff
+from sqs_client.error_queue import ErrorQueueRouter, ROUTED_ATTRIBUTE_NAMES
+from sqs_client.message import RequestMessage, MessageList
+from sqs_client.subscriber import REPLY_ATTRIBUTE_NAMES
+from sqs_client.visibility import VisibilityHeartbeat
+from sqs_client.contracts import (
+    SqsConnection,
+    AsyncMessageHandler,
+    AsyncSubscriber as AsyncSubscriberBase,
+    AsyncPublisher as AsyncPublisherBase,
+    AsyncMessagePoller as AsyncMessagePollerBase
+)
+
+
+async def run_blocking(executor, fn, *args, **kwargs):
+    """
+        Runs a blocking call, e.g. of the boto3 client, on executor (the
+        loop's default executor when None) without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+class AsyncSubscriber(AsyncSubscriberBase):
+    """
+        Receives messages without blocking the event loop.
+
+        boto3 has no asyncio client, so each ReceiveMessage runs on a thread
+        of executor: one thread is held per outstanding receive, however
+        many of the received messages are being processed.
+    """
+
+    def __init__(self,
+        sqs_connection: SqsConnection,
+        queue_url=None,
+        max_number_of_messages=10,
+        wait_time_seconds=0,
+        empty_receive_backoff: ExponentialBackoff=None,
+        executor=None
+    ):
+        self._connection = sqs_connection
+        self._queue_url = queue_url
+        self._max_number_of_messages = max_number_of_messages
+        self._wait_time_seconds = min(int(wait_time_seconds or 0), 20)
+        self._empty_receive_backoff = empty_receive_backoff
+        self._executor = executor
+
+    def set_queue(self, queue_url):
+        self._queue_url = queue_url
+
+    async def receive_messages(self, return_none=False, message_attribute_names=[], attribute_names=None):
+        while True:
+            params = {
+                'QueueUrl': self._queue_url,
+                'MaxNumberOfMessages': self._max_number_of_messages,
+                'MessageAttributeNames': message_attribute_names
+            }
+            if attribute_names:
+                params['AttributeNames'] = attribute_names
+            if self._wait_time_seconds:
+                params['WaitTimeSeconds'] = self._wait_time_seconds
+            messages = await run_blocking(self._executor, self._connection.client.receive_message, **params)
+            if 'Messages' in messages:
+                if self._empty_receive_backoff:
+                    self._empty_receive_backoff.reset()
+                yield MessageList(self._connection.client, self._queue_url, messages)
+                continue
+
+            if self._empty_receive_backoff:
+                await asyncio.sleep(self._empty_receive_backoff.next())
+            if return_none:
+                yield None
+
+
+class AsyncPublisher(AsyncPublisherBase):
+
+    def __init__(self, sqs_connection: SqsConnection, executor=None):
+        self._connection = sqs_connection
+        self._executor = executor
+
+    async def send_message(self, request_message: RequestMessage):
+        return await run_blocking(
+            self._executor,
+            self._connection.client.send_message,
+            QueueUrl=request_message.queue_url,
+            **request_message.get_params()
+        )
+
+
+class AsyncMessagePoller(AsyncMessagePollerBase):
+    """
+        Processes up to max_in_flight messages at once on one event loop, so
+        an I/O bound AsyncMessageHandler can keep thousands of requests
+        outstanding without a thread each. The receive loop waits for a free
+        slot before taking the next message.
+
+        Each message is deleted as soon as its own handler finishes and its
+        reply was sent, through the acknowledger if given. A failed message,
+        or one whose reply could not be sent, is left in the queue or moved to
+        the error queue, as with MessagePoller.
+    """
+
+    def __init__(self,
+        handler: AsyncMessageHandler,
+        subscriber: AsyncSubscriber,
+        publisher: AsyncPublisher,
+        request_message_class=RequestMessage,
+        max_in_flight: int=100,
+        visibility_heartbeat: VisibilityHeartbeat=None,
+        error_queue_router: ErrorQueueRouter=None,
+        acknowledger: Acknowledger=None,
+        executor=None
+    ):
+        self._handler = handler
+        self._subscriber = subscriber
+        self._publisher = publisher
+        self._request_message_class = request_message_class
+        self._max_in_flight = max_in_flight
+        self._visibility_heartbeat = visibility_heartbeat
+        self._error_queue_router = error_queue_router
+        self._acknowledger = acknowledger
+        self._executor = executor
+        self._logger = logging.getLogger()
+
+    def start(self):
+        asyncio.run(self.run())
+
+    async def run(self):
+        if self._visibility_heartbeat:
+            self._visibility_heartbeat.start()
+        in_flight = asyncio.Semaphore(self._max_in_flight)
+        tasks = set()
+        try:
+            async for messages in self._subscriber.receive_messages(**self._receive_params()):
+                received = list(messages)
+                if self._visibility_heartbeat:
+                    for message in received:
+                        self._visibility_heartbeat.track(messages.queue, message)
+                for message in received:
+                    await in_flight.acquire()
+                    task = asyncio.ensure_future(self._process(messages, message, in_flight))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                await self._handler.close()
+            except Exception as e:
+                exception('Error while trying to close the handler')
+            if self._acknowledger:
+                await run_blocking(self._executor, self._acknowledger.close)
+            if self._visibility_heartbeat:
+                self._visibility_heartbeat.stop()
+
+    def _receive_params(self) -> dict:
+        return {
+            'message_attribute_names': ['ReplyTo'] + REPLY_ATTRIBUTE_NAMES,
+            'attribute_names': ROUTED_ATTRIBUTE_NAMES if self._error_queue_router else None
+        }
+
+    async def _process(self, messages, message, in_flight):
+        try:
+            if await self._handle(message):
+                await self._acknowledge(messages, message)
+        except Exception as e:
+            exception('Error while trying to delete a message')
+        finally:
+            if self._visibility_heartbeat:
+                self._visibility_heartbeat.untrack(messages.queue, message)
+            in_flight.release()
+
+    async def _handle(self, message) -> bool:
+        """
+            Processes a message and replies to it.
+            Returns False when the message must be kept in the queue.
+        """
+        try:
+            response = await self._handler.process_message(message)
+        except Exception as e:
+            exception('Error while trying to process a message')
+            return await self._route_to_error_queue(message, e)
+        return await self._send_response(message, response)
+
+    async def _acknowledge(self, messages, message):
+        if self._acknowledger:
+            await run_blocking(self._executor, self._acknowledger.ack, messages.queue, message)
+        else:
+            await run_blocking(self._executor, messages.delete_message, message)
+
+    async def _route_to_error_queue(self, message, error) -> bool:
+        if not self._error_queue_router:
+            return False
+        try:
+            return await run_blocking(self._executor, self._error_queue_router.route, message, error)
+        except Exception as e:
+            exception('Error while trying to move a message to the error queue')
+            return False
+
+    async def _send_response(self, message, response=None) -> bool:
+        """
+            Returns False when the reply could not be sent.
+        """
+        if not response:
+            return True
+        reply_queue_url = message.reply_queue_url
+        if not reply_queue_url:
+            return True
+        try:
+            response_message = self._request_message_class(
+                body=response,
+                queue_url=reply_queue_url,
+                message_attributes={
+                    name: message.attributes[name]
+                    for name in REPLY_ATTRIBUTE_NAMES if name in message.attributes
+                }
+            )
+            await self._publisher.send_message(response_message)
+        except Exception as e:
+            exception('The reply to message {} could not be sent, keeping it'.format(message.id))
+            return False
+        return True
@@ -0,0 +1,47 @@
+import random
+
+
+class ExponentialBackoff:
+    """
+        Computes growing delays between attempts.
+
+        Ex.:
+            backoff = ExponentialBackoff(initial_seconds=1, max_seconds=60)
+            backoff.next()  # 1
+            backoff.next()  # 2
+            backoff.reset()
+    """
+
+    def __init__(self, 
+        initial_seconds: float=1, 
+        max_seconds: float=60, 
+        multiplier: float=2, 
+        jitter: bool=False
+    ):
+        self._initial_seconds = initial_seconds
+        self._max_seconds = max_seconds
+        self._multiplier = multiplier
+        self._jitter = jitter
+        self._attempts = 0
+
+    @property
+    def attempts(self) -> int:
+        return self._attempts
+
+    def delay(self, attempts: int) -> float:
+        """
+            Returns the delay for the given number of previous attempts.
+            With jitter, the delay is drawn uniformly between zero and that value.
+        """
+        seconds = min(self._initial_seconds * (self._multiplier ** attempts), self._max_seconds)
+        if self._jitter:
+            return random.uniform(0, seconds)
+        return seconds
+
+    def next(self) -> float:
+        seconds = self.delay(self._attempts)
+        self._attempts += 1
+        return seconds
+
+    def reset(self):
+        self._attempts = 0
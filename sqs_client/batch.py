@@ -0,0 +1,37 @@
+from sqs_client.contracts import Message
+
+
+class BatchResult:
+    """
+        Outcome of BatchMessageHandler.process_batch, per message.
+
+        A message with a reply is answered and deleted, a failed one is kept
+        in the queue (or moved to the error queue) like a message whose
+        process_message raised. Messages the result does not mention are
+        treated as failed.
+    """
+
+    def __init__(self):
+        self._replies = {}
+        self._failures = {}
+
+    def add_reply(self, message: Message, reply):
+        self._replies[message.id] = reply
+
+    def add_failure(self, message: Message, error: Exception):
+        self._failures[message.id] = error
+
+    def get_reply(self, message: Message):
+        return self._replies.get(message.id)
+
+    def get_failure(self, message: Message) -> Exception:
+        return self._failures.get(message.id)
+
+    def failed(self, message: Message) -> bool:
+        return message.id in self._failures
+
+    def mentions(self, message: Message) -> bool:
+        return message.id in self._replies or message.id in self._failures
+
+    def __len__(self):
+        return len(self._replies) + len(self._failures)
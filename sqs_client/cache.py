@@ -0,0 +1,79 @@
+from time import time
+from threading import Lock
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+        Thread safe LRU cache whose entries expire ttl seconds after being set.
+
+        Ex.:
+            cache = TTLCache(maxsize=100, ttl=60)
+            cache.set('key', 'value')
+            cache.get('key')  # 'value'
+            cache.stats()     # {'hits': 1, 'misses': 0, 'size': 1, ...}
+    """
+
+    def __init__(self, maxsize: int=128, ttl: float=60, clock=time):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._generation = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > self._clock():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+            self._misses += 1
+            return default
+
+    def generation(self) -> int:
+        """
+            Changes whenever an entry is invalidated or the cache is cleared.
+        """
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, generation: int=None):
+        """
+            With the generation read before the value was computed, the value
+            is dropped if the cache was invalidated meanwhile, as it may be stale.
+        """
+        if self._maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (value, self._clock() + self._ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'size': len(self._entries),
+                'maxsize': self._maxsize,
+                'ttl': self._ttl
+            }
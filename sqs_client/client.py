@@ -0,0 +1,61 @@
+import logging
+from concurrent.futures import Future
+
+from sqs_client.message import RequestMessage
+from sqs_client.contracts import Publisher, ReplyQueue
+
+
+class RequestReplyClient:
+    """
+        Sends many requests through one long lived reply queue.
+
+        Each request gets a future of its reply, correlated by RequestMessageId,
+        so any number of requests can be outstanding at once.
+
+        Ex.:
+            with RequestReplyClient(publisher, reply_queue, queue_url) as client:
+                futures = [client.submit(body, timeout=20) for body in bodies]
+                for future in as_completed(futures):
+                    print(future.result().body)
+    """
+
+    def __init__(self, 
+        publisher: Publisher, 
+        reply_queue: ReplyQueue, 
+        queue_url: str, 
+        group_id: str=None,
+        request_message_class=RequestMessage
+    ):
+        self._publisher = publisher
+        self._reply_queue = reply_queue
+        self._queue_url = queue_url
+        self._group_id = group_id
+        self._request_message_class = request_message_class
+        self._logger = logging.getLogger()
+
+    def submit(self, body: str, timeout: int=20) -> Future:
+        message = self._request_message_class(
+            body=body,
+            queue_url=self._queue_url,
+            reply_queue=self._reply_queue,
+            group_id=self._group_id
+        )
+        # Registered before sending, so a fast reply cannot be missed.
+        future = self._reply_queue.get_response_future(message.request_id, timeout)
+        try:
+            self._publisher.send_message(message)
+            self._publisher.flush()
+        except Exception as e:
+            self._logger.exception('Error while trying to send a request')
+            if not future.done():
+                future.set_exception(e)
+        return future
+
+    def close(self):
+        self._reply_queue.remove_queue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
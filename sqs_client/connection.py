@@ -1,41 +1,129 @@
-import boto3
+import os
+from threading import Lock
 
 from sqs_client.contracts import SqsConnection as SqsConnectionBase
 
+
+class SqsConnectionRegistry:
+    """
+        Process wide registry of boto3 sessions and sqs clients.
+
+        Entries are keyed by region, credentials and pool size, created on
+        first use and shared by every SqsConnection of the process. boto3
+        clients are thread safe; sessions are only used under the registry
+        lock. A forked child starts with an empty registry, so it never
+        reuses the parent's HTTP connections.
+
+        boto3 is imported on the first session, which keeps it out of the
+        startup of short lived processes that never reach SQS.
+    """
+
+    _lock = Lock()
+    _sessions = {}
+    _clients = {}
+
+    @classmethod
+    def get_client(cls, region_name, access_key=None, secret_key=None, max_pool_connections=10):
+        key = (region_name, access_key, secret_key, max_pool_connections)
+        client = cls._clients.get(key)
+        if client:
+            return client
+        with cls._lock:
+            if key not in cls._clients:
+                from botocore.config import Config
+                session = cls._get_session(access_key, secret_key)
+                cls._clients[key] = session.client(
+                    'sqs', 
+                    region_name=region_name,
+                    config=Config(max_pool_connections=max_pool_connections)
+                )
+            return cls._clients[key]
+
+    @classmethod
+    def create_resource(cls, region_name, access_key=None, secret_key=None, max_pool_connections=10):
+        # Resources are not thread safe, so each connection gets its own.
+        from botocore.config import Config
+        with cls._lock:
+            return cls._get_session(access_key, secret_key).resource(
+                'sqs', 
+                region_name=region_name,
+                config=Config(max_pool_connections=max_pool_connections)
+            )
+
+    @classmethod
+    def clear(cls):
+        cls._lock = Lock()
+        cls._sessions = {}
+        cls._clients = {}
+
+    @classmethod
+    def _get_session(cls, access_key, secret_key):
+        key = (access_key, secret_key)
+        if key not in cls._sessions:
+            import boto3
+            cls._sessions[key] = boto3.Session(
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+            )
+        return cls._sessions[key]
+
+
+os.register_at_fork(after_in_child=SqsConnectionRegistry.clear)
+
+
 class SqsConnection(SqsConnectionBase):
 
-    def __init__(self, region_name: str, access_key: str=None, secret_key: str=None):
+    def __init__(self, 
+        region_name: str, 
+        access_key: str=None, 
+        secret_key: str=None, 
+        max_pool_connections: int=10,
+        registry=SqsConnectionRegistry
+    ):
         self._access_key = access_key 
         self._secret_key = secret_key
         self._region_name = region_name 
+        self._max_pool_connections = max_pool_connections
+        self._registry = registry
         self._queue_url = None
-        self._load_resource()
-        self._load_client()
+        self._resource = None
+        self._resource_pid = None
+
+    @property
+    def client(self):
+        return self._load_client()
+
+    @property
+    def resource(self):
+        if self._resource is None or self._resource_pid != os.getpid():
+            self._load_resource()
+        return self._resource
 
     def set_queue(self, queue_url: str):
         self._queue_url = queue_url
     
     def get_queue_resource(self, queue_url: str=None):
-        self._set_queue(queue_url)
-        return self.resource.Queue(self._queue_url)
+        return self.resource.Queue(self._set_queue(queue_url))
 
     def _set_queue(self, queue_url: str=None):
         self._queue_url = queue_url if queue_url else self._queue_url
         if not self._queue_url:
             raise Exception("Queue is not defined.")
+        return self._queue_url
 
     def _load_resource(self):
-        session = boto3.Session(
-            aws_access_key_id=self._access_key,
-            aws_secret_access_key=self._secret_key,
+        self._resource = self._registry.create_resource(
+            self._region_name,
+            self._access_key,
+            self._secret_key,
+            self._max_pool_connections
         )
-        self.resource = session.resource('sqs', region_name=self._region_name)
+        self._resource_pid = os.getpid()
 
     def _load_client(self):
-        self.client = boto3.client(
-            'sqs',
-            aws_access_key_id=self._access_key,
-            aws_secret_access_key=self._secret_key,
-            region_name=self._region_name
+        return self._registry.get_client(
+            self._region_name,
+            self._access_key,
+            self._secret_key,
+            self._max_pool_connections
         )
-  
\ No newline at end of file
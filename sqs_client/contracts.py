@@ -37,12 +37,14 @@ class Subscriber(ABC):
         pass
     
     @abstractmethod
-    def chunk(self, num_messages=500, limit_seconds=30):
+    def chunk(self, num_messages=500, limit_seconds=30, message_attribute_names=[], attribute_names=None, on_receive=None):
         pass
 
 
 class Message(ABC):
 
+    __slots__ = ()
+
     @property
     @abstractmethod
     def body(self) -> str:
@@ -68,12 +70,38 @@ class Message(ABC):
     def attributes(self) -> dict:
         pass    
 
+    @property
+    @abstractmethod
+    def receipt_handle(self) -> str:
+        pass
+
+    @property
+    @abstractmethod
+    def receive_count(self) -> int:
+        pass
+
+    @property
+    @abstractmethod
+    def group_id(self) -> str:
+        pass
+
 class MessageHandler(ABC):
 
     @abstractmethod
     def process_message(self, message: Message):
         pass
 
+class BatchMessageHandler(MessageHandler):
+    """
+        A handler that can also process many messages at once, e.g. to answer
+        identical requests with one call. process_batch returns a BatchResult
+        with the reply or the error of each message.
+    """
+
+    @abstractmethod
+    def process_batch(self, messages: list):
+        pass
+
 class RequestMessage(ABC):
     
     @abstractmethod
@@ -103,7 +131,15 @@ class MessageList(ABC):
         pass
     
     @abstractmethod
-    def delete(self):
+    def delete(self, acknowledger=None):
+        pass
+
+    @abstractmethod
+    def delete_message(self, message: Message):
+        pass
+
+    @abstractmethod
+    def release_message(self, message: Message, visibility_timeout: int=0):
         pass
 
 class ReplyQueue(ABC):
@@ -115,11 +151,21 @@ class ReplyQueue(ABC):
     @abstractmethod
     def get_response_by_id(self, message_id: str, timeout: int=2) -> Message:
         pass
+
+    @abstractmethod
+    def get_response_future(self, message_id: str, timeout: int=2):
+        pass
     
     @abstractmethod
     def remove_queue(self):
         pass
 
+    def get_reply_attributes(self) -> dict:
+        """
+            Message attributes added to every request that replies to this queue.
+        """
+        return {}
+
 class IdleQueueSweeper(ABC):
 
     @abstractmethod
@@ -139,3 +185,86 @@ class Publisher(ABC):
     @abstractmethod
     def send_message(self, request_message: RequestMessage):
         pass
+
+    def flush(self):
+        """
+            Sends any buffered message. Unbuffered publishers have nothing to do.
+        """
+        pass
+
+class OutboxRepository(ABC):
+
+    @abstractmethod
+    def create(self, request_message: RequestMessage):
+        pass
+
+    @abstractmethod
+    def create_many(self, request_messages: list):
+        pass
+
+    @abstractmethod
+    def fetch_due(self, limit: int=100) -> list:
+        pass
+
+    @abstractmethod
+    def mark_sent(self, record_ids: list):
+        pass
+
+    @abstractmethod
+    def mark_failed(self, record_id: int, error: str, next_attempt_at: float=None):
+        pass
+
+class Lease(ABC):
+
+    @abstractmethod
+    def acquire(self) -> bool:
+        pass
+
+    @abstractmethod
+    def release(self):
+        pass
+
+class AsyncSubscriber(ABC):
+    """
+        A Subscriber for asyncio: receive_messages is an async generator.
+    """
+
+    @abstractmethod
+    def set_queue(self, queue_url):
+        pass
+
+    @abstractmethod
+    def receive_messages(self, return_none=False, message_attribute_names=[], attribute_names=None):
+        pass
+
+class AsyncPublisher(ABC):
+
+    @abstractmethod
+    async def send_message(self, request_message: RequestMessage):
+        pass
+
+    async def flush(self):
+        pass
+
+class AsyncMessageHandler(ABC):
+
+    @abstractmethod
+    async def process_message(self, message: Message):
+        pass
+
+    async def close(self):
+        """
+            Releases what the handler holds on the event loop, e.g. its HTTP
+            session; awaited by the poller when it stops.
+        """
+        pass
+
+class AsyncMessagePoller(MessagePoller):
+    """
+        start runs the poller on a new event loop; run is the coroutine to
+        await when the loop is already running.
+    """
+
+    @abstractmethod
+    async def run(self):
+        pass
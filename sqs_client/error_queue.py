@@ -0,0 +1,148 @@
+import logging
+
+from sqs_client.contracts import SqsConnection, Message
+
+# Attributes added to a message when it is moved to the error queue.
+ERROR_ATTRIBUTE_NAMES = ['SourceQueueUrl', 'ErrorMessage']
+# System attributes a poller must receive for route to work.
+ROUTED_ATTRIBUTE_NAMES = ['ApproximateReceiveCount', 'MessageGroupId']
+
+
+class ErrorQueueRouter:
+    """
+        Moves poison messages to an error queue.
+
+        A message whose handler failed is left in its queue until it has been
+        received max_receive_count times; route then copies it to the error
+        queue, with the source queue and the error as attributes, and the
+        poller deletes it from the source queue. redrive sends the messages of
+        the error queue back to their source queue in batches. FIFO messages
+        keep their MessageGroupId both ways.
+
+        The error queue is created on first use, with a visibility timeout of
+        visibility_timeout seconds.
+    """
+
+    MAX_BATCH_SIZE = 10
+    MAX_ERROR_LENGTH = 1024
+
+    def __init__(self,
+        sqs_connection: SqsConnection,
+        error_queue_name: str,
+        source_queue_url: str=None,
+        max_receive_count: int=5,
+        visibility_timeout: int=600
+    ):
+        self._connection = sqs_connection
+        self._error_queue_name = error_queue_name
+        self._source_queue_url = source_queue_url
+        self._max_receive_count = max_receive_count
+        self._visibility_timeout = visibility_timeout
+        self._error_queue_url = None
+        self._logger = logging.getLogger()
+
+    def get_error_queue_url(self) -> str:
+        if not self._error_queue_url:
+            self._error_queue_url = self._create_queue()
+        return self._error_queue_url
+
+    def route(self, message: Message, error: Exception=None) -> bool:
+        """
+            Returns True when the message was copied to the error queue and must
+            be deleted from its queue, False when it should be retried.
+        """
+        if message.receive_count < self._max_receive_count:
+            return False
+        params = self._params(message, error)
+        self._connection.client.send_message(QueueUrl=self.get_error_queue_url(), **params)
+        self._logger.warning('Message {} moved to {} after {} receives'.format(
+            message.id, self._error_queue_name, message.receive_count
+        ))
+        return True
+
+    def redrive(self, queue_url: str=None, max_messages: int=None, wait_time_seconds: int=5) -> int:
+        """
+            Moves the messages of the error queue back to queue_url, or to the
+            queue each one came from, and returns how many were moved. It stops
+            once a receive long polling for wait_time_seconds comes back empty.
+        """
+        error_queue_url = self.get_error_queue_url()
+        moved = 0
+        while not max_messages or moved < max_messages:
+            response = self._connection.client.receive_message(
+                QueueUrl=error_queue_url,
+                MaxNumberOfMessages=self.MAX_BATCH_SIZE,
+                MessageAttributeNames=['All'],
+                AttributeNames=['MessageGroupId'],
+                WaitTimeSeconds=wait_time_seconds
+            )
+            received = response.get('Messages', [])
+            if not received:
+                break
+            moved += self._redrive_batch(error_queue_url, received, queue_url)
+        self._logger.info('Redrove {} messages from {}'.format(moved, self._error_queue_name))
+        return moved
+
+    def _redrive_batch(self, error_queue_url, received, queue_url):
+        by_queue = {}
+        for index, message in enumerate(received):
+            attributes = dict(message.get('MessageAttributes', {}))
+            source = attributes.get('SourceQueueUrl', {}).get('StringValue')
+            for name in ERROR_ATTRIBUTE_NAMES:
+                attributes.pop(name, None)
+            target = queue_url or source or self._source_queue_url
+            if not target:
+                self._logger.error('No queue to redrive message {} to'.format(message['MessageId']))
+                continue
+            entry = {'Id': str(index), 'MessageBody': message['Body'], 'MessageAttributes': attributes}
+            group_id = message.get('Attributes', {}).get('MessageGroupId')
+            if target.endswith('.fifo'):
+                entry['MessageGroupId'] = group_id or 'redrive'
+                entry['MessageDeduplicationId'] = message['MessageId']
+            by_queue.setdefault(target, []).append(entry)
+
+        processed = []
+        for target, entries in by_queue.items():
+            response = self._connection.client.send_message_batch(QueueUrl=target, Entries=entries)
+            processed += [int(result['Id']) for result in response.get('Successful', [])]
+            for result in response.get('Failed', []):
+                self._logger.error('Message could not be redriven to {}: {}'.format(target, result))
+        if processed:
+            self._connection.client.delete_message_batch(
+                QueueUrl=error_queue_url,
+                Entries=[
+                    {'Id': str(index), 'ReceiptHandle': received[index]['ReceiptHandle']}
+                    for index in processed
+                ]
+            )
+        return len(processed)
+
+    def _params(self, message: Message, error: Exception=None) -> dict:
+        attributes = dict(message.attributes)
+        if self._source_queue_url:
+            attributes['SourceQueueUrl'] = {'StringValue': self._source_queue_url, 'DataType': 'String'}
+        if error is not None:
+            attributes['ErrorMessage'] = {
+                'StringValue': repr(error)[:self.MAX_ERROR_LENGTH],
+                'DataType': 'String'
+            }
+        params = {'MessageBody': message.body, 'MessageAttributes': attributes}
+        if self._error_queue_name.endswith('.fifo'):
+            params['MessageGroupId'] = message.group_id or 'error'
+            params['MessageDeduplicationId'] = message.id
+        return params
+
+    def _create_queue(self) -> str:
+        attributes = {'VisibilityTimeout': str(self._visibility_timeout)}
+        if self._error_queue_name.endswith('.fifo'):
+            attributes['FifoQueue'] = 'true'
+        try:
+            return self._connection.client.create_queue(
+                QueueName=self._error_queue_name,
+                Attributes=attributes
+            )['QueueUrl']
+        except Exception as e:
+            error = e.__class__.__name__
+            if error != 'QueueNameExists':
+                raise e
+            return self._connection.client.get_queue_url(QueueName=self._error_queue_name)['QueueUrl']
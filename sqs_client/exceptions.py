@@ -2,3 +2,16 @@
 
 class ReplyTimeout(Exception):
     pass
+
+
+class PublishError(Exception):
+
+    def __init__(self, code: str, message: str=None, sender_fault: bool=False):
+        super().__init__('{}: {}'.format(code, message))
+        self.code = code
+        self.message = message
+        self.sender_fault = sender_fault
+
+
+class LaneFull(Exception):
+    pass
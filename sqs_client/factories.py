@@ -1,21 +1,44 @@
+import os
+import tempfile
+from threading import Lock
+
+from sqs_client.backoff import ExponentialBackoff
 from sqs_client.connection import SqsConnection
+from sqs_client.local_backend import LocalSqsConnection
 from sqs_client.subscriber import Subscriber
-from sqs_client.publisher import Publisher
+from sqs_client.publisher import Publisher, BatchPublisher, RetryPublisher
+from sqs_client.outbox import SqliteOutboxRepository, OutboxRelay
 from sqs_client.reply_queue import ReplyQueue
+from sqs_client.virtual_queue import HostReplyQueue, VirtualReplyQueue
 from sqs_client.idle_queue_sweeper import IdleQueueSweeper
+from sqs_client.visibility import VisibilityHeartbeat
+from sqs_client.acknowledger import Acknowledger
+from sqs_client.error_queue import ErrorQueueRouter
+from sqs_client.leader import FileLease, QueueTagLease
 
 class SqsConnectionFactory:
 
-    def __init__(self, region_name, access_key=None, secret_key=None):
+    BACKENDS = ('aws', 'local')
+
+    def __init__(self, region_name, access_key=None, secret_key=None, max_pool_connections=10, backend='aws'):
         self._region_name = region_name
         self._access_key= access_key 
         self._secret_key = secret_key
+        self._max_pool_connections = max_pool_connections
+        self._backend = backend
+        if backend not in self.BACKENDS:
+            raise Exception("Invalid sqs backend: {}".format(backend))
     
     def build(self):
+        if self._backend == 'local':
+            return LocalSqsConnection(region_name=self._region_name)
+        # Clients come from the process wide SqsConnectionRegistry, so
+        # building many connections does not build many HTTP pools.
         return SqsConnection(
             access_key=self._access_key,
             secret_key=self._secret_key,
-            region_name=self._region_name
+            region_name=self._region_name,
+            max_pool_connections=self._max_pool_connections
         )
 
 class BaseFactory:
@@ -24,12 +47,16 @@ class BaseFactory:
         region_name, 
         access_key=None, 
         secret_key=None, 
-        sqs_connection_factory=SqsConnectionFactory
+        sqs_connection_factory=SqsConnectionFactory,
+        max_pool_connections=10,
+        backend='aws'
     ):
         self._region_name = region_name
         self._access_key = access_key 
         self._secret_key = secret_key 
         self._sqs_connection_factory = sqs_connection_factory
+        self._max_pool_connections = max_pool_connections
+        self._backend = backend
     
     def build(self):
        raise NotImplementedError
@@ -38,20 +65,42 @@ class BaseFactory:
         return self._sqs_connection_factory(
             self._region_name, 
             self._access_key, 
-            self._secret_key
+            self._secret_key,
+            max_pool_connections=self._max_pool_connections,
+            backend=self._backend
         ).build()
 
     
 class SubscriberFactory(BaseFactory):    
 
-    def __init__(self, *args, queue_url=None, **kwargs):
+    def __init__(self, 
+        *args, 
+        queue_url=None, 
+        wait_time_seconds=0,
+        empty_receive_backoff_initial=0,
+        empty_receive_backoff_max=0,
+        **kwargs
+    ):
         super().__init__(*args, **kwargs)
         self._queue_url = queue_url
+        self._wait_time_seconds = wait_time_seconds
+        self._empty_receive_backoff_initial = empty_receive_backoff_initial
+        self._empty_receive_backoff_max = empty_receive_backoff_max
     
     def build(self):
         return Subscriber(
             sqs_connection=self._build_sqs_connection(),
-            queue_url=self._queue_url
+            queue_url=self._queue_url,
+            wait_time_seconds=self._wait_time_seconds,
+            empty_receive_backoff=self._build_empty_receive_backoff()
+        )
+
+    def _build_empty_receive_backoff(self):
+        if not self._empty_receive_backoff_max:
+            return None
+        return ExponentialBackoff(
+            initial_seconds=self._empty_receive_backoff_initial or self._empty_receive_backoff_max,
+            max_seconds=self._empty_receive_backoff_max
         )
     
 class PublisherFactory(BaseFactory):    
@@ -61,8 +110,134 @@ class PublisherFactory(BaseFactory):
             sqs_connection=self._build_sqs_connection()
         )
 
+class AsyncSubscriberFactory(SubscriberFactory):
+
+    def build(self):
+        # Imported here so the blocking clients do not load asyncio.
+        from sqs_client.aio import AsyncSubscriber
+        return AsyncSubscriber(
+            sqs_connection=self._build_sqs_connection(),
+            queue_url=self._queue_url,
+            wait_time_seconds=self._wait_time_seconds,
+            empty_receive_backoff=self._build_empty_receive_backoff()
+        )
+
+class AsyncPublisherFactory(BaseFactory):
+
+    def build(self):
+        from sqs_client.aio import AsyncPublisher
+        return AsyncPublisher(
+            sqs_connection=self._build_sqs_connection()
+        )
+
+class BatchPublisherFactory(BaseFactory):
+
+    def __init__(self, *args, batch_size=10, flush_interval=0.05, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+
+    def build(self):
+        return BatchPublisher(
+            sqs_connection=self._build_sqs_connection(),
+            batch_size=self._batch_size,
+            flush_interval=self._flush_interval
+        )
+
+class RetryPublisherFactory(BaseFactory):
+    """
+        Builds a RetryPublisher backed by a SQLite outbox at outbox_path, or
+        one without outbox when outbox_path is not given.
+    """
+
+    def __init__(self, *args, retries=3, outbox_path=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._retries = retries
+        self._outbox_path = outbox_path
+
+    def build(self):
+        return RetryPublisher(
+            publisher=Publisher(sqs_connection=self._build_sqs_connection()),
+            retries=self._retries,
+            outbox_repository=SqliteOutboxRepository(self._outbox_path) if self._outbox_path else None
+        )
+
+class OutboxRelayFactory(BaseFactory):
+
+    def __init__(self, *args, outbox_path=None, poll_interval=1, max_attempts=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._outbox_path = outbox_path
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+
+    def build(self):
+        return OutboxRelay(
+            sqs_connection=self._build_sqs_connection(),
+            outbox_repository=SqliteOutboxRepository(self._outbox_path),
+            poll_interval=self._poll_interval,
+            max_attempts=self._max_attempts
+        )
+
+class ErrorQueueRouterFactory(BaseFactory):
+
+    def __init__(self, 
+        *args, 
+        error_queue_name=None, 
+        source_queue_url=None, 
+        max_receive_count=5, 
+        visibility_timeout=600, 
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self._error_queue_name = error_queue_name
+        self._source_queue_url = source_queue_url
+        self._max_receive_count = max_receive_count
+        self._visibility_timeout = visibility_timeout
+
+    def build(self):
+        return ErrorQueueRouter(
+            sqs_connection=self._build_sqs_connection(),
+            error_queue_name=self._error_queue_name,
+            source_queue_url=self._source_queue_url,
+            max_receive_count=self._max_receive_count,
+            visibility_timeout=self._visibility_timeout
+        )
+
+class VisibilityHeartbeatFactory(BaseFactory):
+
+    def __init__(self, *args, visibility_timeout=600, interval=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._visibility_timeout = visibility_timeout
+        self._interval = interval
+
+    def build(self):
+        return VisibilityHeartbeat(
+            sqs_connection=self._build_sqs_connection(),
+            visibility_timeout=self._visibility_timeout,
+            interval=self._interval
+        )
+
+class AcknowledgerFactory(BaseFactory):
+
+    def __init__(self, *args, batch_size=10, flush_interval=0.1, max_attempts=3, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_attempts = max_attempts
+
+    def build(self):
+        return Acknowledger(
+            sqs_connection=self._build_sqs_connection(),
+            batch_size=self._batch_size,
+            flush_interval=self._flush_interval,
+            max_attempts=self._max_attempts
+        )
+
 class ReplyQueueFactory(BaseFactory):
 
+    _hosts = {}
+    _hosts_lock = Lock()
+
     def __init__(
         self,
         *args,
@@ -73,43 +248,107 @@ class ReplyQueueFactory(BaseFactory):
         heartbeat_interval_seconds=300,
         list_queues_max_results=1000,
         idle_queue_retention_period=600,
+        wait_time_seconds=20,
         subscriber_factory=SubscriberFactory,
         publisher_factory=PublisherFactory,
+        virtual=False,
+        sweep_workers=8,
+        use_sweeper_queue=False,
+        leader_election='queue_tag',
+        lease_path=None,
+        ack_flush_interval=0.1,
         **kwargs
     ):
         super().__init__(*args, **kwargs)
         self._name = name
+        self._ack_flush_interval = ack_flush_interval
+        self._virtual = virtual
+        self._sweep_workers = sweep_workers
+        self._use_sweeper_queue = use_sweeper_queue
+        self._leader_election = leader_election
+        self._lease_path = lease_path
         self._message_retention_period = message_retention_period
         self._seconds_before_cleaning = seconds_before_cleaning 
         self._num_messages_before_cleaning = num_messages_before_cleaning
         self._heartbeat_interval_seconds = heartbeat_interval_seconds
         self._list_queues_max_results = list_queues_max_results
         self._idle_queue_retention_period = idle_queue_retention_period
+        self._wait_time_seconds = wait_time_seconds
         self._subscriber_factory = subscriber_factory
         self._publisher_factory = publisher_factory
     
     def build(self):
+        if self._virtual:
+            return VirtualReplyQueue(self._get_host_reply_queue())
         return ReplyQueue(
             name=self._name,
             sqs_connection=self._build_sqs_connection(),
             subscriber=self._build_subscriber(),
-            idle_queue_sweeper=self._build_idle_queue_sweeper()
+            idle_queue_sweeper=self._build_idle_queue_sweeper(),
+            acknowledger=self._build_acknowledger()
         )
+
+    def _get_host_reply_queue(self):
+        # One HostReplyQueue per process and queue name, shared by every
+        # VirtualReplyQueue built from it. A forked child gets its own.
+        key = (os.getpid(), self._backend, self._region_name, self._name)
+        with ReplyQueueFactory._hosts_lock:
+            if key not in ReplyQueueFactory._hosts:
+                ReplyQueueFactory._hosts[key] = HostReplyQueue(
+                    name=self._name,
+                    sqs_connection=self._build_sqs_connection(),
+                    subscriber=self._build_subscriber(),
+                    idle_queue_sweeper=self._build_idle_queue_sweeper(),
+                    message_retention_period=self._message_retention_period,
+                    seconds_before_cleaning=self._seconds_before_cleaning,
+                    num_messages_before_cleaning=self._num_messages_before_cleaning,
+                    heartbeat_interval_seconds=self._heartbeat_interval_seconds,
+                    acknowledger=self._build_acknowledger()
+                )
+            return ReplyQueueFactory._hosts[key]
     
+    def _build_acknowledger(self):
+        # Replies are deleted one list at a time without it.
+        if not self._ack_flush_interval:
+            return None
+        return Acknowledger(
+            sqs_connection=self._build_sqs_connection(),
+            flush_interval=self._ack_flush_interval
+        )
+
     def _build_idle_queue_sweeper(self):
         return IdleQueueSweeper(
             sqs_connection=self._build_sqs_connection(),
             subscriber=self._build_subscriber(),
             publisher=self._build_publisher(),
             list_queues_max_results=self._list_queues_max_results,
-            idle_queue_retention_period=self._idle_queue_retention_period
+            idle_queue_retention_period=self._idle_queue_retention_period,
+            sweep_workers=self._sweep_workers,
+            use_sweeper_queue=self._use_sweeper_queue,
+            lease=self._build_lease()
         )
+
+    def _build_lease(self):
+        # The lease outlives two sweep triggers, so a live leader keeps it.
+        ttl = self._idle_queue_retention_period * 2
+        if self._leader_election == 'file':
+            path = self._lease_path or os.path.join(tempfile.gettempdir(), self._name + 'sweeper.lease')
+            return FileLease(path, ttl=ttl)
+        if self._leader_election == 'queue_tag':
+            return QueueTagLease(self._build_sqs_connection(), self._name + 'sweeper_lease', ttl=ttl)
+        if self._leader_election:
+            raise Exception("Invalid leader election: {}".format(self._leader_election))
+        return None
     
     def _build_subscriber(self):
         return self._subscriber_factory(
             self._region_name,
             self._access_key, 
             self._secret_key,
+            sqs_connection_factory=self._sqs_connection_factory,
+            max_pool_connections=self._max_pool_connections,
+            backend=self._backend,
+            wait_time_seconds=self._wait_time_seconds
         ).build()
     
     def _build_publisher(self):
@@ -117,4 +356,7 @@ class ReplyQueueFactory(BaseFactory):
             self._region_name,
             self._access_key, 
             self._secret_key,
+            sqs_connection_factory=self._sqs_connection_factory,
+            max_pool_connections=self._max_pool_connections,
+            backend=self._backend
         ).build()
@@ -1,20 +1,43 @@
 import logging
-from multiprocessing import Process
-from time import time, sleep
-from hashlib import sha1
+from time import perf_counter
+from threading import Thread, Event, Lock
+from concurrent.futures import ThreadPoolExecutor
 
 from sqs_client.message import RequestMessage
+from sqs_client.scheduler import Scheduler
 from sqs_client.utils import timestamp
 from sqs_client.contracts import (
     Publisher,
     Subscriber,
     SqsConnection,
+    Lease,
     IdleQueueSweeper as IdleQueueSweeperBase
 )
 
 TRIGGER_MESSAGE_BODY = "SweepingTrigger"
 
 class IdleQueueSweeper(IdleQueueSweeperBase):
+    """
+        Deletes the queues of a name prefix whose heartbeat tag is older than
+        idle_queue_retention_period and that hold no message.
+
+        Every sweep lists the queues once and checks them on a pool of
+        sweep_workers threads.
+
+        With a lease, only the sweeper holding it sweeps the prefix: each
+        trigger acquires or renews the lease and is skipped when another
+        sweeper holds it, so a sweeper takes over once the leader stopped or
+        its lease expired. This is how a fleet gets a single sweeper.
+
+        use_sweeper_queue is the legacy alternative: the listed queues are
+        published in batches to a FIFO sweeper queue, so the checks are
+        shared by every sweeper consuming it.
+
+        get_sweep_stats returns the duration and the SQS API calls of the
+        last sweep.
+    """
+
+    MAX_BATCH_SIZE = 10
 
     def __init__(self, 
         sqs_connection: SqsConnection, 
@@ -22,14 +45,41 @@ class IdleQueueSweeper(IdleQueueSweeperBase):
         publisher: Publisher,
         list_queues_max_results: int=1000, 
         idle_queue_retention_period: int=600,
-        request_message_class=RequestMessage
+        request_message_class=RequestMessage,
+        scheduler: Scheduler=None,
+        sweep_workers: int=8,
+        use_sweeper_queue: bool=False,
+        lease: Lease=None
     ):
+        """
+            The sweep trigger is a timer of scheduler, the process wide
+            Scheduler by default; sweeps and the sweeper queue consumer run on
+            daemon threads.
+        """
         self._connection = sqs_connection
         self._subscriber = subscriber
         self._publisher = publisher
         self._list_queues_max_results = list_queues_max_results
         self._idle_queue_retention_period = idle_queue_retention_period
         self._request_message_class = request_message_class
+        self._scheduler = scheduler or Scheduler.default()
+        self._sweep_workers = sweep_workers
+        self._use_sweeper_queue = use_sweeper_queue
+        self._lease = lease
+        self._queue_url = None
+        self._trigger_timer = None
+        self._sweeper_thread = None
+        self._sweeping = False
+        self._stopped = Event()
+        self._stats_lock = Lock()
+        self._api_calls = 0
+        self._sweep_stats = {
+            'sweeps': 0,
+            'last_sweep_seconds': None,
+            'last_sweep_api_calls': None,
+            'last_sweep_queues': None,
+            'last_sweep_deleted': None
+        }
         self._logger = logging.getLogger()
     
     def set_name(self, name):
@@ -38,44 +88,108 @@ class IdleQueueSweeper(IdleQueueSweeperBase):
     def get_queue_name(self):
         return self._name + 'sweeper.fifo'
 
+    def get_sweep_stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._sweep_stats, api_calls=self._api_calls)
+
     def start(self):
-        self._create_queue()
-        self._start_trigger_process()
-        self._start_sweeper_process()
+        # Each start gets its own Event: a consumer of a previous start still
+        # in its long poll must exit even if start is called again meanwhile.
+        self._stopped = Event()
+        if self._use_sweeper_queue:
+            self._create_queue()
+            self._start_sweeper_thread(self._stopped)
+        self._trigger_timer = self._scheduler.call_every(self._idle_queue_retention_period, self._trigger_sweeper)
     
     def stop(self):
-        self._trigger_process.terminate()
-        self._trigger_process.join()
-        self._sweeper_process.terminate()
-        self._sweeper_process.join()
+        # The sweeper thread may be blocked in a long poll; it exits after it.
+        self._stopped.set()
+        if self._trigger_timer:
+            self._trigger_timer.cancel()
+            self._trigger_timer = None
+        self._sweeper_thread = None
+        self._release_lease()
+
+    def sweep(self):
+        """
+            Lists the queues of the prefix once and checks them all, or
+            publishes them to the sweeper queue when use_sweeper_queue is set.
+        """
+        start = perf_counter()
+        api_calls = self._api_calls
+        queue_urls = self._list_all_queues()
+        if self._use_sweeper_queue:
+            self._publish_queues(queue_urls)
+            deleted = None
+        else:
+            deleted = self._sweep_idle_queues(queue_urls)
+        with self._stats_lock:
+            self._sweep_stats = {
+                'sweeps': self._sweep_stats['sweeps'] + 1,
+                'last_sweep_seconds': perf_counter() - start,
+                'last_sweep_api_calls': self._api_calls - api_calls,
+                'last_sweep_queues': len(queue_urls),
+                'last_sweep_deleted': deleted
+            }
+        self._logger.info("Idle Queue Sweeper stats: {}".format(self.get_sweep_stats()))
     
-    def _start_trigger_process(self):
-        self._trigger_process = Process(
-            target=self._trigger_sweeper
-        )
-        self._trigger_process.daemon = True
-        self._trigger_process.start()
-    
-    def _start_sweeper_process(self):
-        self._sweeper_process = Process(
-            target=self._start_sweeper
-        )
-        self._sweeper_process.daemon = True
-        self._sweeper_process.start()
+    def _start_sweeper_thread(self, stopped):
+        self._sweeper_thread = Thread(target=self._start_sweeper, args=(stopped,))
+        self._sweeper_thread.daemon = True
+        self._sweeper_thread.start()
     
     def _trigger_sweeper(self):
-        while True:
-            sleep(self._idle_queue_retention_period)
-            try:
-                self._logger.info("Triggering Idle Queue Sweeper")
-                message = self._request_message_class(
-                    body=TRIGGER_MESSAGE_BODY,
-                    queue_url=self._queue_url,
-                    group_id=TRIGGER_MESSAGE_BODY
-                )
-                self._publisher.send_message(message)
-            except Exception as e:
-                self._logger.exception(e)
+        # Called on the shared scheduler thread: the lease round trips, the
+        # trigger message and the sweep all run on a thread of their own.
+        self._start_sweep_thread()
+
+    def _trigger(self):
+        if not self._is_leader():
+            self._logger.info("Idle Queue Sweeper lease held by another sweeper, skipping")
+            return
+        self._logger.info("Triggering Idle Queue Sweeper")
+        if self._use_sweeper_queue:
+            message = self._request_message_class(
+                body=TRIGGER_MESSAGE_BODY,
+                queue_url=self._queue_url,
+                group_id=TRIGGER_MESSAGE_BODY
+            )
+            self._publisher.send_message(message)
+            self._count_api_call()
+        else:
+            self.sweep()
+
+    def _is_leader(self) -> bool:
+        if not self._lease:
+            return True
+        return self._lease.acquire()
+
+    def _release_lease(self):
+        if not self._lease:
+            return
+        try:
+            self._lease.release()
+        except Exception as e:
+            self._logger.exception(e)
+
+    def _start_sweep_thread(self):
+        # A trigger still running is not doubled.
+        with self._stats_lock:
+            if self._sweeping:
+                return
+            self._sweeping = True
+        thread = Thread(target=self._run_sweep)
+        thread.daemon = True
+        thread.start()
+
+    def _run_sweep(self):
+        try:
+            self._trigger()
+        except Exception as e:
+            self._logger.exception(e)
+        finally:
+            with self._stats_lock:
+                self._sweeping = False
     
     def _create_queue(self):
         try:
@@ -94,45 +208,67 @@ class IdleQueueSweeper(IdleQueueSweeperBase):
                 raise e 
             self._queue_url = self._connection.client.get_queue_url(
                 QueueName=self.get_queue_name()
-            )
+            )['QueueUrl']
         
-    def _start_sweeper(self):
+    def _start_sweeper(self, stopped):
         self._subscriber.set_queue(self._queue_url)
-        for messages in self._subscriber.receive_messages():
+        for messages in self._subscriber.receive_messages(return_none=True):
+            if stopped.is_set():
+                return
+            if not messages:
+                continue
+            queue_urls = []
             for message in messages:
                 if message.body == TRIGGER_MESSAGE_BODY:
-                    self._publish_queues()
+                    self.sweep()
                 else:
-                    self._sweep_idle_queue(message.body)        
+                    queue_urls.append(message.body)
+            self._sweep_idle_queues(queue_urls)
             messages.delete()
-    
-    def _publish_queues(self):
-        self._logger.info("Publishing Queues in order to check for idleness.")
+
+    def _list_all_queues(self) -> list:
+        queue_urls = []
         next_token = None
         while True:
             response = self._list_queues(next_token)
-            for queue_url in response['QueueUrls']:
-                self._publish_queue(queue_url)
-            
+            queue_urls += [
+                queue_url for queue_url in response.get('QueueUrls', [])
+                if queue_url != self._queue_url
+            ]
             next_token = response.get('NextToken')
             if not next_token:
                 break
+        return queue_urls
     
-    def _publish_queue(self, queue_url):
-        if queue_url == self._queue_url:
-            return
-        message = self._request_message_class(
-            body=queue_url,
-            queue_url=self._queue_url,
-            group_id=queue_url
-        )
-        self._publisher.send_message(message)
+    def _publish_queues(self, queue_urls):
+        self._logger.info("Publishing Queues in order to check for idleness.")
+        for i in range(0, len(queue_urls), self.MAX_BATCH_SIZE):
+            entries = [
+                {'Id': str(index), 'MessageBody': queue_url, 'MessageGroupId': queue_url}
+                for index, queue_url in enumerate(queue_urls[i:i + self.MAX_BATCH_SIZE])
+            ]
+            response = self._connection.client.send_message_batch(QueueUrl=self._queue_url, Entries=entries)
+            self._count_api_call()
+            for result in response.get('Failed', []):
+                self._logger.error("Queue could not be published for sweeping: {}".format(result))
+
+    def _sweep_idle_queues(self, queue_urls) -> int:
+        if not queue_urls:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(self._sweep_workers, len(queue_urls))) as executor:
+            return sum(executor.map(self._sweep_idle_queue, queue_urls))
     
-    def _sweep_idle_queue(self, queue_url):
-        self._logger.info("Checking for idleness: " + queue_url)
-        if self._is_queue_idle(queue_url) and self._is_queue_empty(queue_url):
-            self._logger.info("Deleting idle queue...")
-            self._connection.client.delete_queue(QueueUrl=queue_url)
+    def _sweep_idle_queue(self, queue_url) -> bool:
+        try:
+            if self._is_queue_idle(queue_url) and self._is_queue_empty(queue_url):
+                self._logger.info("Deleting idle queue: " + queue_url)
+                self._connection.client.delete_queue(QueueUrl=queue_url)
+                self._count_api_call()
+                return True
+        except Exception as e:
+            # Most likely deleted by its owner or another sweeper meanwhile.
+            self._logger.warning("Could not sweep {}: {}".format(queue_url, e))
+        return False
         
     def _list_queues(self, next_token=''):
         params = {
@@ -141,21 +277,31 @@ class IdleQueueSweeper(IdleQueueSweeperBase):
         }
         if next_token:
             params['NextToken'] = next_token
+        self._count_api_call()
         return self._connection.client.list_queues(**params)
     
     def _is_queue_idle(self, queue_url):
+        self._count_api_call()
         tags = self._connection.client.list_queue_tags(
             QueueUrl=queue_url
-        )['Tags']
+        ).get('Tags', {})
+        if 'heartbeat' not in tags:
+            return False
         last_heartbeat = int(tags['heartbeat'])
         return (timestamp() - last_heartbeat) > self._idle_queue_retention_period
     
     def _is_queue_empty(self, queue_url):
+        self._count_api_call()
         response = self._connection.client.get_queue_attributes(
             QueueUrl=queue_url,
             AttributeNames=[
-                'ApproximateNumberOfMessages'
+                'ApproximateNumberOfMessages',
+                'ApproximateNumberOfMessagesNotVisible'
             ]
         )
-        return not int(response['Attributes']['ApproximateNumberOfMessages'])
-         
\ No newline at end of file
+        attributes = response['Attributes']
+        return not int(attributes['ApproximateNumberOfMessages']) and not int(attributes['ApproximateNumberOfMessagesNotVisible'])
+
+    def _count_api_call(self):
+        with self._stats_lock:
+            self._api_calls += 1
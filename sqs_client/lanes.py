@@ -0,0 +1,145 @@
+import logging
+from time import time
+from threading import Lock, BoundedSemaphore
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from sqs_client.exceptions import LaneFull
+from sqs_client.utils import percentile
+
+
+class Lane:
+    """
+        An executor with its own concurrency limit and queue depth.
+
+        At most max_workers calls run at once and at most queue_depth more
+        wait for a worker; submitting beyond that raises LaneFull instead of
+        blocking. Queue wait and run time of the last latency_window calls
+        are kept for stats().
+    """
+
+    def __init__(self, name: str, max_workers: int=1, queue_depth: int=0, latency_window: int=1000):
+        self.name = name
+        self._max_workers = max_workers
+        self._queue_depth = queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='lane-' + name)
+        self._slots = BoundedSemaphore(max_workers + queue_depth)
+        self._lock = Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._max_queued = 0
+        self._waits = deque(maxlen=latency_window)
+        self._latencies = deque(maxlen=latency_window)
+
+    @property
+    def capacity(self) -> int:
+        return self._max_workers + self._queue_depth
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise LaneFull(self.name)
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        try:
+            return self._executor.submit(self._run, time(), fn, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+
+    def shutdown(self, wait: bool=True):
+        self._executor.shutdown(wait=wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = list(self._waits)
+            latencies = list(self._latencies)
+            return {
+                'max_workers': self._max_workers,
+                'queue_depth': self._queue_depth,
+                'queued': self._queued,
+                'max_queued': self._max_queued,
+                'active': self._active,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'wait_p50': percentile(waits, 0.50),
+                'wait_p95': percentile(waits, 0.95),
+                'latency_p50': percentile(latencies, 0.50),
+                'latency_p95': percentile(latencies, 0.95),
+                'latency_p99': percentile(latencies, 0.99),
+                'latency_max': max(latencies) if latencies else None
+            }
+
+    def _run(self, submitted_at, fn, *args, **kwargs):
+        started_at = time()
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+            self._waits.append(started_at - submitted_at)
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._failed += 1 if failed else 0
+                self._latencies.append(time() - started_at)
+            self._slots.release()
+
+
+class LaneScheduler:
+    """
+        Routes calls to lanes by key, so slow work cannot take the capacity
+        of fast work.
+
+        Ex.:
+            scheduler = LaneScheduler(
+                lanes={'slow': Lane('slow', 2, 8), 'fast': Lane('fast', 8, 64)},
+                routes={'execute': 'slow', 'getStatus': 'fast'},
+                default_lane='fast'
+            )
+            scheduler.submit('getStatus', handler.process_message, message)
+    """
+
+    def __init__(self, lanes: dict, routes: dict=None, default_lane: str=None):
+        self._lanes = lanes
+        self._routes = routes or {}
+        self._default_lane = default_lane
+        self._logger = logging.getLogger()
+
+    def get_lane(self, key) -> Lane:
+        name = self._routes.get(key, self._default_lane)
+        if name not in self._lanes:
+            raise Exception("No lane for {}".format(key))
+        return self._lanes[name]
+
+    def submit(self, key, fn, *args, **kwargs):
+        return self.get_lane(key).submit(fn, *args, **kwargs)
+
+    def capacity(self) -> int:
+        return sum(lane.capacity for lane in self._lanes.values())
+
+    def stats(self) -> dict:
+        return {name: lane.stats() for name, lane in self._lanes.items()}
+
+    def shutdown(self, wait: bool=True):
+        for lane in self._lanes.values():
+            lane.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
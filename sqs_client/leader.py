@@ -0,0 +1,138 @@
+import os
+import json
+import fcntl
+import random
+import socket
+import logging
+from time import time, sleep
+
+from sqs_client.contracts import SqsConnection, Lease as LeaseBase
+
+
+def new_owner_id() -> str:
+    return '{}:{}:{}'.format(socket.gethostname(), os.getpid(), random.getrandbits(32))
+
+
+class FileLease(LeaseBase):
+    """
+        A lease held in a local file, for processes running on one host.
+
+        The file holds the owner and the expiry of the lease and is only read
+        and written under an exclusive flock, so acquire is atomic. The owner
+        renews the lease by acquiring it again before ttl seconds pass; once it
+        expired, any process can take it over.
+    """
+
+    def __init__(self, path: str, ttl: int=1200, owner_id: str=None):
+        self._path = path
+        self._ttl = ttl
+        self._owner_id = owner_id or new_owner_id()
+
+    @property
+    def owner_id(self) -> str:
+        return self._owner_id
+
+    def acquire(self) -> bool:
+        with open(self._path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                lease = self._read(f)
+                if lease.get('owner') not in (None, self._owner_id) and lease.get('expires_at', 0) > time():
+                    return False
+                self._write(f, {'owner': self._owner_id, 'expires_at': time() + self._ttl})
+                return True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def release(self):
+        with open(self._path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if self._read(f).get('owner') == self._owner_id:
+                    self._write(f, {})
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read(self, f) -> dict:
+        f.seek(0)
+        try:
+            return json.loads(f.read() or '{}')
+        except ValueError:
+            return {}
+
+    def _write(self, f, lease: dict):
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(lease))
+        f.flush()
+
+
+class QueueTagLease(LeaseBase):
+    """
+        A lease held in the tags of an SQS queue, for processes on any host.
+
+        SQS has no conditional write, so acquire writes its claim and reads the
+        tags back after settle_seconds: of two processes racing for an expired
+        lease, the one whose claim was written last wins and the other one
+        backs off. The queue is created on first use.
+    """
+
+    OWNER_TAG = 'leader'
+    EXPIRES_TAG = 'leader_expires_at'
+
+    def __init__(self,
+        sqs_connection: SqsConnection,
+        queue_name: str,
+        ttl: int=1200,
+        owner_id: str=None,
+        settle_seconds: float=1
+    ):
+        self._connection = sqs_connection
+        self._queue_name = queue_name
+        self._ttl = ttl
+        self._owner_id = owner_id or new_owner_id()
+        self._settle_seconds = settle_seconds
+        self._queue_url = None
+        self._logger = logging.getLogger()
+
+    @property
+    def owner_id(self) -> str:
+        return self._owner_id
+
+    def acquire(self) -> bool:
+        tags = self._get_tags()
+        owner = tags.get(self.OWNER_TAG)
+        if owner and owner != self._owner_id and float(tags.get(self.EXPIRES_TAG, 0)) > time():
+            return False
+        self._connection.client.tag_queue(
+            QueueUrl=self._get_queue_url(),
+            Tags={
+                self.OWNER_TAG: self._owner_id,
+                self.EXPIRES_TAG: str(int(time() + self._ttl))
+            }
+        )
+        if owner == self._owner_id:
+            return True
+        sleep(self._settle_seconds)
+        return self._get_tags().get(self.OWNER_TAG) == self._owner_id
+
+    def release(self):
+        if self._get_tags().get(self.OWNER_TAG) == self._owner_id:
+            self._connection.client.untag_queue(
+                QueueUrl=self._get_queue_url(),
+                TagKeys=[self.OWNER_TAG, self.EXPIRES_TAG]
+            )
+
+    def _get_tags(self) -> dict:
+        return self._connection.client.list_queue_tags(QueueUrl=self._get_queue_url()).get('Tags', {})
+
+    def _get_queue_url(self) -> str:
+        if not self._queue_url:
+            try:
+                self._queue_url = self._connection.client.create_queue(QueueName=self._queue_name)['QueueUrl']
+            except Exception as e:
+                error = e.__class__.__name__
+                if error != 'QueueNameExists':
+                    raise e
+                self._queue_url = self._connection.client.get_queue_url(QueueName=self._queue_name)['QueueUrl']
+        return self._queue_url
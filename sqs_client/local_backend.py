@@ -0,0 +1,603 @@
+"""
+In-memory stand-in for SQS, for offline benchmarks and load tests.
+
+LocalSqsConnection implements the SqsConnection contract with a client and
+a resource that mimic the subset of the boto3 SQS API used by sqs_client:
+standard and FIFO queues, delays, visibility timeouts, long polling,
+message and system attributes, batch send/delete/visibility calls, tags,
+queue attributes and list_queues pagination.
+
+All connections of a region share one LocalSqsBroker, so a publisher and a
+subscriber built separately see the same queues, as they would on AWS.
+The broker also counts API calls per operation.
+"""
+import uuid
+import hashlib
+from time import time
+from itertools import count
+from threading import Condition, Lock
+from collections import Counter
+from contextlib import contextmanager
+
+from sqs_client.contracts import SqsConnection as SqsConnectionBase
+
+ACCOUNT_ID = '000000000000'
+DEDUPLICATION_INTERVAL_SECONDS = 300
+MAX_WAIT_TIME_SECONDS = 20
+DEFAULT_QUEUE_ATTRIBUTES = {
+    'VisibilityTimeout': '30',
+    'MessageRetentionPeriod': '345600',
+    'DelaySeconds': '0',
+    'ReceiveMessageWaitTimeSeconds': '0',
+    'MaximumMessageSize': '262144'
+}
+
+
+class LocalSqsError(Exception):
+    code = 'InternalError'
+    sender_fault = True
+
+    def __init__(self, message=''):
+        super().__init__(message)
+        self.message = message
+
+
+class QueueDoesNotExist(LocalSqsError):
+    code = 'AWS.SimpleQueueService.NonExistentQueue'
+
+
+class QueueNameExists(LocalSqsError):
+    code = 'QueueAlreadyExists'
+
+
+class ReceiptHandleIsInvalid(LocalSqsError):
+    code = 'ReceiptHandleIsInvalid'
+
+
+class InvalidParameterValue(LocalSqsError):
+    code = 'InvalidParameterValue'
+
+
+class MissingParameter(LocalSqsError):
+    code = 'MissingParameter'
+
+
+class TooManyEntriesInBatchRequest(LocalSqsError):
+    code = 'AWS.SimpleQueueService.TooManyEntriesInBatchRequest'
+
+
+class EmptyBatchRequest(LocalSqsError):
+    code = 'AWS.SimpleQueueService.EmptyBatchRequest'
+
+
+class LocalSqsExceptions:
+    """
+        Mirrors client.exceptions of a boto3 client.
+    """
+    QueueDoesNotExist = QueueDoesNotExist
+    QueueNameExists = QueueNameExists
+    ReceiptHandleIsInvalid = ReceiptHandleIsInvalid
+    InvalidParameterValue = InvalidParameterValue
+    MissingParameter = MissingParameter
+    TooManyEntriesInBatchRequest = TooManyEntriesInBatchRequest
+    EmptyBatchRequest = EmptyBatchRequest
+
+
+class _LocalMessage:
+    __slots__ = (
+        'message_id', 'body', 'md5', 'message_attributes', 'group_id',
+        'deduplication_id', 'sequence_number', 'sent_at', 'visible_at',
+        'first_received_at', 'receive_count', 'receipt_handle'
+    )
+
+    def __init__(self, body, message_attributes, group_id, deduplication_id, sequence_number, visible_at):
+        self.message_id = str(uuid.uuid4())
+        self.body = body
+        self.md5 = hashlib.md5(body.encode('utf-8')).hexdigest()
+        self.message_attributes = message_attributes or {}
+        self.group_id = group_id
+        self.deduplication_id = deduplication_id
+        self.sequence_number = sequence_number
+        self.sent_at = time()
+        self.visible_at = visible_at
+        self.first_received_at = None
+        self.receive_count = 0
+        self.receipt_handle = None
+
+
+class _LocalQueue:
+
+    def __init__(self, name, url, attributes, tags):
+        self.name = name
+        self.url = url
+        self.attributes = dict(DEFAULT_QUEUE_ATTRIBUTES)
+        self.attributes.update(attributes or {})
+        self.tags = dict(tags or {})
+        self.created_at = time()
+        self.messages = {}
+        self.receipt_handles = {}
+        self.deduplication = {}
+
+    @property
+    def fifo(self):
+        return self.attributes.get('FifoQueue', 'false').lower() == 'true'
+
+    def int_attribute(self, name):
+        return int(self.attributes.get(name, DEFAULT_QUEUE_ATTRIBUTES.get(name, 0)))
+
+
+class LocalSqsBroker:
+    """
+        The shared state behind every local client of a region.
+    """
+
+    _lock = Lock()
+    _brokers = {}
+
+    def __init__(self, region_name):
+        self.region_name = region_name
+        self.condition = Condition()
+        self.queues = {}
+        self.calls = Counter()
+        self._sequence = count(1)
+
+    @classmethod
+    def get(cls, region_name):
+        with cls._lock:
+            if region_name not in cls._brokers:
+                cls._brokers[region_name] = cls(region_name)
+            return cls._brokers[region_name]
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._brokers = {}
+
+    def next_sequence_number(self):
+        return next(self._sequence)
+
+    def get_api_calls(self) -> dict:
+        with self.condition:
+            return dict(self.calls)
+
+    def reset_api_calls(self):
+        with self.condition:
+            self.calls.clear()
+
+
+class LocalSqsClient:
+    """
+        Implements the boto3 SQS client calls used by sqs_client against a LocalSqsBroker.
+    """
+
+    exceptions = LocalSqsExceptions
+
+    def __init__(self, broker: LocalSqsBroker):
+        self._broker = broker
+
+    def get_api_calls(self) -> dict:
+        return self._broker.get_api_calls()
+
+    def reset_api_calls(self):
+        self._broker.reset_api_calls()
+
+    # Queues
+
+    def create_queue(self, QueueName, Attributes=None, tags=None):
+        with self._call('CreateQueue'):
+            attributes = {key: str(value) for key, value in (Attributes or {}).items()}
+            if QueueName.endswith('.fifo') != (attributes.get('FifoQueue', 'false').lower() == 'true'):
+                raise InvalidParameterValue('FIFO queue names must end with .fifo and set FifoQueue')
+            url = self._queue_url(QueueName)
+            queue = self._broker.queues.get(url)
+            if queue:
+                for key, value in attributes.items():
+                    if queue.attributes.get(key) != value:
+                        raise QueueNameExists(QueueName)
+                return {'QueueUrl': url}
+            self._broker.queues[url] = _LocalQueue(QueueName, url, attributes, tags)
+            return {'QueueUrl': url}
+
+    def get_queue_url(self, QueueName, QueueOwnerAWSAccountId=None):
+        with self._call('GetQueueUrl'):
+            url = self._queue_url(QueueName)
+            self._get_queue(url)
+            return {'QueueUrl': url}
+
+    def delete_queue(self, QueueUrl):
+        with self._call('DeleteQueue'):
+            self._get_queue(QueueUrl)
+            del self._broker.queues[QueueUrl]
+            self._broker.condition.notify_all()
+            return {}
+
+    def purge_queue(self, QueueUrl):
+        with self._call('PurgeQueue'):
+            queue = self._get_queue(QueueUrl)
+            queue.messages.clear()
+            queue.receipt_handles.clear()
+            return {}
+
+    def list_queues(self, QueueNamePrefix='', NextToken=None, MaxResults=None):
+        with self._call('ListQueues'):
+            urls = sorted(
+                queue.url for queue in self._broker.queues.values()
+                if queue.name.startswith(QueueNamePrefix or '')
+            )
+            start = int(NextToken) if NextToken else 0
+            end = start + MaxResults if MaxResults else min(len(urls), 1000)
+            response = {}
+            if urls[start:end]:
+                response['QueueUrls'] = urls[start:end]
+            if MaxResults and end < len(urls):
+                response['NextToken'] = str(end)
+            return response
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None):
+        with self._call('GetQueueAttributes'):
+            queue = self._get_queue(QueueUrl)
+            now = time()
+            self._expire_messages(queue, now)
+            attributes = dict(queue.attributes)
+            attributes['ApproximateNumberOfMessages'] = str(sum(
+                1 for message in queue.messages.values() if message.visible_at <= now
+            ))
+            attributes['ApproximateNumberOfMessagesNotVisible'] = str(sum(
+                1 for message in queue.messages.values() if message.visible_at > now and message.receive_count
+            ))
+            attributes['ApproximateNumberOfMessagesDelayed'] = str(sum(
+                1 for message in queue.messages.values() if message.visible_at > now and not message.receive_count
+            ))
+            attributes['CreatedTimestamp'] = str(int(queue.created_at))
+            attributes['QueueArn'] = 'arn:aws:sqs:{}:{}:{}'.format(self._broker.region_name, ACCOUNT_ID, queue.name)
+            names = AttributeNames or []
+            if 'All' not in names:
+                attributes = {name: value for name, value in attributes.items() if name in names}
+            return {'Attributes': attributes}
+
+    def set_queue_attributes(self, QueueUrl, Attributes):
+        with self._call('SetQueueAttributes'):
+            queue = self._get_queue(QueueUrl)
+            queue.attributes.update({key: str(value) for key, value in Attributes.items()})
+            return {}
+
+    def tag_queue(self, QueueUrl, Tags):
+        with self._call('TagQueue'):
+            self._get_queue(QueueUrl).tags.update(Tags)
+            return {}
+
+    def untag_queue(self, QueueUrl, TagKeys):
+        with self._call('UntagQueue'):
+            queue = self._get_queue(QueueUrl)
+            for key in TagKeys:
+                queue.tags.pop(key, None)
+            return {}
+
+    def list_queue_tags(self, QueueUrl):
+        with self._call('ListQueueTags'):
+            tags = dict(self._get_queue(QueueUrl).tags)
+            return {'Tags': tags} if tags else {}
+
+    # Messages
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds=None, MessageAttributes=None,
+                     MessageGroupId=None, MessageDeduplicationId=None, **kwargs):
+        with self._call('SendMessage'):
+            queue = self._get_queue(QueueUrl)
+            return self._send(queue, MessageBody, DelaySeconds, MessageAttributes, MessageGroupId, MessageDeduplicationId)
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self._call('SendMessageBatch'):
+            queue = self._get_queue(QueueUrl)
+            self._check_batch(Entries)
+            response = {'Successful': [], 'Failed': []}
+            for entry in Entries:
+                try:
+                    result = self._send(
+                        queue,
+                        entry['MessageBody'],
+                        entry.get('DelaySeconds'),
+                        entry.get('MessageAttributes'),
+                        entry.get('MessageGroupId'),
+                        entry.get('MessageDeduplicationId')
+                    )
+                except LocalSqsError as e:
+                    response['Failed'].append(self._failure(entry['Id'], e))
+                else:
+                    result['Id'] = entry['Id']
+                    response['Successful'].append(result)
+            return response
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=None, VisibilityTimeout=None,
+                        MessageAttributeNames=None, AttributeNames=None, MessageSystemAttributeNames=None,
+                        ReceiveRequestAttemptId=None):
+        with self._call('ReceiveMessage'):
+            queue = self._get_queue(QueueUrl)
+            if not 1 <= MaxNumberOfMessages <= 10:
+                raise InvalidParameterValue('MaxNumberOfMessages must be between 1 and 10')
+            wait_time = queue.int_attribute('ReceiveMessageWaitTimeSeconds') if WaitTimeSeconds is None else WaitTimeSeconds
+            deadline = time() + min(wait_time, MAX_WAIT_TIME_SECONDS)
+            visibility_timeout = queue.int_attribute('VisibilityTimeout') if VisibilityTimeout is None else VisibilityTimeout
+            system_attribute_names = list(AttributeNames or []) + list(MessageSystemAttributeNames or [])
+            while True:
+                received = self._receive(queue, MaxNumberOfMessages, visibility_timeout)
+                if received:
+                    return {'Messages': [
+                        self._format_message(message, MessageAttributeNames, system_attribute_names)
+                        for message in received
+                    ]}
+                now = time()
+                if now >= deadline:
+                    return {}
+                self._broker.condition.wait(min(deadline, self._next_visible_at(queue, deadline)) - now)
+                queue = self._get_queue(QueueUrl)
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        with self._call('DeleteMessage'):
+            self._delete(self._get_queue(QueueUrl), ReceiptHandle)
+            return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        with self._call('DeleteMessageBatch'):
+            queue = self._get_queue(QueueUrl)
+            self._check_batch(Entries)
+            response = {'Successful': [], 'Failed': []}
+            for entry in Entries:
+                try:
+                    self._delete(queue, entry['ReceiptHandle'])
+                except LocalSqsError as e:
+                    response['Failed'].append(self._failure(entry['Id'], e))
+                else:
+                    response['Successful'].append({'Id': entry['Id']})
+            return response
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout):
+        with self._call('ChangeMessageVisibility'):
+            self._change_visibility(self._get_queue(QueueUrl), ReceiptHandle, VisibilityTimeout)
+            return {}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        with self._call('ChangeMessageVisibilityBatch'):
+            queue = self._get_queue(QueueUrl)
+            self._check_batch(Entries)
+            response = {'Successful': [], 'Failed': []}
+            for entry in Entries:
+                try:
+                    self._change_visibility(queue, entry['ReceiptHandle'], entry['VisibilityTimeout'])
+                except LocalSqsError as e:
+                    response['Failed'].append(self._failure(entry['Id'], e))
+                else:
+                    response['Successful'].append({'Id': entry['Id']})
+            return response
+
+    # Internals, called with the broker condition held
+
+    @contextmanager
+    def _call(self, operation):
+        with self._broker.condition:
+            self._broker.calls[operation] += 1
+            yield
+
+    def _queue_url(self, name):
+        return 'local://sqs.{}/{}/{}'.format(self._broker.region_name, ACCOUNT_ID, name)
+
+    def _get_queue(self, url):
+        queue = self._broker.queues.get(url)
+        if not queue:
+            raise QueueDoesNotExist(url)
+        return queue
+
+    def _check_batch(self, entries):
+        if not entries:
+            raise EmptyBatchRequest()
+        if len(entries) > 10:
+            raise TooManyEntriesInBatchRequest()
+
+    def _failure(self, entry_id, error):
+        return {
+            'Id': entry_id,
+            'SenderFault': error.sender_fault,
+            'Code': error.code,
+            'Message': error.message
+        }
+
+    def _send(self, queue, body, delay_seconds, message_attributes, group_id, deduplication_id):
+        if len(body.encode('utf-8')) > queue.int_attribute('MaximumMessageSize'):
+            raise InvalidParameterValue('Message must be shorter than {} bytes'.format(queue.int_attribute('MaximumMessageSize')))
+        now = time()
+        if queue.fifo:
+            if not group_id:
+                raise MissingParameter('The request must contain the parameter MessageGroupId.')
+            if not deduplication_id:
+                if queue.attributes.get('ContentBasedDeduplication', 'false').lower() != 'true':
+                    raise InvalidParameterValue('The queue should either have ContentBasedDeduplication enabled or MessageDeduplicationId provided explicitly')
+                deduplication_id = hashlib.sha256(body.encode('utf-8')).hexdigest()
+            self._expire_deduplication(queue, now)
+            duplicate = queue.deduplication.get(deduplication_id)
+            if duplicate:
+                return {'MessageId': duplicate[0], 'MD5OfMessageBody': duplicate[1]}
+            delay_seconds = 0
+        elif delay_seconds is None:
+            delay_seconds = queue.int_attribute('DelaySeconds')
+
+        message = _LocalMessage(
+            body,
+            message_attributes,
+            group_id,
+            deduplication_id,
+            self._broker.next_sequence_number(),
+            now + (delay_seconds or 0)
+        )
+        queue.messages[message.message_id] = message
+        if queue.fifo:
+            queue.deduplication[deduplication_id] = (message.message_id, message.md5, now)
+        self._broker.condition.notify_all()
+        response = {'MessageId': message.message_id, 'MD5OfMessageBody': message.md5}
+        if queue.fifo:
+            response['SequenceNumber'] = str(message.sequence_number)
+        return response
+
+    def _receive(self, queue, max_number_of_messages, visibility_timeout):
+        now = time()
+        self._expire_messages(queue, now)
+        busy_groups = set()
+        if queue.fifo:
+            busy_groups = set(
+                message.group_id for message in queue.messages.values()
+                if message.receive_count and message.visible_at > now
+            )
+        received = []
+        # queue.messages keeps send order, which is also the FIFO order.
+        for message in queue.messages.values():
+            if len(received) >= max_number_of_messages:
+                break
+            if message.visible_at > now or message.group_id in busy_groups:
+                continue
+            message.receive_count += 1
+            message.first_received_at = message.first_received_at or now
+            message.visible_at = now + visibility_timeout
+            message.receipt_handle = uuid.uuid4().hex + message.message_id
+            queue.receipt_handles[message.receipt_handle] = message.message_id
+            received.append(message)
+        return received
+
+    def _delete(self, queue, receipt_handle):
+        message_id = queue.receipt_handles.pop(receipt_handle, None)
+        if message_id is None:
+            raise ReceiptHandleIsInvalid('The receipt handle provided is not valid.')
+        message = queue.messages.pop(message_id, None)
+        if message:
+            queue.receipt_handles.pop(message.receipt_handle, None)
+        self._broker.condition.notify_all()
+
+    def _change_visibility(self, queue, receipt_handle, visibility_timeout):
+        message_id = queue.receipt_handles.get(receipt_handle)
+        message = queue.messages.get(message_id)
+        if not message:
+            raise ReceiptHandleIsInvalid('The receipt handle provided is not valid.')
+        if not 0 <= int(visibility_timeout) <= 43200:
+            raise InvalidParameterValue('VisibilityTimeout must be between 0 and 43200')
+        message.visible_at = time() + int(visibility_timeout)
+        self._broker.condition.notify_all()
+
+    def _expire_messages(self, queue, now):
+        retention = queue.int_attribute('MessageRetentionPeriod')
+        expired = [message_id for message_id, message in queue.messages.items() if now - message.sent_at > retention]
+        for message_id in expired:
+            message = queue.messages.pop(message_id)
+            queue.receipt_handles.pop(message.receipt_handle, None)
+
+    def _expire_deduplication(self, queue, now):
+        expired = [
+            key for key, (_, _, sent_at) in queue.deduplication.items()
+            if now - sent_at > DEDUPLICATION_INTERVAL_SECONDS
+        ]
+        for key in expired:
+            del queue.deduplication[key]
+
+    def _next_visible_at(self, queue, default):
+        upcoming = [message.visible_at for message in queue.messages.values() if message.visible_at > time()]
+        return min(upcoming) if upcoming else default
+
+    def _format_message(self, message, message_attribute_names, system_attribute_names):
+        formatted = {
+            'MessageId': message.message_id,
+            'ReceiptHandle': message.receipt_handle,
+            'MD5OfBody': message.md5,
+            'Body': message.body
+        }
+        attributes = self._select(message.message_attributes, message_attribute_names)
+        if attributes:
+            formatted['MessageAttributes'] = attributes
+        system_attributes = self._select({
+            'SenderId': ACCOUNT_ID,
+            'SentTimestamp': str(int(message.sent_at * 1000)),
+            'ApproximateReceiveCount': str(message.receive_count),
+            'ApproximateFirstReceiveTimestamp': str(int(message.first_received_at * 1000)),
+            'MessageGroupId': message.group_id,
+            'MessageDeduplicationId': message.deduplication_id,
+            'SequenceNumber': str(message.sequence_number) if message.group_id else None
+        }, system_attribute_names)
+        system_attributes = {name: value for name, value in system_attributes.items() if value is not None}
+        if system_attributes:
+            formatted['Attributes'] = system_attributes
+        return formatted
+
+    def _select(self, attributes, names):
+        names = names or []
+        if 'All' in names or '.*' in names:
+            return dict(attributes)
+        selected = {}
+        for name in names:
+            if name.endswith('.*'):
+                selected.update({key: value for key, value in attributes.items() if key.startswith(name[:-1])})
+            elif name in attributes:
+                selected[name] = attributes[name]
+        return selected
+
+
+class LocalQueueResource:
+    """
+        Mirrors the boto3 sqs.Queue resource.
+    """
+
+    def __init__(self, client: LocalSqsClient, url: str):
+        self._client = client
+        self.url = url
+
+    @property
+    def attributes(self):
+        return self._client.get_queue_attributes(QueueUrl=self.url, AttributeNames=['All'])['Attributes']
+
+    def send_message(self, **params):
+        return self._client.send_message(QueueUrl=self.url, **params)
+
+    def send_messages(self, Entries):
+        return self._client.send_message_batch(QueueUrl=self.url, Entries=Entries)
+
+    def delete(self):
+        return self._client.delete_queue(QueueUrl=self.url)
+
+
+class LocalSqsResource:
+    """
+        Mirrors the boto3 sqs service resource.
+    """
+
+    def __init__(self, client: LocalSqsClient):
+        self._client = client
+
+    def create_queue(self, QueueName, Attributes=None, tags=None):
+        url = self._client.create_queue(QueueName=QueueName, Attributes=Attributes, tags=tags)['QueueUrl']
+        return LocalQueueResource(self._client, url)
+
+    def get_queue_by_name(self, QueueName):
+        return LocalQueueResource(self._client, self._client.get_queue_url(QueueName=QueueName)['QueueUrl'])
+
+    def Queue(self, url):
+        return LocalQueueResource(self._client, url)
+
+
+class LocalSqsConnection(SqsConnectionBase):
+
+    def __init__(self, region_name: str='local', access_key: str=None, secret_key: str=None, broker: LocalSqsBroker=None, **kwargs):
+        self._region_name = region_name
+        self._broker = broker or LocalSqsBroker.get(region_name)
+        self._queue_url = None
+        self._load_client()
+        self._load_resource()
+
+    def set_queue(self, queue_url: str):
+        self._queue_url = queue_url
+
+    def get_queue_resource(self, queue_url: str=None):
+        self._queue_url = queue_url if queue_url else self._queue_url
+        if not self._queue_url:
+            raise Exception("Queue is not defined.")
+        return self.resource.Queue(self._queue_url)
+
+    def _load_resource(self):
+        self.resource = LocalSqsResource(self.client)
+
+    def _load_client(self):
+        self.client = LocalSqsClient(self._broker)
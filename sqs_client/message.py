@@ -16,21 +16,26 @@ class RequestMessage(RequestMessageBase):
         group_id: str=None, 
         delay_seconds: int=0, 
         reply_queue: ReplyQueue=None, 
-        message_attributes: dict={}
+        message_attributes: dict=None
     ):
         self._request_id = str(random.getrandbits(128))
         self._body = body 
         self._group_id = group_id 
         self._delay_seconds = delay_seconds 
-        self._message_attributes = message_attributes
+        self._message_attributes = message_attributes or {}
         self.queue_url = queue_url 
         self._reply_queue = reply_queue
+
+    @property
+    def request_id(self) -> str:
+        return self._request_id
     
     def get_params(self) -> dict:
+        # Copied, so concurrent messages never share an attributes dict.
         params = {
             'MessageBody': self._body,
             'DelaySeconds': self._delay_seconds,
-            'MessageAttributes': self._message_attributes
+            'MessageAttributes': dict(self._message_attributes)
         }
         if self._group_id:
             params['MessageGroupId'] = self._group_id
@@ -44,24 +49,36 @@ class RequestMessage(RequestMessageBase):
                 'StringValue': self._request_id,
                 'DataType': 'String'
             }
+            params['MessageAttributes'].update(self._reply_queue.get_reply_attributes())
         return params
 
     def get_response(self, timeout=10) -> MessageBase:
         return self._reply_queue.get_response_by_id(self._request_id, timeout)
 
 class Message(MessageBase):
+    """
+        Compact record of a received message: only the fields the clients use
+        are kept, not the whole receive response.
+    """
+
+    __slots__ = ('_id', '_body', '_receipt_handle', '_attributes', '_system_attributes', 'initial_time')
 
     def __init__(self, message: dict):
         self.initial_time = time()
-        self._message = message
+        self._id = message['MessageId']
+        self._body = message['Body']
+        self._receipt_handle = message['ReceiptHandle']
+        # SQS leaves the keys out when a message has no attributes.
+        self._attributes = message.get('MessageAttributes') or {}
+        self._system_attributes = message.get('Attributes') or {}
     
     @property
     def body(self) -> str:
-        return self._message['Body']
+        return self._body
     
     @property
     def id(self) -> str:
-        return self._message['MessageId']
+        return self._id
     
     @property
     def request_id(self) -> str:
@@ -79,57 +96,106 @@ class Message(MessageBase):
             
     @property
     def attributes(self) -> dict:
-        return self._message['MessageAttributes']    
+        return self._attributes
+
+    @property
+    def receipt_handle(self) -> str:
+        return self._receipt_handle
+
+    @property
+    def receive_count(self) -> int:
+        """
+            ApproximateReceiveCount, when it was requested on receive, else 0.
+        """
+        return int(self._system_attributes.get('ApproximateReceiveCount', 0))
+
+    @property
+    def group_id(self) -> str:
+        """
+            MessageGroupId of a FIFO message, when it was requested on receive.
+        """
+        return self._system_attributes.get('MessageGroupId')
 
 
 class MessageList(MessageListBase):
+    """
+        The messages of one or more receives, indexed by MessageId in the
+        order they were received.
+
+        A message delivered more than once keeps its first position and its
+        latest receipt handle. remove is O(1). delete only deletes the
+        messages that were iterated over and not removed since.
+    """
 
     def __init__(self, client, queue, messages):
         self.client = client 
         self.queue = queue 
-        self.messages = messages 
-        self.read_messages = []
+        self._messages = {}
+        self._read = {}
+        for message in messages.get('Messages', []):
+            self._messages[message['MessageId']] = Message(message)
     
     def __len__(self):
-        return len(self.messages['Messages'])
+        return len(self._messages)
     
     def __iter__(self):
         return self._fetch_one()
     
     def __add__(self, other_list):
-        self.messages['Messages'] += other_list.messages['Messages']
+        self._messages.update(other_list._messages)
         return self
     
     def _fetch_one(self):        
-        messages_id = []
-        for message in self.messages['Messages']:
-            if message['MessageId'] in messages_id:
-                continue            
-            messages_id.append(message['MessageId'])
-            self.read_messages.append({
-                'Id': message['MessageId'],
-                'ReceiptHandle': message['ReceiptHandle']
-            })
-            yield Message(message)
+        for message in list(self._messages.values()):
+            if message.id not in self._messages:
+                continue
+            self._read[message.id] = message
+            yield message
 
     def remove(self, message_id):
         """
             Removes a message from the object by id.
         """
-        self.read_messages = list(filter(lambda m: m['Id'] != message_id, self.read_messages))
-        self.messages['Messages'] = list(filter(lambda m: m['MessageId'] != message_id, self.messages['Messages']))
+        self._read.pop(message_id, None)
+        self._messages.pop(message_id, None)
 
-    def delete(self):
+    def delete(self, acknowledger=None):
         """
             Deletes messages from the queue.
             It only deletes messages that were returned by the method _fetch_one
+            With an acknowledger, they are handed to it and deleted in the background.
         """
+        if acknowledger:
+            for message in self._read.values():
+                acknowledger.ack(self.queue, message)
+            return
         # SQS only accepts up to ten messages per request
         for entries in self._delete_chunks():
             self.client.delete_message_batch(QueueUrl=self.queue, Entries=entries)
+
+    def delete_message(self, message):
+        """
+            Deletes a single message from the queue as soon as it has been handled,
+            without waiting for the rest of the list.
+        """
+        self.client.delete_message(QueueUrl=self.queue, ReceiptHandle=message.receipt_handle)
+
+    def release_message(self, message, visibility_timeout=0):
+        """
+            Makes a message visible again after visibility_timeout seconds,
+            so it can be received again without waiting for the queue's timeout.
+        """
+        self.client.change_message_visibility(
+            QueueUrl=self.queue, 
+            ReceiptHandle=message.receipt_handle,
+            VisibilityTimeout=visibility_timeout
+        )
     
     def _delete_chunks(self):
         n = 10
-        for i in range(0, len(self.read_messages), n):
-            yield self.read_messages[i:i + n]
-    
\ No newline at end of file
+        entries = [
+            {'Id': message.id, 'ReceiptHandle': message.receipt_handle}
+            for message in self._read.values()
+        ]
+        for i in range(0, len(entries), n):
+            yield entries[i:i + n]
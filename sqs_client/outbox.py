@@ -0,0 +1,225 @@
+import json
+import sqlite3
+import logging
+from time import time
+from threading import Thread, Event, Lock
+from collections import namedtuple
+from contextlib import contextmanager
+
+from sqs_client.backoff import ExponentialBackoff
+from sqs_client.contracts import (
+    SqsConnection,
+    OutboxRepository as OutboxRepositoryBase,
+    RequestMessage
+)
+
+OutboxRecord = namedtuple('OutboxRecord', ['id', 'queue_url', 'params', 'attempts'])
+
+
+class SqliteOutboxRepository(OutboxRepositoryBase):
+    """
+        Stores unpublished messages in a local SQLite database.
+
+        Records are pending until an OutboxRelay publishes them, when they are
+        deleted, or until SQS rejects them as the sender's fault, when they are
+        marked failed and kept for inspection. fetch_due claims the records it
+        returns for claim_timeout seconds, so a relay that dies mid-batch only
+        delays them.
+    """
+
+    PENDING = 'pending'
+    FAILED = 'failed'
+
+    def __init__(self, path: str, claim_timeout: int=60):
+        self._path = path
+        self._claim_timeout = claim_timeout
+        self._db = None
+        self._lock = Lock()
+
+    def create(self, request_message: RequestMessage):
+        self.create_many([request_message])
+
+    def create_many(self, request_messages: list):
+        now = time()
+        rows = [
+            (message.queue_url, json.dumps(message.get_params()), self.PENDING, 0, now, now)
+            for message in request_messages
+        ]
+        with self._transaction() as db:
+            db.executemany(
+                'INSERT INTO outbox (queue_url, params, status, attempts, next_attempt_at, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+
+    def fetch_due(self, limit: int=100) -> list:
+        now = time()
+        with self._transaction() as db:
+            rows = db.execute(
+                'SELECT id, queue_url, params, attempts FROM outbox '
+                'WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?',
+                (self.PENDING, now, limit)
+            ).fetchall()
+            db.executemany(
+                'UPDATE outbox SET next_attempt_at = ? WHERE id = ?',
+                [(now + self._claim_timeout, row[0]) for row in rows]
+            )
+        return [OutboxRecord(row[0], row[1], json.loads(row[2]), row[3]) for row in rows]
+
+    def mark_sent(self, record_ids: list):
+        with self._transaction() as db:
+            db.executemany('DELETE FROM outbox WHERE id = ?', [(record_id,) for record_id in record_ids])
+
+    def mark_failed(self, record_id: int, error: str, next_attempt_at: float=None):
+        """
+            Schedules another attempt at next_attempt_at, or gives up on the
+            record when next_attempt_at is None.
+        """
+        status = self.PENDING if next_attempt_at is not None else self.FAILED
+        with self._transaction() as db:
+            db.execute(
+                'UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt_at = ?, last_error = ? '
+                'WHERE id = ?',
+                (status, next_attempt_at or time(), error, record_id)
+            )
+
+    def count(self, status: str=PENDING) -> int:
+        with self._transaction() as db:
+            return db.execute('SELECT COUNT(*) FROM outbox WHERE status = ?', (status,)).fetchone()[0]
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            db = self._connect()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+
+    def _connect(self):
+        # Opened on first use, so a repository built before the daemon forks
+        # never shares its connection with the parent process.
+        if not self._db:
+            self._db = sqlite3.connect(self._path, isolation_level=None, check_same_thread=False, timeout=30)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS outbox ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'queue_url TEXT NOT NULL, '
+                'params TEXT NOT NULL, '
+                'status TEXT NOT NULL, '
+                'attempts INTEGER NOT NULL DEFAULT 0, '
+                'next_attempt_at REAL NOT NULL, '
+                'created_at REAL NOT NULL, '
+                'last_error TEXT)'
+            )
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS outbox_status_next_attempt_at ON outbox (status, next_attempt_at)'
+            )
+        return self._db
+
+
+class OutboxRelay:
+    """
+        Publishes the messages of an outbox repository in the background.
+
+        Due records are sent with SendMessageBatch, ten per request and queue.
+        Records SQS fails for a transient reason are retried with exponential
+        backoff and jitter; the ones it rejects as the sender's fault, or that
+        exhausted max_attempts, are marked failed.
+    """
+
+    MAX_BATCH_SIZE = 10
+
+    def __init__(self,
+        sqs_connection: SqsConnection,
+        outbox_repository: OutboxRepositoryBase,
+        fetch_size: int=100,
+        poll_interval: float=1,
+        max_attempts: int=None,
+        backoff: ExponentialBackoff=None
+    ):
+        self._connection = sqs_connection
+        self._repository = outbox_repository
+        self._fetch_size = fetch_size
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+        self._backoff = backoff or ExponentialBackoff(initial_seconds=1, max_seconds=300, jitter=True)
+        self._stopped = Event()
+        self._thread = None
+        self._logger = logging.getLogger()
+
+    def start(self):
+        if self._thread:
+            return
+        self._stopped.clear()
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def relay(self) -> int:
+        """
+            Publishes the records due now and returns how many were sent.
+        """
+        records = self._repository.fetch_due(self._fetch_size)
+        by_queue = {}
+        for record in records:
+            by_queue.setdefault(record.queue_url, []).append(record)
+        sent = 0
+        for queue_url, queue_records in by_queue.items():
+            for i in range(0, len(queue_records), self.MAX_BATCH_SIZE):
+                sent += self._send_batch(queue_url, queue_records[i:i + self.MAX_BATCH_SIZE])
+        return sent
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                sent = self.relay()
+            except Exception:
+                self._logger.exception('Error while relaying the outbox')
+                sent = 0
+            if not sent:
+                self._stopped.wait(self._poll_interval)
+
+    def _send_batch(self, queue_url: str, records: list) -> int:
+        entries = []
+        for index, record in enumerate(records):
+            entry = {'Id': str(index)}
+            entry.update(record.params)
+            entries.append(entry)
+        try:
+            response = self._connection.client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        except Exception as e:
+            self._logger.warning('Outbox batch could not be published to {}: {}'.format(queue_url, e))
+            for record in records:
+                self._retry_later(record, str(e))
+            return 0
+
+        successful = response.get('Successful', [])
+        self._repository.mark_sent([records[int(result['Id'])].id for result in successful])
+        for result in response.get('Failed', []):
+            record = records[int(result['Id'])]
+            error = '{}: {}'.format(result.get('Code'), result.get('Message'))
+            if result.get('SenderFault', False):
+                self._logger.error('Outbox message {} rejected by SQS: {}'.format(record.id, error))
+                self._repository.mark_failed(record.id, error)
+            else:
+                self._retry_later(record, error)
+        return len(successful)
+
+    def _retry_later(self, record: OutboxRecord, error: str):
+        attempts = record.attempts + 1
+        if self._max_attempts and attempts >= self._max_attempts:
+            self._repository.mark_failed(record.id, error)
+            return
+        self._repository.mark_failed(record.id, error, time() + self._backoff.delay(record.attempts))
@@ -1,9 +1,16 @@
 import json
-from time import sleep
+import logging
+from time import time, sleep
+from threading import Thread, Condition, Lock
+from concurrent.futures import Future
+
+from sqs_client.backoff import ExponentialBackoff
+from sqs_client.exceptions import PublishError
 
 from sqs_client.contracts import (
     SqsConnection,
     Publisher as PublisherBase,
+    OutboxRepository,
     RequestMessage
 )
 
@@ -14,60 +21,221 @@ class Publisher(PublisherBase):
         self._queue_url = None
 
     def send_message(self, request_message: RequestMessage):
-        self._set_queue(request_message.queue_url)
+        # The client is thread safe and takes the queue url per call, so
+        # concurrent senders never race on the connection's current queue.
         params = request_message.get_params()
-        return self._get_queue().send_message(**params)
-    
-    def _get_queue(self):
-        return self._connection.get_queue_resource()
-    
-    def _set_queue(self, queue_url):
-        self._connection.set_queue(queue_url)
+        return self._connection.client.send_message(
+            QueueUrl=request_message.queue_url,
+            **params
+        )
+
+class BatchPublisher(PublisherBase):
+    """
+        Buffers messages per queue url and publishes them with SendMessageBatch.
+
+        A queue's buffer is flushed when it holds batch_size messages, when the
+        next message would exceed the batch payload limit, or flush_interval
+        seconds after its first message was buffered. send_message returns a
+        Future holding the batch result entry, or a PublishError for the
+        entries SQS reported as failed.
+    """
+
+    MAX_BATCH_SIZE = 10
+    MAX_BATCH_BYTES = 262144
+
+    def __init__(self, sqs_connection: SqsConnection, batch_size: int=10, flush_interval: float=0.05):
+        self._connection = sqs_connection
+        self._batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        self._flush_interval = flush_interval
+        self._pending = {}
+        self._condition = Condition()
+        self._flush_thread = None
+        self._closed = False
+        self._logger = logging.getLogger()
+
+    def send_message(self, request_message: RequestMessage) -> Future:
+        future = Future()
+        params = request_message.get_params()
+        size = self._entry_size(params)
+        batches = []
+        with self._condition:
+            self._start_flush_thread()
+            pending = self._pending.get(request_message.queue_url)
+            if pending and pending['bytes'] + size > self.MAX_BATCH_BYTES:
+                batches.append((request_message.queue_url, self._pending.pop(request_message.queue_url)))
+                pending = None
+            if not pending:
+                pending = {'entries': [], 'bytes': 0, 'since': time()}
+                self._pending[request_message.queue_url] = pending
+                self._condition.notify()
+            pending['entries'].append((params, future))
+            pending['bytes'] += size
+            if len(pending['entries']) >= self._batch_size:
+                batches.append((request_message.queue_url, self._pending.pop(request_message.queue_url)))
+        for queue_url, batch in batches:
+            self._send_batch(queue_url, batch['entries'])
+        return future
+
+    def flush(self):
+        with self._condition:
+            batches = list(self._pending.items())
+            self._pending = {}
+        for queue_url, batch in batches:
+            self._send_batch(queue_url, batch['entries'])
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.flush()
+
+    def _start_flush_thread(self):
+        if self._flush_thread:
+            return
+        self._flush_thread = Thread(target=self._flush_periodically)
+        self._flush_thread.daemon = True
+        self._flush_thread.start()
+
+    def _flush_periodically(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                oldest = min(batch['since'] for batch in self._pending.values())
+                wait = oldest + self._flush_interval - time()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                now = time()
+                due = [
+                    queue_url for queue_url, batch in self._pending.items()
+                    if now - batch['since'] >= self._flush_interval
+                ]
+                batches = [(queue_url, self._pending.pop(queue_url)) for queue_url in due]
+            for queue_url, batch in batches:
+                self._send_batch(queue_url, batch['entries'])
+
+    def _send_batch(self, queue_url, batch):
+        entries = []
+        for index, (params, _) in enumerate(batch):
+            entry = {'Id': str(index)}
+            entry.update(params)
+            entries.append(entry)
+        try:
+            response = self._connection.client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        except Exception as e:
+            self._logger.exception('Error while trying to publish a batch of messages')
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for result in response.get('Successful', []):
+            batch[int(result['Id'])][1].set_result(result)
+        for result in response.get('Failed', []):
+            self._logger.error('Message could not be published to {}: {}'.format(queue_url, result))
+            batch[int(result['Id'])][1].set_exception(PublishError(
+                result.get('Code'), 
+                result.get('Message'), 
+                result.get('SenderFault', False)
+            ))
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(PublishError('MissingResult', 'No result returned for the entry'))
+
+    def _entry_size(self, params):
+        size = len(params['MessageBody'].encode('utf-8'))
+        for name, attribute in params.get('MessageAttributes', {}).items():
+            size += len(name.encode('utf-8')) + len(attribute['DataType'].encode('utf-8'))
+            size += len(str(attribute.get('StringValue', attribute.get('BinaryValue', ''))).encode('utf-8'))
+        return size
 
 class RetryPublisher(PublisherBase):
+    """
+        Publishes through a synchronous publisher, retrying failed sends.
+
+        Messages still unsent after the retries are stored in the outbox
+        repository, for an OutboxRelay to publish later, and the caller carries
+        on. After such a failure the next messages go straight to the outbox for
+        a growing, jittered period, so callers are not held up by retries while
+        SQS is throttling or unreachable.
+    """
 
     def __init__(self, 
         publisher: Publisher, 
         retries=3, 
-        outbox_repository=None, 
-        queue_url=None
+        outbox_repository: OutboxRepository=None, 
+        queue_url=None,
+        retry_backoff: ExponentialBackoff=None,
+        outbox_backoff: ExponentialBackoff=None
     ):
         self._queue_url = queue_url
         self._publisher = publisher  
         self._outbox_repository = outbox_repository
-        self._retries = retries 
+        self._retries = max(1, retries)
+        self._retry_backoff = retry_backoff or ExponentialBackoff(initial_seconds=0.25, max_seconds=2, jitter=True)
+        self._outbox_backoff = outbox_backoff or ExponentialBackoff(initial_seconds=1, max_seconds=60, jitter=True)
+        self._outbox_until = 0
+        self._lock = Lock()
+        self._logger = logging.getLogger()
 
     def send_message(self, request_message: RequestMessage):
-        self._publisher.set_queue(request_message.queue_url)
-        for _ in range(0, self._retries):
-            try:            
-                self._publish(request_message)
-            except Exception as e:
-                if self._publish_via_outbox(request_message):
-                    return
-            finally:
-                return 
-        raise Exception('Message could not be sent')
+        """
+            Returns the publisher's response, or None when the message was
+            stored in the outbox.
+        """
+        return self.send_messages([request_message])[0]
+
+    def send_messages(self, request_messages: list) -> list:
+        """
+            Sends the messages one by one and stores all the ones that could not
+            be sent in the outbox with a single write. Returns the publisher's
+            response per message, None for the stored ones.
+        """
+        responses = []
+        unsent = []
+        for request_message in request_messages:
+            response = None
+            if not self._outbox_only():
+                try:
+                    response = self._publish(request_message)
+                except Exception as e:
+                    self._logger.warning('Message could not be published: {}'.format(e))
+                    self._open_outbox_window()
+                    if not self._outbox_repository:
+                        raise
+                    unsent.append(request_message)
+                else:
+                    self._close_outbox_window()
+            else:
+                unsent.append(request_message)
+            responses.append(response)
+        if unsent:
+            self._publish_via_outbox(unsent)
+        return responses
     
     def _publish(self, request_message: RequestMessage):
-        success = False
-        for _ in range(3):
+        for attempt in range(self._retries):
             try:
-                self._publisher.send_message(request_message)
-            except Exception as e:
-                print('Error while trying to publish event.. trying again..')
-                sleep(0.25)
-            else:
-                success = True
-                break
-        if not success:
-            raise Exception('Event not published in queue.')
+                return self._publisher.send_message(request_message)
+            except Exception:
+                if attempt == self._retries - 1:
+                    raise
+                sleep(self._retry_backoff.delay(attempt))
+
+    def _outbox_only(self) -> bool:
+        return bool(self._outbox_repository) and time() < self._outbox_until
+
+    def _open_outbox_window(self):
+        with self._lock:
+            self._outbox_until = time() + self._outbox_backoff.next()
+
+    def _close_outbox_window(self):
+        with self._lock:
+            self._outbox_backoff.reset()
+            self._outbox_until = 0
             
-    def _publish_via_outbox(self, request_message: RequestMessage) -> bool:
-        if not self._outbox_repository:
-            return False
-        try: 
-            self._outbox_repository.create(request_message)
-        except Exception as e:
-            return False 
-        return True  
+    def _publish_via_outbox(self, request_messages: list):
+        self._logger.info('Storing {} messages in the outbox'.format(len(request_messages)))
+        self._outbox_repository.create_many(request_messages)
@@ -1,13 +1,13 @@
 import random 
 import sys
 import logging
-from threading import Thread
-from time import time, sleep
-from multiprocessing import Process
-
-from multiprocessing_logging import install_mp_handler, uninstall_mp_handler
+from threading import Thread, Lock
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from time import time
 
+from sqs_client.acknowledger import Acknowledger
 from sqs_client.exceptions import ReplyTimeout
+from sqs_client.scheduler import Scheduler
 from sqs_client.utils import str_timestamp
 from sqs_client.contracts import (
     SqsConnection,
@@ -19,6 +19,8 @@ from sqs_client.contracts import (
 
 class ReplyQueue(ReplyQueueBase):
 
+    MESSAGE_ATTRIBUTE_NAMES = ['RequestMessageId']
+
     def __init__(self, 
         sqs_connection: SqsConnection,
         name: str, 
@@ -27,8 +29,15 @@ class ReplyQueue(ReplyQueueBase):
         message_retention_period: int=60,
         seconds_before_cleaning: int=20,
         num_messages_before_cleaning: int=200,
-        heartbeat_interval_seconds=300
+        heartbeat_interval_seconds=300,
+        scheduler: Scheduler=None,
+        acknowledger: Acknowledger=None
     ):
+        """
+            The heartbeat and the cleaning of unclaimed replies run as timers
+            of scheduler, the process wide Scheduler by default. With an
+            acknowledger, received replies are deleted in the background.
+        """
         self._id = None
         self._queue = None
         self._name = name
@@ -39,9 +48,13 @@ class ReplyQueue(ReplyQueueBase):
         self._num_messages_before_cleaning = num_messages_before_cleaning
         self._heartbeat_interval_seconds = heartbeat_interval_seconds
         self._idle_queue_sweeper = idle_queue_sweeper
+        self._scheduler = scheduler or Scheduler.default()
+        self._acknowledger = acknowledger
         self._sub_thread = None 
-        self._cleaner_thread = None
+        self._timers = []
         self._messages = {}
+        self._waiters = {}
+        self._lock = Lock()
         self._logger = logging.getLogger()
 
     def get_url(self):
@@ -54,14 +67,73 @@ class ReplyQueue(ReplyQueueBase):
         return self._name + self._id
     
     def get_response_by_id(self, message_id: str, timeout: int=5) -> Message:
-        start = time()
-        while True: 
-            message = self._messages.get(message_id)
-            if not message:
-                if (time() - start) > timeout:
-                    raise ReplyTimeout
-                continue                 
-            return message
+        waiter = self._register_waiter(message_id, timeout)
+        try:
+            return waiter.result(timeout)
+        except FutureTimeoutError:
+            raise ReplyTimeout
+        finally:
+            self._discard_waiter(message_id, waiter)
+
+    def get_response_future(self, message_id: str, timeout: int=5) -> Future:
+        """
+            Returns a future of the reply to message_id without blocking.
+            Register it before sending the request. If no reply arrives within
+            timeout, the subscriber thread fails it with ReplyTimeout on its next
+            receive, i.e. up to the long polling wait time late.
+        """
+        return self._register_waiter(message_id, timeout)
+
+    def _register_waiter(self, message_id: str, timeout: int) -> Future:
+        """
+            Returns a future completed by the subscriber thread when the reply
+            to message_id arrives. Replies that arrived before anyone waited
+            for them are handed over straight away.
+        """
+        deadline = time() + timeout
+        with self._lock:
+            message = self._messages.pop(message_id, None)
+            if message:
+                waiter = Future()
+                waiter.set_result(message)
+                return waiter
+            if message_id in self._waiters:
+                waiter, current_deadline = self._waiters[message_id]
+                deadline = max(deadline, current_deadline)
+            else:
+                waiter = Future()
+            self._waiters[message_id] = (waiter, deadline)
+            return waiter
+
+    def _discard_waiter(self, message_id: str, waiter: Future):
+        with self._lock:
+            registered = self._waiters.get(message_id)
+            if registered and registered[0] is waiter:
+                del self._waiters[message_id]
+
+    def _deliver(self, message: Message):
+        with self._lock:
+            registered = self._waiters.pop(message.request_id, None)
+            if not registered:
+                self._messages[message.request_id] = message
+                return
+        if not registered[0].done():
+            registered[0].set_result(message)
+
+    def _route(self, messages, message: Message):
+        self._deliver(message)
+
+    def _expire_waiters(self):
+        now = time()
+        with self._lock:
+            expired = [
+                message_id for message_id, (_, deadline) in self._waiters.items()
+                if deadline < now
+            ]
+            waiters = [self._waiters.pop(message_id)[0] for message_id in expired]
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_exception(ReplyTimeout())
     
     def _create_queue(self):        
         self._queue = self._connection.resource.create_queue(
@@ -73,9 +145,8 @@ class ReplyQueue(ReplyQueueBase):
                 'heartbeat': str_timestamp()
             }
         )
-        install_mp_handler(self._logger)       
         self._start_sub_thread()
-        self._start_heartbeat()
+        self._start_timers()
         self._start_idle_queue_sweeper()
     
     def _start_idle_queue_sweeper(self):
@@ -84,68 +155,73 @@ class ReplyQueue(ReplyQueueBase):
     
     def remove_queue(self):
         if self._queue:
-            self._stop_heartbeat()
+            self._stop_timers()
             self._idle_queue_sweeper.stop()
+            if self._acknowledger:
+                self._acknowledger.close()
             self._connection.client.delete_queue(QueueUrl=self._queue.url)
             self._queue = None
-            uninstall_mp_handler(self._logger)
     
     def _start_sub_thread(self):
         self._sub_thread = Thread(target=self._subscribe)
         self._sub_thread.daemon = True
         self._sub_thread.start()
     
-    def _start_heartbeat(self):
-        self._heartbeat_process = Process(
-            target=self._heartbeat, 
-            args=(self._heartbeat_interval_seconds, self._queue.url)
-        )
-        self._heartbeat_process.daemon = True
-        self._heartbeat_process.start()
-    
-    def _stop_heartbeat(self):
-        self._heartbeat_process.terminate()
-        self._heartbeat_process.join()
+    def _start_timers(self):
+        self._timers = [
+            self._scheduler.call_every(self._heartbeat_interval_seconds, self._heartbeat, self._queue.url),
+            self._scheduler.call_every(self._seconds_before_cleaning, self._clean_old_messages)
+        ]
+
+    def _stop_timers(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._timers = []
     
-    def _heartbeat(self, heartbeat_interval_seconds, queue_url):
-        while True:
-            sleep(heartbeat_interval_seconds)
-            self._logger.info('Reply Queue Heartbeat')
-            self._connection.client.tag_queue(
-                QueueUrl=queue_url,
-                Tags={
-                    'heartbeat': str_timestamp()
-                }
-            )        
+    def _heartbeat(self, queue_url):
+        self._logger.info('Reply Queue Heartbeat')
+        self._connection.client.tag_queue(
+            QueueUrl=queue_url,
+            Tags={
+                'heartbeat': str_timestamp()
+            }
+        )        
     
     def _subscribe(self):
+        queue = self._queue
         try:
             self._receive_messages()
         except Exception as e:
             # TODO: fix it..
             error = e.__class__.__name__
-            if error != 'QueueDoesNotExist' and self._queue:
+            if error != 'QueueDoesNotExist' and self._queue is queue:
                 raise e 
     
     def _receive_messages(self):
-        self._subscriber.set_queue(self._queue.url)
-        while True:
-            qty_messages = 0
-            for messages in self._subscriber.receive_messages(message_attribute_names=['RequestMessageId']):
+        queue_url = self._queue.url
+        self._subscriber.set_queue(queue_url)
+        qty_messages = 0
+        for messages in self._subscriber.receive_messages(return_none=True, message_attribute_names=self.MESSAGE_ATTRIBUTE_NAMES):
+            if messages:
                 qty_messages += len(messages)
                 for message in messages:
-                    self._messages[message.request_id] = message
-                messages.delete()
-                if qty_messages >= self._num_messages_before_cleaning:
-                    break 
-            self._clean_old_messages()
+                    self._route(messages, message)
+                messages.delete(self._acknowledger)
+            self._expire_waiters()
+            if not self._queue or self._queue.url != queue_url:
+                # The queue was removed; a queue created since has its own thread.
+                return
+            if qty_messages >= self._num_messages_before_cleaning:
+                self._clean_old_messages()
+                qty_messages = 0
     
     def _clean_old_messages(self):
         messages_to_delete = []
-        for message in self._messages.values():
-            current_time = time()
-            diff = current_time - message.initial_time 
-            if diff > self._seconds_before_cleaning:
-                messages_to_delete.append(message.request_id)
-        for request_id in messages_to_delete:
-            del self._messages[request_id]
+        current_time = time()
+        with self._lock:
+            for message in self._messages.values():
+                diff = current_time - message.initial_time 
+                if diff > self._seconds_before_cleaning:
+                    messages_to_delete.append(message.request_id)
+            for request_id in messages_to_delete:
+                del self._messages[request_id]
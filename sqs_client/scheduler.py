@@ -0,0 +1,134 @@
+import os
+import heapq
+import logging
+from itertools import count
+from time import monotonic
+from threading import Thread, Condition, Lock
+
+
+class Timer:
+
+    def __init__(self, scheduler, interval, fn, args):
+        self._scheduler = scheduler
+        self.interval = interval
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self._scheduler.cancel(self)
+
+
+class Scheduler:
+    """
+        Runs the timers of any number of components on one background thread.
+
+        Timers are kept in a heap ordered by due time; the thread sleeps until
+        the first one is due or a new one is scheduled before it. Callbacks run
+        on the scheduler thread, so they must be short; an exception is logged
+        and does not stop a periodic timer. The thread is started with the
+        first timer.
+
+        Ex.:
+            scheduler = Scheduler.default()
+            timer = scheduler.call_every(300, reply_queue_heartbeat)
+            timer.cancel()
+    """
+
+    _default = None
+    _default_lock = Lock()
+
+    def __init__(self, clock=monotonic):
+        self._clock = clock
+        self._heap = []
+        self._sequence = count()
+        self._condition = Condition()
+        self._thread = None
+        self._stopped = False
+        self._logger = logging.getLogger()
+
+    @classmethod
+    def default(cls):
+        """
+            Returns the scheduler shared by the whole process.
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @classmethod
+    def _reset_default(cls):
+        # The scheduler thread does not survive a fork, so a child process
+        # starts its own scheduler.
+        cls._default_lock = Lock()
+        cls._default = None
+
+    def call_later(self, delay: float, fn, *args) -> Timer:
+        timer = Timer(self, None, fn, args)
+        self._push(self._clock() + delay, timer)
+        return timer
+
+    def call_every(self, interval: float, fn, *args, initial_delay: float=None) -> Timer:
+        """
+            Runs fn(*args) every interval seconds, first after initial_delay
+            (interval by default), until the timer is cancelled.
+        """
+        timer = Timer(self, interval, fn, args)
+        self._push(self._clock() + (interval if initial_delay is None else initial_delay), timer)
+        return timer
+
+    def cancel(self, timer: Timer):
+        # Cancelled timers are dropped when they reach the top of the heap.
+        with self._condition:
+            timer.cancelled = True
+
+    def pending(self) -> int:
+        with self._condition:
+            return sum(1 for _, _, timer in self._heap if not timer.cancelled)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._heap = []
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _push(self, when: float, timer: Timer):
+        with self._condition:
+            heapq.heappush(self._heap, (when, next(self._sequence), timer))
+            if not self._thread:
+                self._stopped = False
+                self._thread = Thread(target=self._run, name='sqs-client-scheduler')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                        continue
+                    wait = self._heap[0][0] - self._clock() if self._heap else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self._condition.wait(wait)
+                if self._stopped:
+                    return
+                when, _, timer = heapq.heappop(self._heap)
+            try:
+                timer.fn(*timer.args)
+            except Exception:
+                self._logger.exception('Error while running a scheduled task')
+            if timer.interval is not None:
+                with self._condition:
+                    if not timer.cancelled:
+                        next_run = max(when + timer.interval, self._clock())
+                        heapq.heappush(self._heap, (next_run, next(self._sequence), timer))
+
+
+os.register_at_fork(after_in_child=Scheduler._reset_default)
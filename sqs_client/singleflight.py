@@ -0,0 +1,56 @@
+from threading import Lock
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+        Coalesces identical calls that are in flight at the same time.
+
+        The first caller for a key runs the function; callers arriving with
+        the same key before it returns wait for it and get the same result,
+        or the same exception.
+
+        Ex.:
+            singleflight = SingleFlight()
+            singleflight.do(('getStatus', process_id, job_id), get_status, process_id, job_id)
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = Lock()
+        self._executed = 0
+        self._coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self._executed += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'executed': self._executed,
+                'coalesced': self._coalesced,
+                'in_flight': len(self._calls)
+            }
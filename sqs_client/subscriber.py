@@ -1,53 +1,144 @@
-from time import time
+import logging
+from math import ceil
+from time import time, sleep
 from logging import exception
+from collections import deque
+from functools import partial
+from threading import BoundedSemaphore, Condition, Thread
+from concurrent.futures import ThreadPoolExecutor, Future
 
+from sqs_client.acknowledger import Acknowledger
+from sqs_client.backoff import ExponentialBackoff
+from sqs_client.batch import BatchResult
+from sqs_client.error_queue import ErrorQueueRouter, ROUTED_ATTRIBUTE_NAMES
+from sqs_client.exceptions import LaneFull
+from sqs_client.lanes import LaneScheduler
 from sqs_client.message import RequestMessage, MessageList
+from sqs_client.visibility import VisibilityHeartbeat
 from sqs_client.contracts import (
     MessageHandler, 
+    BatchMessageHandler,
     SqsConnection,
     Publisher,
     Subscriber as SubscriberBase,
     MessagePoller as MessagePollerBase
 )
 
+# Request attributes echoed back on the reply, so the reply queue can route it.
+REPLY_ATTRIBUTE_NAMES = ['RequestMessageId', 'VirtualQueueId']
+
 class Subscriber(SubscriberBase):
 
-    def __init__(self, sqs_connection: SqsConnection, queue_url=None, max_number_of_messages=10):
+    def __init__(self, 
+        sqs_connection: SqsConnection, 
+        queue_url=None, 
+        max_number_of_messages=10,
+        wait_time_seconds=0,
+        empty_receive_backoff: ExponentialBackoff=None,
+        stats_log_interval=1000
+    ):
+        """
+            wait_time_seconds enables long polling (up to 20 seconds).
+            empty_receive_backoff, when given, is slept after every empty
+            receive and reset as soon as messages arrive.
+        """
         self._connection = sqs_connection
         self._queue_url = queue_url
         self._max_number_of_messages = max_number_of_messages
+        self._wait_time_seconds = min(int(wait_time_seconds or 0), 20)
+        self._empty_receive_backoff = empty_receive_backoff
+        self._stats_log_interval = stats_log_interval
+        self._empty_receives = 0
+        self._non_empty_receives = 0
+        self._logger = logging.getLogger()
     
     def set_queue(self, queue_url):
         self._queue_url = queue_url
 
-    def receive_messages(self, return_none=False, message_attribute_names=[]):
+    def get_receive_stats(self) -> dict:
+        return {
+            'empty_receives': self._empty_receives,
+            'non_empty_receives': self._non_empty_receives
+        }
+
+    def receive_messages(self, return_none=False, message_attribute_names=[], attribute_names=None):
+        """
+            attribute_names selects system attributes to receive with each
+            message, e.g. ApproximateReceiveCount.
+        """
         while True:
-            messages = self._connection.client.receive_message(
-                QueueUrl=self._queue_url, 
-                MaxNumberOfMessages=self._max_number_of_messages,
-                MessageAttributeNames=message_attribute_names
-            )
-            if 'Messages' in messages:
-                yield MessageList(self._connection.client, self._queue_url, messages)
-            elif return_none:
+            messages = self._receive(message_attribute_names, attribute_names, self._wait_time_seconds)
+            if messages:
+                yield messages
+                continue
+
+            if self._empty_receive_backoff:
+                sleep(self._empty_receive_backoff.next())
+            if return_none:
                 yield None     
 
-    def chunk(self, num_messages=500, limit_seconds=30):
+    def _receive(self, message_attribute_names, attribute_names, wait_time_seconds):
+        params = {
+            'QueueUrl': self._queue_url, 
+            'MaxNumberOfMessages': self._max_number_of_messages,
+            'MessageAttributeNames': message_attribute_names
+        }
+        if attribute_names:
+            params['AttributeNames'] = attribute_names
+        if wait_time_seconds:
+            params['WaitTimeSeconds'] = wait_time_seconds
+        messages = self._connection.client.receive_message(**params)
+        if 'Messages' not in messages:
+            self._count_receive(empty=True)
+            return None
+        self._count_receive(empty=False)
+        if self._empty_receive_backoff:
+            self._empty_receive_backoff.reset()
+        return MessageList(self._connection.client, self._queue_url, messages)
+
+    def _count_receive(self, empty: bool):
+        if empty:
+            self._empty_receives += 1
+        else:
+            self._non_empty_receives += 1
+        total = self._empty_receives + self._non_empty_receives
+        if self._stats_log_interval and total % self._stats_log_interval == 0:
+            self._logger.info("Receive stats for {}: {}".format(self._queue_url, self.get_receive_stats()))
+
+    def chunk(self, num_messages=500, limit_seconds=30, message_attribute_names=[], attribute_names=None, on_receive=None):
         """
+            Once messages are held, a receive long polls at most for what is
+            left of limit_seconds, rounded up to whole seconds, and the empty
+            receive backoff is cut short at its end. on_receive, when given, is called with each
+            MessageList as soon as it was received, e.g. to track the held
+            messages with a visibility heartbeat.
+
             Ex.:
                 sqs_config = ....
                 subscriber = Subscriber(sqs_config)
                 for messages in subscriber.chunk(num_messages=50, limit_seconds=8):
                     for message in messages:
-                        print(message['Body'])
+                        print(message.body)
                     messages.delete()
         """
         if num_messages < 10:
-            self.max_number_of_messages = num_messages
+            self._max_number_of_messages = num_messages
         messages_received = None
         num = 0
         start = time()
-        for message_list in self.receive_messages(return_none=True):
+        while True:
+            wait_time_seconds = self._wait_time_seconds
+            if messages_received:
+                wait_time_seconds = min(wait_time_seconds, max(1, ceil(limit_seconds - (time() - start))))
+            message_list = self._receive(message_attribute_names, attribute_names, wait_time_seconds)
+            if message_list and on_receive:
+                on_receive(message_list)
+            elif not message_list and self._empty_receive_backoff:
+                delay = self._empty_receive_backoff.next()
+                if messages_received:
+                    delay = min(delay, max(0, limit_seconds - (time() - start)))
+                sleep(delay)
+
             if not messages_received:
                 messages_received = message_list
             elif message_list:
@@ -67,39 +158,459 @@ class MessagePoller(MessagePollerBase):
         handler: MessageHandler, 
         subscriber: Subscriber, 
         publisher: Publisher, 
-        request_message_class=RequestMessage
+        request_message_class=RequestMessage,
+        visibility_heartbeat: VisibilityHeartbeat=None,
+        error_queue_router: ErrorQueueRouter=None,
+        acknowledger: Acknowledger=None
     ):
+        """
+            With an error_queue_router, a message whose handler keeps failing
+            is moved to the error queue once it reached the router's receive
+            count, instead of coming back forever.
+
+            With an acknowledger, the handled messages of a list are deleted in
+            the background once their replies were flushed, instead of with one
+            DeleteMessageBatch call per list. A message whose reply could not be
+            sent is kept in the queue, so it is processed and replied again.
+        """
         self._subscriber = subscriber 
         self._publisher = publisher
         self._request_message_class = request_message_class
         self._handler = handler
+        self._visibility_heartbeat = visibility_heartbeat
+        self._error_queue_router = error_queue_router
+        self._acknowledger = acknowledger
 
     def start(self):
-        for messages in self._subscriber.receive_messages(message_attribute_names=['RequestMessageId', 'ReplyTo']):
-            for message in messages:
-                try:
-                    response = self._handler.process_message(message)
-                    self._send_response(message, response)
-                except Exception as e:
-                    exception('Error while trying to process a message')
-                    messages.remove(message.id)  
-            messages.delete()
+        self._start_visibility_heartbeat()
+        try:
+            for messages in self._receive_messages():
+                received = list(messages)
+                self._track(messages, received)
+                handled = {}
+                for message in received:
+                    handled[message.id] = self._handle(message)
+                    self._untrack(messages, message)
+                self._publisher.flush()
+                for message in received:
+                    if not self._reply_sent(message, handled[message.id]):
+                        messages.remove(message.id)  
+                messages.delete(self._acknowledger)
+        finally:
+            self._stop_acknowledger()
+            self._stop_visibility_heartbeat()
+
+    def _start_visibility_heartbeat(self):
+        if self._visibility_heartbeat:
+            self._visibility_heartbeat.start()
+
+    def _stop_visibility_heartbeat(self):
+        if self._visibility_heartbeat:
+            self._visibility_heartbeat.stop()
+
+    def _stop_acknowledger(self):
+        if self._acknowledger:
+            self._acknowledger.close()
+
+    def _acknowledge(self, messages, message):
+        if self._acknowledger:
+            self._acknowledger.ack(messages.queue, message)
+        else:
+            messages.delete_message(message)
+
+    def _track(self, messages, received):
+        if self._visibility_heartbeat:
+            for message in received:
+                self._visibility_heartbeat.track(messages.queue, message)
+
+    def _untrack(self, messages, message):
+        if self._visibility_heartbeat:
+            self._visibility_heartbeat.untrack(messages.queue, message)
+
+    def _receive_messages(self):
+        return self._subscriber.receive_messages(**self._receive_params())
+
+    def _receive_params(self) -> dict:
+        return {
+            'message_attribute_names': ['ReplyTo'] + REPLY_ATTRIBUTE_NAMES,
+            'attribute_names': ROUTED_ATTRIBUTE_NAMES if self._error_queue_router else None
+        }
+
+    def _handle(self, message):
+        """
+            Processes a message and replies to it.
+            Returns False when the message must be kept in the queue, else what
+            _send_response returned.
+        """
+        try:
+            response = self._handler.process_message(message)
+        except Exception as e:
+            exception('Error while trying to process a message')
+            return self._route_to_error_queue(message, e)
+        return self._send_response(message, response)
+
+    def _reply_sent(self, message, handled) -> bool:
+        """
+            Tells whether a handled message can be deleted, waiting for its
+            reply when the publisher returned a Future for it.
+        """
+        if not isinstance(handled, Future):
+            return bool(handled)
+        try:
+            handled.result()
+        except Exception as e:
+            exception('The reply to message {} could not be sent, keeping it'.format(message.id))
+            return False
+        return True
+
+    def _when_replied(self, messages, message, handled):
+        """
+            Calls _finish once the reply of a handled message was sent, from
+            the publisher's thread when it still buffers the reply.
+        """
+        if isinstance(handled, Future):
+            handled.add_done_callback(lambda _: self._finish(messages, message, self._reply_sent(message, handled)))
+        else:
+            self._finish(messages, message, bool(handled))
+
+    def _finish(self, messages, message, sent: bool):
+        self._untrack(messages, message)
+        if not sent:
+            return
+        try:
+            self._acknowledge(messages, message)
+        except Exception as e:
+            exception('Error while trying to delete a message')
+
+    def _route_to_error_queue(self, message, error) -> bool:
+        """
+            Returns True when the failed message was moved to the error queue,
+            so it is deleted like a processed one.
+        """
+        if not self._error_queue_router:
+            return False
+        try:
+            return self._error_queue_router.route(message, error)
+        except Exception as e:
+            exception('Error while trying to move a message to the error queue')
+            return False
     
     def _send_response(self, message, response=None):
+        """
+            Returns False when the reply could not be sent, the Future of a
+            reply the publisher still buffers, or True.
+        """
         if not response:
-            return 
+            return True
         reply_queue_url = message.reply_queue_url
         if not reply_queue_url:
-            return        
+            return True
         try:
             response_message = self._request_message_class(
                 body=response,
                 queue_url=reply_queue_url,
                 message_attributes = {
-                    'RequestMessageId': message.attributes['RequestMessageId']
+                    name: message.attributes[name] 
+                    for name in REPLY_ATTRIBUTE_NAMES if name in message.attributes
                 }
             )
-            self._publisher.send_message(response_message)
+            sent = self._publisher.send_message(response_message)
         except Exception as e:
             exception(e)
+            return False
+        return sent if isinstance(sent, Future) else True
+
+
+class BatchMessagePoller(MessagePoller):
+    """
+        Hands the messages to the handler in batches gathered by
+        Subscriber.chunk: up to batch_size messages, or what arrived within
+        batch_seconds.
+
+        A BatchMessageHandler gets the whole batch in one process_batch call;
+        any other handler gets process_message per message. Replied messages
+        are deleted with the batch. Failed ones, and any the BatchResult does
+        not mention, are kept in the queue or moved to the error queue.
+    """
+
+    def __init__(self, *args, batch_size: int=100, batch_seconds: float=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._batch_size = batch_size
+        self._batch_seconds = batch_seconds
+        self._logger = logging.getLogger()
+
+    def start(self):
+        self._start_visibility_heartbeat()
+        try:
+            for messages in self._receive_messages():
+                received = list(messages)
+                result = self._process_batch(received)
+                handled = {}
+                for message in received:
+                    handled[message.id] = self._complete(message, result)
+                    self._untrack(messages, message)
+                self._publisher.flush()
+                for message in received:
+                    if not self._reply_sent(message, handled[message.id]):
+                        messages.remove(message.id)
+                messages.delete(self._acknowledger)
+        finally:
+            self._stop_acknowledger()
+            self._stop_visibility_heartbeat()
+
+    def _receive_messages(self):
+        return self._subscriber.chunk(
+            num_messages=self._batch_size, 
+            limit_seconds=self._batch_seconds, 
+            on_receive=lambda message_list: self._track(message_list, list(message_list)),
+            **self._receive_params()
+        )
+
+    def _process_batch(self, received) -> BatchResult:
+        if isinstance(self._handler, BatchMessageHandler):
+            try:
+                return self._handler.process_batch(received)
+            except Exception as e:
+                exception('Error while trying to process a batch of messages')
+                result = BatchResult()
+                for message in received:
+                    result.add_failure(message, e)
+                return result
+        result = BatchResult()
+        for message in received:
+            try:
+                result.add_reply(message, self._handler.process_message(message))
+            except Exception as e:
+                exception('Error while trying to process a message')
+                result.add_failure(message, e)
+        return result
+
+    def _complete(self, message, result: BatchResult):
+        """
+            Replies to a message of the batch.
+            Returns False when the message must be kept in the queue, else what
+            _send_response returned.
+        """
+        if not result.mentions(message):
+            self._logger.error('The batch handler returned no result for message {}'.format(message.id))
+            return self._route_to_error_queue(message, Exception('No result for the message in the batch result'))
+        if result.failed(message):
+            return self._route_to_error_queue(message, result.get_failure(message))
+        return self._send_response(message, result.get_reply(message))
+
+
+class ConcurrentMessagePoller(MessagePoller):
+    """
+        Dispatches messages to a pool of worker threads, so a slow handler
+        does not hold up the messages received after it.
+
+        At most max_in_flight messages are being processed, waiting for a
+        worker or for their reply to be sent at any time; the receive loop
+        blocks until a slot is free. Each message is deleted as soon as its
+        own reply was sent, without holding a worker while the publisher
+        buffers it. A failed message, or one whose reply could not be sent,
+        is released and reappears after failed_visibility_timeout seconds
+        instead of the queue's visibility timeout.
+    """
+
+    def __init__(self, *args, workers: int=4, max_in_flight: int=None, failed_visibility_timeout: int=30, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._workers = workers
+        self._failed_visibility_timeout = failed_visibility_timeout
+        self._max_in_flight = max(max_in_flight or workers * 2, workers)
+        self._in_flight = BoundedSemaphore(self._max_in_flight)
+
+    def start(self):
+        self._start_visibility_heartbeat()
+        try:
+            with self._build_executor() as executor:
+                for messages in self._receive_messages():
+                    received = list(messages)
+                    self._track(messages, received)
+                    for message in received:
+                        self._in_flight.acquire()
+                        try:
+                            self._submit(executor, messages, message)
+                        except Exception:
+                            self._in_flight.release()
+                            raise
+        finally:
+            self._stop_acknowledger()
+            self._stop_visibility_heartbeat()
+
+    def _build_executor(self):
+        return ThreadPoolExecutor(max_workers=self._workers)
+
+    def _submit(self, executor, messages, message):
+        executor.submit(self._process, messages, message)
+
+    def _process(self, messages, message):
+        try:
+            handled = self._handle(message)
+        except Exception as e:
+            exception('Error while trying to process a message')
+            handled = False
+        self._when_replied(messages, message, handled)
+
+    def _finish(self, messages, message, sent: bool):
+        self._untrack(messages, message)
+        try:
+            if sent:
+                self._acknowledge(messages, message)
+            else:
+                self._release(messages, message, self._failed_visibility_timeout)
+        except Exception as e:
+            exception('Error while trying to delete a message')
+        finally:
+            self._in_flight.release()
+
+    def _release(self, messages, message, visibility_timeout):
+        try:
+            messages.release_message(message, visibility_timeout)
+        except Exception as e:
+            exception('Error while trying to release a message')
+
+
+class PipelinedMessagePoller(MessagePoller):
+    """
+        Overlaps receiving with processing: the calling thread keeps a local
+        buffer of received messages filled while worker threads take messages
+        from it. Handled messages are deleted by the acknowledger, one by one
+        without it, once their replies were sent.
+
+        The buffer holds at most buffer_size messages, and fewer once the
+        handlers turn out to be slow: only what the workers can start within
+        half of visibility_timeout, at their average pace, is prefetched.
+        Without a visibility heartbeat, a message that waited in the buffer
+        longer than visibility_timeout is skipped, as it may already have
+        been received again by another consumer. A failed message is left in
+        the queue.
+    """
+
+    def __init__(self, 
+        *args, 
+        workers: int=4, 
+        buffer_size: int=100, 
+        visibility_timeout: int=30, 
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self._workers = workers
+        self._buffer_size = max(buffer_size, workers)
+        self._visibility_timeout = visibility_timeout
+        self._buffer = deque()
+        self._condition = Condition()
+        self._average_seconds = None
+        self._stopped = False
+        self._logger = logging.getLogger()
+
+    def start(self):
+        self._start_visibility_heartbeat()
+        self._stopped = False
+        threads = [Thread(target=self._work, daemon=True) for _ in range(self._workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for messages in self._receive_messages():
+                received = list(messages)
+                self._track(messages, received)
+                with self._condition:
+                    self._buffer.extend((messages, message) for message in received)
+                    self._condition.notify_all()
+                    while len(self._buffer) >= self._buffer_limit():
+                        self._condition.wait()
+        finally:
+            with self._condition:
+                self._stopped = True
+                self._condition.notify_all()
+            for thread in threads:
+                thread.join()
+            self._stop_acknowledger()
+            self._stop_visibility_heartbeat()
+
+    def _buffer_limit(self) -> int:
+        if not self._average_seconds:
+            return self._buffer_size
+        startable = int(self._workers * self._visibility_timeout / 2 / self._average_seconds)
+        return max(self._workers, min(self._buffer_size, startable))
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._buffer and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                messages, message = self._buffer.popleft()
+                self._condition.notify_all()
+            try:
+                self._process(messages, message)
+            except Exception as e:
+                exception('Error while trying to acknowledge a message')
+                self._untrack(messages, message)
+
+    def _process(self, messages, message):
+        if not self._visibility_heartbeat and time() - message.initial_time >= self._visibility_timeout:
+            self._logger.warning('Message {} waited in the buffer past its visibility timeout'.format(message.id))
+            self._untrack(messages, message)
             return
+        start = time()
+        handled = self._handle(message)
+        self._record(time() - start)
+        self._when_replied(messages, message, handled)
+
+    def _record(self, seconds):
+        with self._condition:
+            if self._average_seconds is None:
+                self._average_seconds = seconds
+            else:
+                self._average_seconds = 0.8 * self._average_seconds + 0.2 * seconds
+            self._condition.notify_all()
+
+
+class LaneMessagePoller(ConcurrentMessagePoller):
+    """
+        Runs each message on the lane of a LaneScheduler chosen by
+        lane_key(message), e.g. its job type, so slow operations cannot take
+        the workers of fast ones.
+
+        When a lane is full the message is released and becomes visible
+        again after lane_full_visibility_timeout seconds. Lane stats are
+        logged every stats_interval seconds.
+    """
+
+    def __init__(self, 
+        *args, 
+        lane_scheduler: LaneScheduler, 
+        lane_key, 
+        lane_full_visibility_timeout: int=30,
+        stats_interval: int=300,
+        **kwargs
+    ):
+        kwargs.setdefault('max_in_flight', lane_scheduler.capacity())
+        super().__init__(*args, **kwargs)
+        self._lane_scheduler = lane_scheduler
+        self._lane_key = lane_key
+        self._lane_full_visibility_timeout = lane_full_visibility_timeout
+        self._stats_interval = stats_interval
+        self._stats_logged_at = time()
+        self._logger = logging.getLogger()
+
+    def _build_executor(self):
+        return self._lane_scheduler
+
+    def _submit(self, lane_scheduler, messages, message):
+        try:
+            lane_scheduler.submit(self._lane_key(message), self._process, messages, message)
+        except LaneFull as e:
+            self._logger.warning('Lane {} is full, releasing message {}'.format(e, message.id))
+            self._in_flight.release()
+            self._untrack(messages, message)
+            self._release(messages, message, self._lane_full_visibility_timeout)
+        self._log_stats()
+
+    def _log_stats(self):
+        now = time()
+        if now - self._stats_logged_at >= self._stats_interval:
+            self._stats_logged_at = now
+            self._logger.info('Lane stats: {}'.format(self._lane_scheduler.stats()))
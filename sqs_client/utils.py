@@ -5,3 +5,12 @@ def str_timestamp():
 
 def timestamp():
     return int(str_timestamp())
+
+def percentile(samples, fraction):
+    """
+        Nearest-rank percentile of samples, e.g. percentile(latencies, 0.95).
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
@@ -0,0 +1,118 @@
+import os
+import atexit
+import random
+import socket
+from hashlib import sha1
+from threading import Lock
+
+from sqs_client.reply_queue import ReplyQueue
+from sqs_client.contracts import ReplyQueue as ReplyQueueBase, Message
+
+VIRTUAL_QUEUE_ATTRIBUTE = 'VirtualQueueId'
+
+
+class HostReplyQueue(ReplyQueue):
+    """
+        One physical reply queue per process, shared by any number of
+        VirtualReplyQueues of that process.
+
+        Its name is derived from the host name and the process id, so no other
+        process receives from it. Replies are routed by their VirtualQueueId
+        attribute: replies for virtual queues of this process are delivered,
+        replies nobody waits for any more are dropped.
+
+        The queue is deleted when its last virtual queue is removed, and at
+        exit; the next virtual queue creates a new one, under a new name as
+        SQS does not reuse a deleted queue's name for 60 seconds. Only the
+        queue of a process that was killed is left to the idle queue sweeper.
+    """
+
+    MESSAGE_ATTRIBUTE_NAMES = ['RequestMessageId', VIRTUAL_QUEUE_ATTRIBUTE]
+
+    def __init__(self, *args, host_name: str=None, process_id: int=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._host_name = host_name or socket.gethostname()
+        self._process_id = process_id or os.getpid()
+        self._virtual_queues = set()
+        self._create_lock = Lock()
+        self._generation = 0
+        self._removed_at_exit = False
+
+    def get_name(self):
+        self._generation += 1
+        key = '{}:{}:{}'.format(self._host_name, self._process_id, self._generation)
+        self._id = 'host_' + sha1(key.encode('utf-8')).hexdigest()[:16]
+        return self._name + self._id
+
+    def get_url(self):
+        with self._create_lock:
+            if not self._removed_at_exit:
+                atexit.register(self.remove_queue)
+                self._removed_at_exit = True
+            return super().get_url()
+
+    def register(self, virtual_queue_id: str):
+        with self._lock:
+            self._virtual_queues.add(virtual_queue_id)
+
+    def unregister(self, virtual_queue_id: str):
+        with self._lock:
+            self._virtual_queues.discard(virtual_queue_id)
+        with self._create_lock:
+            with self._lock:
+                if self._virtual_queues:
+                    return
+            self.remove_queue()
+
+    def _route(self, messages, message: Message):
+        if self._is_local(message):
+            self._deliver(message)
+            return
+        # Only this process receives from the queue, so nobody else can claim it.
+        self._logger.info('Dropping reply {} to an unregistered virtual queue'.format(message.request_id))
+
+    def _is_local(self, message: Message) -> bool:
+        try:
+            virtual_queue_id = message.attributes[VIRTUAL_QUEUE_ATTRIBUTE]['StringValue']
+        except KeyError:
+            return True
+        with self._lock:
+            return virtual_queue_id in self._virtual_queues or message.request_id in self._waiters
+
+
+class VirtualReplyQueue(ReplyQueueBase):
+    """
+        A logical reply queue living on a HostReplyQueue.
+
+        Creating and removing it registers and unregisters its id with the
+        host, which only deletes its SQS queue once no virtual queue is left.
+    """
+
+    def __init__(self, host: HostReplyQueue, virtual_queue_id: str=None):
+        self._host = host
+        self._virtual_queue_id = virtual_queue_id or str(random.getrandbits(128))
+        self._host.register(self._virtual_queue_id)
+
+    def get_virtual_queue_id(self) -> str:
+        return self._virtual_queue_id
+
+    def get_url(self):
+        self._host.register(self._virtual_queue_id)
+        return self._host.get_url()
+
+    def get_reply_attributes(self) -> dict:
+        return {
+            VIRTUAL_QUEUE_ATTRIBUTE: {
+                'StringValue': self._virtual_queue_id,
+                'DataType': 'String'
+            }
+        }
+
+    def get_response_by_id(self, message_id: str, timeout: int=5) -> Message:
+        return self._host.get_response_by_id(message_id, timeout)
+
+    def get_response_future(self, message_id: str, timeout: int=5):
+        return self._host.get_response_future(message_id, timeout)
+
+    def remove_queue(self):
+        self._host.unregister(self._virtual_queue_id)
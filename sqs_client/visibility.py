@@ -0,0 +1,93 @@
+import logging
+from threading import Thread, Event, Lock
+
+from sqs_client.contracts import SqsConnection, Message
+
+
+class VisibilityHeartbeat:
+    """
+        Keeps in-flight messages invisible while their handlers are running.
+
+        Every interval seconds the visibility timeout of each tracked message
+        is set back to visibility_timeout with ChangeMessageVisibilityBatch.
+        A message is no longer extended once it has been untracked.
+
+        Ex.:
+            heartbeat = VisibilityHeartbeat(sqs_connection, visibility_timeout=600)
+            heartbeat.start()
+            heartbeat.track(queue_url, message)
+            ...
+            heartbeat.untrack(queue_url, message)
+    """
+
+    def __init__(self, sqs_connection: SqsConnection, visibility_timeout: int=600, interval: float=None):
+        self._connection = sqs_connection
+        self._visibility_timeout = visibility_timeout
+        self._interval = interval or max(visibility_timeout / 3, 1)
+        self._tracked = {}
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread = None
+        self._logger = logging.getLogger()
+
+    def track(self, queue_url: str, message: Message):
+        with self._lock:
+            self._tracked[(queue_url, message.id)] = message.receipt_handle
+
+    def untrack(self, queue_url: str, message: Message):
+        with self._lock:
+            self._tracked.pop((queue_url, message.id), None)
+
+    def start(self):
+        if self._thread:
+            return
+        self._stopped.clear()
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self._extend()
+            except Exception as e:
+                self._logger.exception('Error while trying to extend message visibility')
+
+    def _extend(self):
+        with self._lock:
+            queue_urls = set(queue_url for queue_url, _ in self._tracked)
+        for queue_url in queue_urls:
+            for keys in self._chunks(queue_url):
+                self._extend_chunk(queue_url, keys)
+
+    def _chunks(self, queue_url, n=10):
+        with self._lock:
+            keys = [key for key in self._tracked if key[0] == queue_url]
+        for i in range(0, len(keys), n):
+            yield keys[i:i + n]
+
+    def _extend_chunk(self, queue_url, keys):
+        # Messages untracked since the snapshot was taken are skipped.
+        with self._lock:
+            entries = [
+                {
+                    'Id': str(index),
+                    'ReceiptHandle': self._tracked[key],
+                    'VisibilityTimeout': self._visibility_timeout
+                }
+                for index, key in enumerate(keys) if key in self._tracked
+            ]
+        if not entries:
+            return
+        response = self._connection.client.change_message_visibility_batch(
+            QueueUrl=queue_url,
+            Entries=entries
+        )
+        for failure in response.get('Failed', []):
+            self._logger.warning('Visibility of a message could not be extended: {}'.format(failure))